@@ -1,6 +1,9 @@
 import streamlit as st
-import pandas as pd
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from ingest import CLEANED_SCHEMA, read_ai4i
 
 # --- KONFIGURASI HALAMAN ---
 st.set_page_config(
@@ -32,8 +35,8 @@ st.markdown("""
 def load_preview_data():
     path = 'data/processed/data_cleaned.csv'
     if os.path.exists(path):
-        df = pd.read_csv(path)
-        return df
+        # dtype ringkas + cache biner (lihat src/ingest.py)
+        return read_ai4i(path, schema=CLEANED_SCHEMA)
     return None
 
 df = load_preview_data()
@@ -153,7 +156,7 @@ st.markdown("---")
 st.header("🚀 Mulai Eksplorasi")
 st.markdown("Pilih menu di sidebar atau klik pintasan di bawah:")
 
-qa1, qa2, qa3 = st.columns(3)
+qa1, qa2, qa3, qa4 = st.columns(4)
 
 with qa1:
     with st.expander("📊 Lihat Dashboard EDA", expanded=True):
@@ -168,4 +171,9 @@ with qa2:
 with qa3:
     with st.expander("📈 Evaluasi Performa", expanded=True):
         st.write("Audit akurasi model dan dampak bisnis.")
-        st.markdown("**Buka Menu: 3_Evaluasi_Insight**")
\ No newline at end of file
+        st.markdown("**Buka Menu: 3_Evaluasi_Insight**")
+
+with qa4:
+    with st.expander("🛰️ Monitoring Armada", expanded=True):
+        st.write("Pantau status ribuan mesin dari feed sensor live.")
+        st.markdown("**Buka Menu: 4_Monitoring_Armada**")
\ No newline at end of file
@@ -1,30 +1,44 @@
 import streamlit as st
-import pandas as pd
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+import eda_aggregates as eda
+from profiling import export_json, stage
 
 st.set_page_config(page_title="EDA Dashboard", page_icon="📊", layout="wide")
 
-@st.cache_data
+SAMPLE_PAGE_ROWS = 100
+
+# Indeks baris + statistik dan agregat (histogram, quantile box-plot, grid densitas,
+# sample scatter) dihitung sekali per partisi Type x Machine failure; filter hanya
+# menggabungkan partisi. cache_resource: objek dibagi antar rerun tanpa disalin.
+@st.cache_resource
 def load_data():
     path = 'data/processed/data_cleaned.csv'
     if os.path.exists(path):
-        return pd.read_csv(path)
-    return None
+        return eda.load_or_build_aggregates(path)
+    return None, None, None
 
-df = load_data()
+# Section halaman diukur lewat profiling (aktif dengan env PDM_PROFILE=1)
+with stage('eda.load_data'):
+    df, index, aggs = load_data()
 
 st.title("📊 Analisis Data Eksploratif")
 
-if df is not None:
+if aggs is not None:
     # --- SIDEBAR FILTERS ---
     st.sidebar.header("🔍 Filter Data")
     
     # Filter Tipe Produk
     kategori_pilihan = st.sidebar.multiselect(
         "Pilih Kualitas Produk:",
-        options=df['Type'].unique(),
-        default=df['Type'].unique()
+        options=aggs['types'],
+        default=aggs['types']
     )
     
     # Filter Status Mesin
@@ -33,44 +47,90 @@ if df is not None:
         options=["Semua", "Hanya Gagal (1)", "Hanya Normal (0)"]
     )
 
-    # Terapkan Filter
-    df_filtered = df[df['Type'].isin(kategori_pilihan)]
-    
+    # Terapkan Filter (gabungan partisi, tanpa scan baris)
     if status_pilihan == "Hanya Gagal (1)":
-        df_filtered = df_filtered[df_filtered['Machine failure'] == 1]
+        status_filter = [1]
     elif status_pilihan == "Hanya Normal (0)":
-        df_filtered = df_filtered[df_filtered['Machine failure'] == 0]
+        status_filter = [0]
+    else:
+        status_filter = [0, 1]
 
-    # Tampilkan Jumlah Data setelah Filter
-    st.markdown(f"**Menampilkan {len(df_filtered)} data dari total {len(df)} data.**")
+    # Tampilkan Jumlah Data setelah Filter (KPI dari statistik partisi, tanpa scan)
+    with stage('eda.filter_summary'):
+        summary = index.summary(kategori_pilihan, status_filter)
+    st.markdown(f"**Menampilkan {summary['count']} data dari total {index.total} data.**")
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Jumlah Kegagalan", summary['failures'])
+    k2.metric("Failure Rate", f"{summary['failures'] / max(summary['count'], 1):.2%}")
+    if summary['count']:
+        k3.metric("Rata-rata Torsi", f"{summary['columns']['Torque [Nm]']['mean']:.1f} Nm")
+        k4.metric("Rata-rata Tool Wear", f"{summary['columns']['Tool wear [min]']['mean']:.0f} min")
+
+    with st.expander("Lihat sampel data hasil filter"):
+        # Per halaman: hanya row-id halaman ini yang diambil dari indeks
+        n_pages = max((summary['count'] + SAMPLE_PAGE_ROWS - 1) // SAMPLE_PAGE_ROWS, 1)
+        page = st.number_input("Halaman", min_value=1, max_value=n_pages, value=1, step=1)
+        rows = index.rows(kategori_pilihan, status_filter, start=(page - 1) * SAMPLE_PAGE_ROWS,
+                          limit=SAMPLE_PAGE_ROWS)
+        st.dataframe(df.iloc[rows])
+        st.caption(f"Halaman {page} dari {n_pages}")
     st.divider()
 
     # --- TABS LAYOUT (Agar rapi) ---
     tab1, tab2, tab3 = st.tabs(["📈 Distribusi Sensor", "🔥 Korelasi Panas", "🧊 Scatter 3D"])
 
-    with tab1:
+    colors = {0: 'blue', 1: 'red'}
+
+    with tab1, stage('eda.tab_distribusi'):
         c1, c2 = st.columns(2)
         with c1:
             st.subheader("Distribusi Suhu Udara")
-            fig1 = px.histogram(df_filtered, x='Air temperature [K]', color='Machine failure', 
-                                barmode='overlay', color_discrete_map={0:'blue', 1:'red'})
+            edges, hist = eda.histogram(aggs, kategori_pilihan, status_filter)
+            centers = (edges[:-1] + edges[1:]) / 2
+            fig1 = go.Figure([go.Bar(x=centers, y=counts, width=np.diff(edges), name=str(f),
+                                     marker_color=colors[f], opacity=0.6)
+                              for f, counts in hist.items()])
+            fig1.update_layout(barmode='overlay', xaxis_title=eda.HIST_COLUMN, yaxis_title='count',
+                               legend_title='Machine failure')
             st.plotly_chart(fig1, use_container_width=True)
         with c2:
             st.subheader("Distribusi Torsi")
-            fig2 = px.box(df_filtered, x='Machine failure', y='Torque [Nm]', color='Machine failure')
+            stats = eda.box_stats(aggs, kategori_pilihan, status_filter)
+            fig2 = go.Figure([go.Box(x=[f], q1=[b['q1']], median=[b['median']], q3=[b['q3']],
+                                     lowerfence=[b['lowerfence']], upperfence=[b['upperfence']],
+                                     name=str(f), marker_color=colors[f])
+                              for f, b in stats.items()])
+            fig2.update_layout(xaxis_title='Machine failure', yaxis_title=eda.BOX_COLUMN,
+                               legend_title='Machine failure')
             st.plotly_chart(fig2, use_container_width=True)
 
-    with tab2:
+    with tab2, stage('eda.tab_korelasi'):
         st.subheader("Hubungan Suhu Proses vs Rotasi")
-        fig3 = px.density_heatmap(df_filtered, x='Rotational speed [rpm]', y='Process temperature [K]', 
-                                  marginal_x="histogram", marginal_y="histogram")
+        x_edges, y_edges, grid = eda.density(aggs, kategori_pilihan, status_filter)
+        x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+        y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+        fig3 = make_subplots(rows=2, cols=2, column_widths=[0.8, 0.2], row_heights=[0.2, 0.8],
+                             shared_xaxes=True, shared_yaxes=True,
+                             horizontal_spacing=0.02, vertical_spacing=0.02)
+        fig3.add_trace(go.Heatmap(x=x_centers, y=y_centers, z=grid.T, colorscale='Plasma'), row=2, col=1)
+        fig3.add_trace(go.Bar(x=x_centers, y=grid.sum(axis=1), showlegend=False), row=1, col=1)
+        fig3.add_trace(go.Bar(y=y_centers, x=grid.sum(axis=0), orientation='h', showlegend=False),
+                       row=2, col=2)
+        fig3.update_xaxes(title_text=eda.DENSITY_X, row=2, col=1)
+        fig3.update_yaxes(title_text=eda.DENSITY_Y, row=2, col=1)
         st.plotly_chart(fig3, use_container_width=True)
 
-    with tab3:
+    with tab3, stage('eda.tab_scatter3d') as s:
         st.subheader("Analisis 3D: RPM, Torsi, dan Keausan")
-        fig4 = px.scatter_3d(df_filtered, x='Rotational speed [rpm]', y='Torque [Nm]', z='Tool wear [min]',
+        df_sample = eda.scatter_sample(aggs, kategori_pilihan, status_filter)
+        s.add_rows(len(df_sample))
+        st.caption(f"Menampilkan sample {len(df_sample)} titik (semua kasus gagal selalu ditampilkan).")
+        fig4 = px.scatter_3d(df_sample, x='Rotational speed [rpm]', y='Torque [Nm]', z='Tool wear [min]',
                              color='Machine failure', opacity=0.7, size_max=10)
         st.plotly_chart(fig4, use_container_width=True)
 
 else:
-    st.error("Data tidak ditemukan!")
\ No newline at end of file
+    st.error("Data tidak ditemukan!")
+
+# Simpan hasil profiling ke PDM_PROFILE_OUT (no-op jika profiling nonaktif)
+export_json()
@@ -1,10 +1,21 @@
 import streamlit as st
-import joblib
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import os
+import sys
 import time
-import random
+
+# Modul src/ dipakai langsung oleh halaman (encoding + scaling + model dalam satu artefak)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from explain import ExplanationService, source_model
+from fleet_simulator import INJECTABLE_MODES, FleetSimulator
+from inference import load_or_build_pipeline, load_pipeline
+from prediction_cache import PredictionCache
+from profiling import export_json, stage
+from similar_incidents import IncidentIndex, index_exists
+from streaming_features import (derived_features, engine_exists, load_engine, model_features,
+                                uses_stream_features)
+from utils import OPERATOR_RANGES, TYPE_MAP, ModelRegistry, active_version
 
 # --- KONFIGURASI HALAMAN ---
 st.set_page_config(page_title="Industrial Predictor", page_icon="🏭", layout="wide")
@@ -36,16 +47,83 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Label sidebar untuk OPERATOR_RANGES (urutan sama)
+OPERATOR_LABELS = ['Suhu Udara', 'Suhu Proses', 'RPM', 'Torsi', 'Tool Wear']
+OPERATOR_UNITS = ['K', 'K', 'RPM', 'Nm', 'min']
+
 # --- FUNGSI LOAD ASSETS ---
+# Satu handle registry per proses Streamlit: model di-mmap sekali, versi baru dipakai otomatis
+@st.cache_resource
+def get_registry():
+    return ModelRegistry()
+
+# Tanpa registry: artefak file di-load sekali per mtime (berubah saat training/adopsi threshold)
+PIPELINE_FILES = ['models/inference_pipeline.pkl', 'models/best_model.pkl', 'models/preprocessing.pkl']
+
+@st.cache_resource(max_entries=2)
+def load_file_pipeline(mtimes):
+    return load_or_build_pipeline()
+
 def load_assets():
+    # Return (versi, pipeline); tanpa registry pakai models/inference_pipeline.pkl.
+    # Yang dijalankan tiap rerun hanya cek CURRENT / mtime, model tidak di-load ulang.
     try:
-        model = joblib.load('models/best_model.pkl')
-        scaler = joblib.load('models/preprocessing.pkl')
-        return model, scaler
-    except:
+        if active_version() is not None:
+            return get_registry().get()
+        mtimes = tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                       for path in PIPELINE_FILES)
+        pipeline = load_file_pipeline(mtimes)
+        return pipeline.version, pipeline
+    except (OSError, ValueError):
         return None, None
 
-model, scaler = load_assets()
+# Penjelasan TreeSHAP per prediksi (cache per input terkuantisasi, dibagi antar rerun/sesi).
+# Dikunci per versi model agar cache penjelasan ikut berganti saat hot-swap. Artefak registry
+# berisi FlatForest (tanpa cover node), jadi TreeSHAP dihitung dari model pohon aslinya.
+@st.cache_resource(max_entries=2)
+def load_explainer(version, _pipeline):
+    try:
+        return ExplanationService(_pipeline, model=source_model(_pipeline, version))
+    except (ImportError, ValueError, OSError):
+        return None
+
+# Cache hasil prediksi per pembacaan terkuantisasi + versi model, dibagi antar rerun/sesi
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache(capacity=4096, n_outputs=1)
+
+# Model per mode kegagalan (opsional, dari `train_model.py --failure-modes`): satu traversal
+# untuk semua mode, dipakai untuk menentukan tim yang dikirim
+@st.cache_resource
+def load_failure_modes():
+    try:
+        return load_pipeline('models/failure_modes_pipeline.pkl')
+    except (OSError, ValueError):
+        return None
+
+# Indeks KD-tree insiden historis (dibangun offline: `python src/similar_incidents.py`), di-mmap
+@st.cache_resource
+def load_incident_index():
+    if not index_exists():
+        return None
+    try:
+        return IncidentIndex()
+    except (OSError, KeyError, ValueError):
+        return None
+
+FAILURE_MODE_CREWS = {
+    'TWF': 'Tool Wear Failure → Tim Tooling (ganti mata alat)',
+    'HDF': 'Heat Dissipation Failure → Tim Pendingin',
+    'PWF': 'Power Failure → Tim Kelistrikan',
+    'OSF': 'Overstrain Failure → Tim Mekanik',
+    'RNF': 'Random Failure → Teknisi Umum',
+}
+
+with stage('prediksi.load_assets'):
+    model_version, pipeline = load_assets()
+    mode_pipeline = load_failure_modes()
+    incident_index = load_incident_index()
+    explainer = load_explainer(model_version, pipeline) if pipeline is not None else None
 
 # --- HEADER JUDUL ---
 st.title(" Predictive Maintenance Control Room")
@@ -55,23 +133,16 @@ st.markdown("---")
 # --- SIDEBAR (HANYA UNTUK REFERENSI) ---
 with st.sidebar:
     st.header("📘 Referensi Operator")
-    st.info("""
-    **Panduan Nilai Normal:**
-    
-     **Suhu Udara:** 295 - 300 K
-            
-     **Suhu Proses:** 305 - 310 K
-            
-     **RPM:** 1400 - 1600 RPM
-            
-     **Torsi:** 30 - 45 Nm
-     
-     **Tool Wear:** < 150 min
-    """)
+    st.info("**Panduan Nilai Normal:**\n\n" + "\n\n".join(
+        f"**{label}:** {lo:g} - {hi:g} {unit}"
+        for label, unit, (lo, hi) in zip(OPERATOR_LABELS, OPERATOR_UNITS, OPERATOR_RANGES.values())
+    ))
     st.markdown("*Gunakan panel di sebelah kanan untuk input data.*")
+    if model_version is not None:
+        st.caption(f"Versi model: `{model_version}`")
 
 # --- LAYOUT UTAMA (SPLIT SCREEN) ---
-if model is not None:
+if pipeline is not None:
     
     # Membagi Layar: Kiri (Input 40%) - Kanan (Output 60%)
     col_control, col_monitor = st.columns([1, 1.5], gap="large")
@@ -81,27 +152,38 @@ if model is not None:
         st.subheader("🎛️ Panel Kontrol Mesin")
         
         with st.container(border=True):
-            # 1. Tombol Random Generator
+            # 1. Simulator Mesin: pembacaan berikutnya dari satu mesin simulasi (sensor berkorelasi,
+            # berlanjut antar klik), opsional dipaksa ke kondisi mode kegagalan tertentu
+            st.write("**Simulasi Data Sensor**")
             col_rand1, col_rand2 = st.columns([3, 1])
             with col_rand1:
-                st.write("**Simulasi Data Sensor**")
+                scenario = st.selectbox("Skenario", ['Normal'] + INJECTABLE_MODES,
+                                        label_visibility="collapsed")
             with col_rand2:
-                if st.button("🎲 Random", help="Isi nilai acak untuk demo"):
-                    st.session_state['rpm_val'] = int(random.randint(1200, 2800))
-                    st.session_state['torque_val'] = round(random.uniform(20.0, 90.0), 1)
-                    st.session_state['wear_val'] = int(random.randint(0, 250))
-                    st.session_state['air_val'] = round(random.uniform(295, 305), 1)
+                if st.button("🎲 Simulasi", help="Ambil pembacaan berikutnya dari mesin simulasi"):
+                    if 'fleet_sim' not in st.session_state:
+                        st.session_state['fleet_sim'] = FleetSimulator(1, seed=int(time.time()))
+                    X_sim, _ = st.session_state['fleet_sim'].step(
+                        force_mode=None if scenario == 'Normal' else scenario)
+                    type_code, air, process, rpm_sim, torque_sim, wear = X_sim[0]
+                    st.session_state['type_val'] = int(type_code)
+                    st.session_state['air_val'] = float(air)
+                    st.session_state['process_val'] = float(process)
+                    st.session_state['rpm_val'] = int(rpm_sim)
+                    st.session_state['torque_val'] = float(torque_sim)
+                    st.session_state['wear_val'] = int(wear)
             
             st.divider()
 
             # 2. Input Form
-            type_input = st.selectbox("Tipe Kualitas Produk", ['L', 'M', 'H'], index=0)
+            type_input = st.selectbox("Tipe Kualitas Produk", ['L', 'M', 'H'],
+                                      index=st.session_state.get('type_val', 0))
             
             c1, c2 = st.columns(2)
             with c1:
                 air_temp = st.number_input("Suhu Udara [K]", 250.0, 350.0, st.session_state.get('air_val', 300.0), step=0.1)
             with c2:
-                process_temp = st.number_input("Suhu Proses [K]", 250.0, 400.0, 310.0, step=0.1)
+                process_temp = st.number_input("Suhu Proses [K]", 250.0, 400.0, st.session_state.get('process_val', 310.0), step=0.1)
 
             rpm = st.slider("Rotasi (RPM)", 1000, 3000, st.session_state.get('rpm_val', 1500))
             
@@ -138,13 +220,27 @@ if model is not None:
                     time.sleep(0.5) # Efek loading
                     
                     # Logika Prediksi
-                    type_map = {'L': 0, 'M': 1, 'H': 2}
-                    input_df = pd.DataFrame([[type_map[type_input], air_temp, process_temp, rpm, torque, tool_wear]],
-                                          columns=['Type', 'Air temperature [K]', 'Process temperature [K]', 
-                                                   'Rotational speed [rpm]', 'Torque [Nm]', 'Tool wear [min]'])
-                    input_scaled = scaler.transform(input_df)
-                    proba = model.predict_proba(input_scaled)[0][1]
-                    pred = 1 if proba > 0.5 else 0
+                    input_row = np.array([[TYPE_MAP[type_input], air_temp, process_temp, rpm, torque, tool_wear]],
+                                         dtype=np.float64)
+                    with stage('prediksi.predict', rows=1):
+                        if uses_stream_features(pipeline):
+                            # Model fitur streaming: tiap diagnosa = pembacaan berikutnya dari mesin
+                            # operator, riwayat jendela disimpan per sesi
+                            if 'stream_engine' not in st.session_state:
+                                st.session_state['stream_engine'] = (
+                                    load_engine('models') if engine_exists('models') else None)
+                            try:
+                                model_input = model_features(st.session_state['stream_engine'], pipeline,
+                                                             ['operator'], input_row)
+                            except ValueError as e:
+                                st.error(f"⚠️ {e}")
+                                st.stop()
+                            proba = pipeline.predict_proba(model_input)[0][1]
+                        else:
+                            model_input = input_row
+                            proba = get_prediction_cache().get_or_compute(
+                                input_row, pipeline.version, lambda X: pipeline.predict_proba(X)[:, 1:])[0, 0]
+                    pred = 1 if proba > pipeline.threshold else 0
 
                     # 1. GAUGE CHART (Spedometer)
                     fig = go.Figure(go.Indicator(
@@ -163,7 +259,7 @@ if model is not None:
                             'threshold': {
                                 'line': {'color': "black", 'width': 6},
                                 'thickness': 0.8,
-                                'value': proba * 100}}))
+                                'value': pipeline.threshold * 100}})) # Garis = threshold alarm serving
                     
                     fig.update_layout(height=300, margin=dict(l=10, r=10, t=30, b=10))
                     st.plotly_chart(fig, use_container_width=True)
@@ -172,14 +268,43 @@ if model is not None:
                     st.divider()
                     if pred == 1:
                         st.error("🚨 **CRITICAL WARNING**")
+                        top_sensor_text = ""
+                        if explainer is not None:
+                            with stage('prediksi.explain', rows=1):
+                                (top_sensor, contribution), = explainer.top_features(model_input)[0]
+                            top_sensor_text = f"**Sensor penyebab utama:** {top_sensor} (kontribusi SHAP {contribution:+.2f})."
                         st.markdown(f"""
                         **Mesin terdeteksi tidak aman!** Risiko kegagalan mencapai **{proba*100:.1f}%**.
                         
+                        {top_sensor_text}
+                        
                         **Rekomendasi Tindakan:**
                         1. Hentikan mesin segera.
                         2. Periksa pendingin (Suhu saat ini: {process_temp} K).
                         3. Cek kondisi mata bor/alat (Keausan: {tool_wear} min).
                         """)
+
+                        if mode_pipeline is not None and mode_pipeline.failure_modes:
+                            mode_proba = mode_pipeline.predict_modes(input_row)[0, 1:]
+                            st.markdown("**Dugaan Mode Kegagalan (Tim yang Dikirim):**")
+                            for mode, p in sorted(zip(mode_pipeline.failure_modes, mode_proba),
+                                                  key=lambda item: -item[1]):
+                                st.progress(float(p), text=f"{FAILURE_MODE_CREWS.get(mode, mode)}: {p*100:.0f}%")
+
+                        if incident_index is not None:
+                            with stage('prediksi.similar_incidents', rows=1):
+                                incidents = incident_index.query_raw(input_row, k=5)[0]
+                            st.markdown("**Insiden Serupa di Masa Lalu:**")
+                            st.dataframe([{
+                                'Tipe': {v: k for k, v in TYPE_MAP.items()}.get(int(r['Type']), '-'),
+                                'Suhu Udara [K]': r['Air temperature [K]'],
+                                'Suhu Proses [K]': r['Process temperature [K]'],
+                                'RPM': int(r['Rotational speed [rpm]']),
+                                'Torsi [Nm]': r['Torque [Nm]'],
+                                'Tool Wear [min]': int(r['Tool wear [min]']),
+                                'Mode Kegagalan': ', '.join(r['modes']) or '-',
+                                'Jarak': round(r['distance'], 3),
+                            } for r in incidents], hide_index=True)
                     else:
                         st.success("✅ **SYSTEM HEALTHY**")
                         st.markdown(f"Mesin beroperasi dalam parameter optimal. Risiko kegagalan rendah (**{proba*100:.1f}%**).")
@@ -187,9 +312,14 @@ if model is not None:
                     # 3. METRIK RINGKAS
                     st.markdown("---")
                     m1, m2, m3 = st.columns(3)
-                    m1.metric("Power Strain", f"{torque*rpm/1000:.1f} kW", help="Estimasi beban daya (Torsi x RPM)")
-                    m2.metric("Temp Delta", f"{process_temp - air_temp:.1f} K", help="Selisih Suhu Proses & Udara")
+                    # Fitur turunan sama dengan yang dipakai pipeline fitur streaming
+                    power_strain, temp_delta = derived_features(input_row)[0]
+                    m1.metric("Power Strain", f"{power_strain:.1f} kW", help="Estimasi beban daya (Torsi x RPM)")
+                    m2.metric("Temp Delta", f"{temp_delta:.1f} K", help="Selisih Suhu Proses & Udara")
                     m3.metric("Tool Life", f"{200 - tool_wear} min", delta_color="normal", help="Sisa umur alat sebelum batas kritis 200 min")
 
 else:
-    st.warning("⚠️ Model belum dimuat. Pastikan file 'models/best_model.pkl' tersedia.")
\ No newline at end of file
+    st.warning("⚠️ Model belum dimuat. Pastikan file 'models/best_model.pkl' tersedia.")
+
+# Simpan hasil profiling ke PDM_PROFILE_OUT (no-op jika profiling nonaktif)
+export_json()
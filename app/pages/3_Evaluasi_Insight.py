@@ -1,39 +1,68 @@
 import streamlit as st
-import joblib
+import numpy as np
 import pandas as pd
+import os
+import sys
 import plotly.graph_objects as go
 import plotly.express as px
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from evaluate_model import (LATEST_NAME, REPORT_DIR, adopt_threshold, confusion_at_threshold,
+                            load_latest_report, metrics_from_confusion, optimal_threshold)
+from evaluate_model import serving_threshold as read_serving_threshold
+from explain import load_summary
+from profiling import export_json, stage
+from utils import CURRENT_NAME, REGISTRY_DIR
 
 # Konfigurasi Halaman
 st.set_page_config(page_title="Model Evaluation", page_icon="📈", layout="wide")
 
 # --- LOAD DATA ---
-@st.cache_resource
-def load_eval_data():
+# Laporan evaluasi (metrik, confusion matrix, kurva threshold) dibuat saat training dan
+# dikunci dengan hash model + data test; halaman ini hanya membacanya (tanpa load model).
+# Cache dikunci dengan mtime pointer laporan terbaru agar training ulang langsung terlihat.
+LATEST_POINTER = os.path.join('models', REPORT_DIR, LATEST_NAME)
+
+# Threshold serving berubah lewat CLI, training ulang, atau rollback registry: cache dikunci dengan
+# mtime pointer versi aktif + artefak file
+SERVING_FILES = [os.path.join(REGISTRY_DIR, CURRENT_NAME), 'models/inference_pipeline.pkl',
+                 'models/best_model.pkl', 'models/preprocessing.pkl']
+
+def file_mtime(path):
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+@st.cache_resource(max_entries=2)
+def load_eval_report(pointer_mtime):
+    try:
+        return load_latest_report('models')
+    except (OSError, KeyError):
+        return None
+
+@st.cache_resource(max_entries=2)
+def load_serving_threshold(mtimes):
+    # Threshold alarm yang sedang dipakai serving (versi aktif registry, atau artefak file)
     try:
-        # Load data test yang sudah displit di awal project
-        data = joblib.load('data/processed/split_data.pkl')
-        model = joblib.load('models/best_model.pkl')
-        return data['X_test'], data['y_test'], data['feature_names'], model
-    except Exception as e:
-        return None, None, None, None
+        return read_serving_threshold()
+    except (OSError, ValueError):
+        return 0.5
 
-X_test, y_test, feature_names, model = load_eval_data()
+with stage('evaluasi.load_report'):
+    report = load_eval_report(file_mtime(LATEST_POINTER))
 
 st.title("📈 Evaluasi Kinerja Model")
 st.markdown("Halaman ini mengaudit seberapa akurat model memprediksi kegagalan pada data uji (Unseen Data).")
 st.markdown("---")
 
-if model is not None:
-    # --- 1. HITUNG METRIK UTAMA ---
-    y_pred = model.predict(X_test)
-    
-    # Hitung skor
-    acc = accuracy_score(y_test, y_pred)
-    f1 = f1_score(y_test, y_pred)
-    recall = recall_score(y_test, y_pred)
-    prec = precision_score(y_test, y_pred)
+if report is not None:
+    # --- 1. METRIK UTAMA (dari laporan evaluasi, pada threshold serving) ---
+    meta = report['meta']
+    serving_threshold = load_serving_threshold(tuple(file_mtime(path) for path in SERVING_FILES))
+    cm = confusion_at_threshold(report, serving_threshold)
+    metrics = metrics_from_confusion(cm)
+    acc = metrics['accuracy']
+    f1 = metrics['f1']
+    recall = metrics['recall']
+    prec = metrics['precision']
 
     # TAMPILKAN KPI CARDS (Executive Summary)
     st.subheader("🏆 Rapor Nilai Model")
@@ -54,12 +83,11 @@ if model is not None:
     tab1, tab2, tab3 = st.tabs(["🧩 Confusion Matrix", "💰 Dampak Bisnis", "🧠 Logika Model"])
 
     # TAB 1: CONFUSION MATRIX (Visualisasi Kebenaran)
-    with tab1:
+    with tab1, stage('evaluasi.tab_confusion'):
         st.subheader("Detail Prediksi Benar vs Salah")
         
-        cm = confusion_matrix(y_test, y_pred)
-        # Struktur CM: [[TN, FP], [FN, TP]]
-        tn, fp, fn, tp = cm.ravel()
+        tn, fp, fn, tp = cm['tn'], cm['fp'], cm['fn'], cm['tp']
+        st.caption(f"Threshold alarm serving: {serving_threshold:.4f}")
 
         # Visualisasi Custom dengan Plotly Heatmap
         z = [[fn, tp], [tn, fp]] # Dibalik agar TP/FN di atas (sesuai standar industri)
@@ -88,8 +116,19 @@ if model is not None:
         - **Alarm Palsu (False Positive):** Mesin aman tapi dibilang rusak. (Bikin teknisi capek, tapi tidak fatal).
         """)
 
+        # Kurva Precision/Recall vs threshold (dari TP/FP kumulatif di laporan, di-downsample)
+        thresholds, tp_curve, fp_curve = report['thresholds'], report['tp'], report['fp']
+        step = max(len(thresholds) // 500, 1)
+        n_pos = max(meta['n_positive'], 1)
+        fig_curve = go.Figure([
+            go.Scatter(x=thresholds[::step], y=(tp_curve / np.maximum(tp_curve + fp_curve, 1))[::step], name='Precision'),
+            go.Scatter(x=thresholds[::step], y=(tp_curve / n_pos)[::step], name='Recall'),
+        ])
+        fig_curve.update_layout(title="Precision & Recall per Threshold", xaxis_title='Threshold', height=350)
+        st.plotly_chart(fig_curve, use_container_width=True)
+
     # TAB 2: ANALISIS BISNIS (Konteks Uang)
-    with tab2:
+    with tab2, stage('evaluasi.tab_bisnis'):
         st.subheader("Simulasi Dampak Finansial")
         st.markdown("Berapa uang yang diselamatkan model ini dibandingkan tidak pakai AI?")
 
@@ -118,16 +157,39 @@ if model is not None:
             st.metric("Total Biaya (Tanpa AI)", f"${loss_without_ai:,.0f}")
             st.metric("Total Biaya (Dengan AI)", f"${total_cost_with_ai:,.0f}")
 
+        # Optimasi threshold: biaya di semua threshold dari kurva TP/FP kumulatif (tanpa predict ulang)
+        st.markdown("#### 🎯 Threshold Optimal")
+        best = optimal_threshold(report, cost_maintenance, cost_failure)
+        col_o1, col_o2, col_o3 = st.columns(3)
+        col_o1.metric("Threshold Optimal", f"{best['threshold']:.4f}",
+                      delta=f"{best['threshold'] - serving_threshold:+.4f} vs serving", delta_color="off")
+        col_o2.metric("Total Biaya (Threshold Optimal)", f"${best['cost']:,.0f}",
+                      delta=f"${best['cost'] - total_cost_with_ai:,.0f}", delta_color="inverse")
+        col_o3.metric("Penghematan vs Tanpa AI", f"${best['cost_without_model'] - best['cost']:,.0f}")
+
+        sweep = best['sweep']
+        step = max(len(sweep['cuts']) // 500, 1)
+        fig_cost = go.Figure(go.Scatter(x=sweep['cuts'][::step], y=sweep['cost'][::step], name='Total Biaya'))
+        fig_cost.add_vline(x=best['threshold'], line_dash='dash', line_color='green', annotation_text='optimal')
+        fig_cost.add_vline(x=serving_threshold, line_dash='dot', line_color='gray', annotation_text='serving')
+        fig_cost.update_layout(title="Total Biaya per Threshold", xaxis_title='Threshold', yaxis_title='USD', height=350)
+        st.plotly_chart(fig_cost, use_container_width=True)
+
+        if st.button("✅ Terapkan Threshold Optimal ke Model Serving"):
+            adopt_threshold(best['threshold'])
+            load_serving_threshold.clear()
+            st.success(f"Threshold {best['threshold']:.4f} diterapkan ke model serving.")
+
     # TAB 3: FEATURE IMPORTANCE (Kenapa model memilih itu?)
-    with tab3:
+    with tab3, stage('evaluasi.tab_logika'):
         st.subheader("Faktor Penentu Kegagalan")
         st.markdown("Fitur mana yang paling dilihat oleh Model saat mengambil keputusan?")
 
-        if hasattr(model, 'feature_importances_'):
+        if meta['feature_importances'] is not None:
             # Buat DataFrame untuk plotting
             fi_df = pd.DataFrame({
-                'Feature': feature_names,
-                'Importance': model.feature_importances_
+                'Feature': meta['feature_names'],
+                'Importance': meta['feature_importances']
             }).sort_values(by='Importance', ascending=True)
 
             # Plot Horizontal Bar Chart
@@ -146,5 +208,21 @@ if model is not None:
         else:
             st.warning("Model yang digunakan tidak mendukung Feature Importance bawaan.")
 
+        # Ringkasan SHAP global (dihitung saat training dari sample data train)
+        shap_summary = load_summary('models')
+        if shap_summary is not None and shap_summary['model_hash'] == meta['model_hash']:
+            shap_df = pd.DataFrame({
+                'Feature': shap_summary['feature_names'],
+                'Mean |SHAP|': shap_summary['mean_abs_shap']
+            }).sort_values(by='Mean |SHAP|', ascending=True)
+            fig_shap = px.bar(shap_df, x='Mean |SHAP|', y='Feature', orientation='h',
+                              title=f"Rata-rata |SHAP| ({shap_summary['sample_rows']} sample data train)")
+            fig_shap.update_layout(height=400)
+            st.plotly_chart(fig_shap, use_container_width=True)
+
 else:
-    st.error("Model belum dimuat. Pastikan Anda sudah menjalankan notebook modeling.")
\ No newline at end of file
+    st.error("Laporan evaluasi belum ada. Jalankan training terlebih dahulu "
+             "(python src/train_model.py), laporan dibuat otomatis di akhir training.")
+
+# Simpan hasil profiling ke PDM_PROFILE_OUT (no-op jika profiling nonaktif)
+export_json()
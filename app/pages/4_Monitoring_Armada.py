@@ -0,0 +1,128 @@
+import streamlit as st
+import pandas as pd
+import io
+import os
+import sys
+from PIL import Image
+
+# Modul src/ dipakai langsung oleh halaman
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src'))
+from fleet_monitor import (FEED_PATH, STATUS_NAMES, FileFeed, FleetMonitor, FleetState,
+                           SimulatedFeed, TileMap)
+from inference import load_or_build_pipeline
+from profiling import export_json, stage
+from utils import ModelRegistry, active_version
+
+# --- KONFIGURASI HALAMAN ---
+st.set_page_config(page_title="Fleet Monitor", page_icon="🛰️", layout="wide")
+
+# --- FUNGSI LOAD ASSETS ---
+@st.cache_resource
+def get_registry():
+    return ModelRegistry()
+
+@st.cache_resource
+def load_pipeline():
+    try:
+        return load_or_build_pipeline()
+    except (OSError, ValueError):
+        return None
+
+def build_monitor(source, feed_path, n_machines, interval, alarm_threshold, warn_threshold):
+    # Model dari registry (hot-swap) jika ada, selain itu artefak inference pipeline
+    registry = get_registry() if active_version() is not None else None
+    pipeline = None if registry is not None else load_pipeline()
+    if registry is None and pipeline is None:
+        return None
+    feed = FileFeed(feed_path) if source == 'File feed' else SimulatedFeed(n_machines, interval)
+    state = FleetState(capacity=max(n_machines, 1024), warn_threshold=warn_threshold,
+                       alarm_threshold=alarm_threshold)
+    return FleetMonitor(feed, state, pipeline=pipeline, registry=registry)
+
+st.title("🛰️ Monitoring Armada Mesin")
+st.markdown("Status seluruh mesin dari feed sensor live. Hanya panel live yang diperbarui tiap refresh.")
+
+# --- SIDEBAR: SUMBER FEED & THRESHOLD ---
+with st.sidebar:
+    st.header("⚙️ Sumber Data")
+    source = st.radio("Sumber feed", ['Simulasi internal', 'File feed'])
+    if source == 'File feed':
+        feed_path = st.text_input("Path feed", FEED_PATH)
+        st.caption("Tulis feed dengan `python src/fleet_monitor.py produce --machines 5000`")
+        n_machines, interval = 0, 1.0
+    else:
+        feed_path = None
+        n_machines = st.number_input("Jumlah mesin", 10, 20000, 5000, step=500)
+        interval = st.slider("Interval pembacaan per mesin (detik)", 0.25, 5.0, 1.0, step=0.25)
+    refresh = st.slider("Refresh panel (detik)", 0.25, 5.0, 0.5, step=0.25)
+    alarm_threshold = st.slider("Threshold alarm", 0.05, 0.95, 0.5, step=0.05)
+    warn_threshold = st.slider("Threshold waspada", 0.05, 0.95, 0.25, step=0.05)
+
+# Monitor disimpan di session: state armada bertahan antar refresh, dibuat ulang jika konfigurasi berubah
+config = (source, feed_path, n_machines, interval, alarm_threshold, warn_threshold)
+if st.session_state.get('fleet_config') != config:
+    st.session_state['fleet_monitor'] = build_monitor(*config)
+    st.session_state['fleet_config'] = config
+    st.session_state['fleet_tiles'] = TileMap()
+    st.session_state['fleet_view'] = None
+monitor = st.session_state['fleet_monitor']
+
+# --- PANEL LIVE (fragment: hanya bagian ini yang dijalankan ulang tiap refresh) ---
+@st.fragment(run_every=refresh)
+def live_panel():
+    with stage('monitor.step'):
+        changed = monitor.step()
+    state = monitor.state
+    counts = state.counts()
+
+    # Hanya tile mesin yang berubah status yang digambar ulang (PNG di-encode ulang hanya jika
+    # ada perubahan); tabel alarm & event dibangun ulang hanya saat ada status yang berubah.
+    # Tick tanpa perubahan menampilkan ulang hasil render sebelumnya.
+    view = st.session_state['fleet_view']
+    with stage('monitor.render', rows=len(changed)):
+        if st.session_state['fleet_tiles'].update(state, changed) or view is None:
+            buffer = io.BytesIO()
+            Image.fromarray(st.session_state['fleet_tiles'].image).save(buffer, format='PNG')
+            tiles_png = buffer.getvalue()
+        else:
+            tiles_png = view['tiles']
+        if len(changed) or view is None:
+            alarms = pd.DataFrame(state.active_alarms())
+            events = pd.DataFrame(list(state.events)[::-1][:10])
+        else:
+            alarms, events = view['alarms'], view['events']
+    st.session_state['fleet_view'] = {'tiles': tiles_png, 'alarms': alarms, 'events': events}
+
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Mesin", f"{state.n_machines:,}")
+    k2.metric("🚨 Alarm", f"{counts[3]:,}")
+    k3.metric("⚠️ Waspada", f"{counts[2]:,}")
+    k4.metric("Pembacaan/detik", f"{monitor.rows_per_sec():,.0f}")
+
+    col_tiles, col_alarm = st.columns([1.4, 1], gap="large")
+    with col_tiles:
+        st.subheader("🗺️ Peta Status Mesin")
+        st.image(tiles_png, caption=" | ".join(
+            f"{name}: {c:,}" for name, c in zip(STATUS_NAMES, counts)))
+    with col_alarm:
+        st.subheader("🚨 Alarm Aktif")
+        if len(alarms):
+            st.dataframe(alarms, hide_index=True, height=300,
+                         column_config={"Probabilitas": st.column_config.ProgressColumn(
+                             "Probabilitas", min_value=0.0, max_value=1.0, format="%.2f")})
+        else:
+            st.success("Tidak ada alarm aktif.")
+        if len(events):
+            st.caption("Alarm terbaru")
+            st.dataframe(events, hide_index=True)
+
+    step = monitor.last_step
+    st.caption(f"Batch terakhir: {step['rows']:,} pembacaan, {step['changed']:,} mesin berubah status, "
+               f"{step['seconds'] * 1000:.1f} ms | Versi model: `{step['model_version']}`")
+
+if monitor is None:
+    st.error("⚠️ File Model tidak ditemukan. Jalankan training terlebih dahulu.")
+else:
+    live_panel()
+
+export_json()
@@ -0,0 +1,99 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from inference import frame_to_matrix, load_or_build_pipeline
+from ingest import NULLABLE_SCHEMA, csv_options, read_header
+from profiling import stage
+from streaming_features import load_engine, model_features, uses_stream_features
+from utils import FEATURE_COLUMNS
+
+# Kolom identitas yang ikut ditulis ke output (kalau ada di file input)
+ID_COLUMNS = ['UDI', 'Product ID']
+
+def predict_chunk(chunk, pipeline, engine=None):
+  # Return (n, 1 + mode): kolom 0 = Machine failure, lalu probabilitas per mode (jika ada).
+  # Dengan engine fitur streaming, baris valid masuk ke riwayat per mesin sesuai urutan file
+  # (tanpa kolom mesin: satu aliran, sama seperti replay saat training).
+  X = frame_to_matrix(chunk)
+  valid = ~np.isnan(X).any(axis=1)
+  proba = np.full((len(X), 1 + len(pipeline.failure_modes)), np.nan, dtype=np.float32)
+  if valid.any():
+    if engine is not None and engine.machine_column:
+      machine_ids = chunk[engine.machine_column].to_numpy()[valid]
+    else:
+      machine_ids = np.zeros(int(valid.sum()), dtype=np.int64)
+    features = model_features(engine, pipeline, machine_ids, X[valid])
+    # Kolom & NaN sudah dicek per chunk di sini, jadi validasi ulang di pipeline dilewati
+    proba[valid] = pipeline.predict_modes(features, validate=False)
+  return proba, valid
+
+def score_csv(input_path, output_path, pipeline_path='models/inference_pipeline.pkl',
+              model_path='models/best_model.pkl', scaler_path='models/preprocessing.pkl',
+              chunksize=100_000, threshold=None, stream_dir=None):
+  pipeline = load_or_build_pipeline(pipeline_path, model_path, scaler_path)
+  if threshold is None:
+    threshold = pipeline.threshold
+  # Konfigurasi fitur streaming dari folder artefak (hanya untuk model dengan fitur streaming)
+  stream_dir = stream_dir or os.path.dirname(pipeline_path) or '.'
+  engine = load_engine(stream_dir) if uses_stream_features(pipeline) else None
+
+  header = read_header(input_path)
+  missing = [c for c in FEATURE_COLUMNS if c not in header]
+  if missing:
+    raise ValueError(f"Kolom wajib tidak ditemukan di {input_path}: {missing}")
+
+  # Hanya baca kolom yang dibutuhkan, dengan dtype skema ingest (boleh berisi nilai kosong)
+  id_cols = [c for c in ID_COLUMNS if c in header]
+  if engine is not None and engine.machine_column:
+    if engine.machine_column not in header:
+      raise ValueError(f"Kolom mesin {engine.machine_column!r} tidak ditemukan di {input_path}")
+    id_cols = list(dict.fromkeys(id_cols + [engine.machine_column]))
+  reader = pd.read_csv(input_path, chunksize=chunksize, encoding='utf-8-sig',
+                       **csv_options(header, id_cols + FEATURE_COLUMNS, NULLABLE_SCHEMA))
+
+  total_rows, total_invalid = 0, 0
+  start = time.perf_counter()
+  for i, chunk in enumerate(reader):
+    with stage('batch.predict', rows=len(chunk)):
+      proba, valid = predict_chunk(chunk, pipeline, engine)
+
+    with stage('batch.write', rows=len(chunk)):
+      out = chunk[id_cols].copy()
+      out['failure_proba'] = proba[:, 0]
+      out['prediction'] = np.where(valid, proba[:, 0] > threshold, -1).astype(np.int8)
+      for j, mode in enumerate(pipeline.failure_modes, start=1):
+        out[f"{mode}_proba"] = proba[:, j]
+      out.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0),
+                 index=False, float_format='%.6f')
+
+    total_rows += len(chunk)
+    total_invalid += int((~valid).sum())
+    elapsed = time.perf_counter() - start
+    print(f"Chunk {i + 1}: {total_rows:,} baris ({total_rows / elapsed:,.0f} baris/detik)")
+
+  elapsed = time.perf_counter() - start
+  rate = total_rows / elapsed if elapsed > 0 else 0.0
+  print(f"Scoring Selesai. {total_rows:,} baris dalam {elapsed:.2f} detik "
+        f"({rate:,.0f} baris/detik), {total_invalid:,} baris tidak valid.")
+  return {'rows': total_rows, 'invalid_rows': total_invalid,
+          'seconds': elapsed, 'rows_per_sec': rate}
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Batch scoring CSV skema ai4i2020.csv")
+  parser.add_argument('input', help="Path CSV input (skema ai4i2020.csv)")
+  parser.add_argument('output', help="Path CSV output probabilitas kegagalan")
+  parser.add_argument('--pipeline', default='models/inference_pipeline.pkl')
+  parser.add_argument('--model', default='models/best_model.pkl')
+  parser.add_argument('--scaler', default='models/preprocessing.pkl')
+  parser.add_argument('--chunksize', type=int, default=100_000)
+  parser.add_argument('--threshold', type=float, default=None)
+  parser.add_argument('--stream-config', default=None,
+                      help="Folder stream_features.json; default folder --pipeline")
+  args = parser.parse_args()
+
+  score_csv(args.input, args.output, args.pipeline, args.model, args.scaler, args.chunksize,
+            args.threshold, args.stream_config)
@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from fleet_simulator import TYPE_WEIGHTS, failure_labels, write_csv as write_fleet_csv
+from utils import FAILURE_MODES, TARGET_COLUMN, TYPE_MAP
+
+# Benchmark hot path: data sintetis berskema AI4I -> preprocess_data -> train -> predict_proba.
+# Tiap stage dijalankan di proses baru (spawn) agar peak RSS terukur per stage, lalu hasilnya
+# ditambahkan ke riwayat JSON (satu entri per run, dengan commit git) untuk dibandingkan antar commit.
+DEFAULT_SIZES = [10_000, 1_000_000, 10_000_000]
+HISTORY_PATH = 'reports/benchmarks/history.json'
+WORK_DIR = 'data/cache/benchmark'
+SOURCES = ['iid', 'fleet']  # iid: baris independen; fleet: pembacaan berurutan dari FleetSimulator
+
+def synthetic_frame(n_rows, seed=42, start_udi=1):
+  # Mengikuti distribusi sensor dataset AI4I 2020 (suhu, RPM, torsi, tool wear)
+  # dan aturan mode kegagalan TWF/HDF/PWF/OSF/RNF
+  rng = np.random.RandomState(seed)
+  udi = np.arange(start_udi, start_udi + n_rows)
+  types = rng.choice(list(TYPE_WEIGHTS), n_rows, p=list(TYPE_WEIGHTS.values()))
+  air = np.round(300 + rng.normal(0, 2, n_rows), 1)
+  process = np.round(air + 10 + rng.normal(0, 1, n_rows), 1)
+  # Torsi & RPM berkorelasi negatif (daya ~konstan), seperti korelasi -0.88 di data asli
+  z = rng.normal(size=(2, n_rows))
+  torque = np.round(np.clip(40 + 10 * z[0], 3.8, 76.6), 1)
+  rpm = np.clip(1540 - 180 * (0.88 * z[0] + 0.475 * z[1]), 1168, 2886).round()
+  tool_wear = rng.randint(0, 254, n_rows)
+
+  twf = (tool_wear >= 200) & (tool_wear <= 240) & (rng.rand(n_rows) < 0.05)
+  modes = failure_labels(pd.Series(types).map(TYPE_MAP).to_numpy(), air, process, rpm, torque,
+                         tool_wear, twf, rng.rand(n_rows) < 0.001)
+  df = pd.DataFrame({
+    'UDI': udi,
+    'Product ID': pd.Series(types) + pd.Series(udi + 10000).astype(str),
+    'Type': types,
+    'Air temperature [K]': air,
+    'Process temperature [K]': process,
+    'Rotational speed [rpm]': rpm.astype(np.int64),
+    'Torque [Nm]': torque,
+    'Tool wear [min]': tool_wear,
+  })
+  df[TARGET_COLUMN] = np.any([modes[m] for m in FAILURE_MODES], axis=0).astype(np.int64)
+  for m in FAILURE_MODES:
+    df[m] = modes[m].astype(np.int64)
+  return df
+
+def write_synthetic_csv(path, n_rows, seed=42, chunk_rows=1_000_000, source='iid'):
+  # Ditulis per chunk agar 10 juta baris tidak perlu ada di RAM sekaligus; di-cache per (baris, seed)
+  if os.path.exists(path):
+    return path
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  if source == 'fleet':
+    return write_fleet_csv(path, n_rows, seed=seed, chunk_rows=chunk_rows)
+  tmp = f"{path}.tmp"
+  for i, start in enumerate(range(0, n_rows, chunk_rows)):
+    chunk = synthetic_frame(min(chunk_rows, n_rows - start), seed + i, start_udi=start + 1)
+    chunk.to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+  os.replace(tmp, path)
+  return path
+
+def peak_rss_mb():
+  # ru_maxrss: KB di Linux, byte di macOS
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+def _stage_preprocess(work):
+  from data_preprocessing import preprocess_data
+  preprocess_data(work['raw'], work['data'], work['models'])
+  return {}
+
+def _stage_train(work):
+  from train_model import train, train_out_of_core
+  if work['rows'] <= work['train_max_rows']:
+    train(work['data'], work['models'])
+    return {'mode': 'in_memory'}
+  # Data besar: jalur out-of-core yang memang dipakai repo untuk data > RAM
+  train_out_of_core(work['data'], work['models'])
+  return {'mode': 'out_of_core'}
+
+def _stage_predict(work):
+  from inference import frame_to_matrix, load_pipeline
+  pipeline = load_pipeline(f"{work['models']}/inference_pipeline.pkl")
+  X = frame_to_matrix(pd.read_csv(work['raw'], nrows=work['predict_rows']))
+
+  # Latensi satu baris (seperti satu request di halaman prediksi / serve.py)
+  pipeline.predict_proba(X[:1])
+  n_single = min(work['single_calls'], len(X))
+  latencies = np.empty(n_single)
+  for i in range(n_single):
+    t0 = time.perf_counter()
+    pipeline.predict_proba(X[i:i + 1])
+    latencies[i] = time.perf_counter() - t0
+
+  # Throughput batch per ukuran batch
+  batches = {}
+  for size in work['batch_sizes']:
+    size = min(size, len(X))
+    t0 = time.perf_counter()
+    for start in range(0, len(X), size):
+      pipeline.predict_proba(X[start:start + size])
+    seconds = time.perf_counter() - t0
+    batches[str(size)] = {'seconds': seconds, 'rows_per_s': len(X) / seconds}
+  return {
+    'single_row': {'calls': n_single, 'p50_ms': float(np.percentile(latencies, 50) * 1e3),
+                   'p99_ms': float(np.percentile(latencies, 99) * 1e3),
+                   'rows_per_s': float(n_single / latencies.sum())},
+    'batch': batches,
+    'predict_rows': len(X),
+  }
+
+STAGES = {'preprocess': _stage_preprocess, 'train': _stage_train, 'predict': _stage_predict}
+
+def _run_stage(name, work):
+  # Dijalankan di proses anak: waktu wall + CPU dan peak RSS hanya untuk stage ini
+  baseline = peak_rss_mb()
+  wall, cpu = time.perf_counter(), time.process_time()
+  extra = STAGES[name](work)
+  return {'stage': name, 'rows': work['rows'], 'source': work['source'], 'seconds': time.perf_counter() - wall,
+          'cpu_seconds': time.process_time() - cpu, 'peak_rss_mb': peak_rss_mb(),
+          'baseline_rss_mb': baseline, **extra}
+
+def git_commit():
+  try:
+    out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                         check=True)
+    dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                           capture_output=True, text=True).stdout.strip()
+    return out.stdout.strip() + ('-dirty' if dirty else '')
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def environment():
+  import sklearn
+  return {'python': platform.python_version(), 'numpy': np.__version__,
+          'pandas': pd.__version__, 'sklearn': sklearn.__version__,
+          'machine': platform.machine(), 'cpu_count': os.cpu_count()}
+
+def run_benchmark(sizes=DEFAULT_SIZES, stages=list(STAGES), work_dir=WORK_DIR, seed=42,
+                  train_max_rows=1_000_000, predict_rows=100_000, single_calls=1000,
+                  batch_sizes=(1024, 65536), source='iid'):
+  results = []
+  ctx = get_context('spawn')
+  for n_rows in sizes:
+    base = os.path.join(work_dir, str(n_rows))
+    suffix = '' if source == 'iid' else f"_{source}"
+    work = {'rows': n_rows, 'raw': f"{work_dir}/synthetic_{n_rows}_{seed}{suffix}.csv",
+            'data': f"{base}/processed", 'models': f"{base}/models",
+            'train_max_rows': train_max_rows, 'predict_rows': predict_rows,
+            'single_calls': single_calls, 'batch_sizes': list(batch_sizes), 'source': source}
+    os.makedirs(work['data'], exist_ok=True)
+    os.makedirs(work['models'], exist_ok=True)
+    t0 = time.perf_counter()
+    write_synthetic_csv(work['raw'], n_rows, seed, source=source)
+    print(f"Data sintetis {n_rows:,} baris siap ({time.perf_counter() - t0:.1f}s).")
+
+    for name in stages:
+      with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+        result = pool.submit(_run_stage, name, work).result()
+      results.append(result)
+      print(f"  {name:<10} {result['seconds']:9.2f}s  peak RSS {result['peak_rss_mb']:8.0f} MB")
+  return results
+
+def load_history(path=HISTORY_PATH):
+  if not os.path.exists(path):
+    return []
+  with open(path) as f:
+    return json.load(f)
+
+def append_history(results, path=HISTORY_PATH):
+  history = load_history(path)
+  history.append({'commit': git_commit(), 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                  'environment': environment(), 'results': results})
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  tmp = f"{path}.tmp"
+  with open(tmp, 'w') as f:
+    json.dump(history, f, indent=2)
+  os.replace(tmp, path)
+  return history
+
+def compare(history):
+  # Bandingkan run terakhir dengan run sebelumnya untuk (stage, rows) yang sama
+  if len(history) < 2:
+    return []
+  # Run lama tanpa kolom source memakai data iid
+  key = lambda r: (r['stage'], r['rows'], r.get('source', 'iid'))
+  previous = {key(r): r for run in history[:-1] for r in run['results']}
+  rows = []
+  for r in history[-1]['results']:
+    old = previous.get(key(r))
+    if old is not None:
+      rows.append({'stage': r['stage'], 'rows': r['rows'], 'seconds': r['seconds'],
+                   'previous_seconds': old['seconds'], 'ratio': r['seconds'] / old['seconds'],
+                   'peak_rss_mb': r['peak_rss_mb'], 'previous_peak_rss_mb': old['peak_rss_mb']})
+  return rows
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark preprocessing, training & inferensi")
+  parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+  parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+  parser.add_argument('--work-dir', default=WORK_DIR)
+  parser.add_argument('--history', default=HISTORY_PATH)
+  parser.add_argument('--train-max-rows', type=int, default=1_000_000,
+                      help="Di atas ini training memakai jalur out-of-core")
+  parser.add_argument('--predict-rows', type=int, default=100_000)
+  parser.add_argument('--single-calls', type=int, default=1000)
+  parser.add_argument('--source', choices=SOURCES, default='iid',
+                      help="Generator data sintetis (fleet = stream armada berkorelasi)")
+  args = parser.parse_args()
+
+  results = run_benchmark(args.sizes, args.stages, args.work_dir,
+                          train_max_rows=args.train_max_rows, predict_rows=args.predict_rows,
+                          single_calls=args.single_calls, source=args.source)
+  history = append_history(results, args.history)
+  for row in compare(history):
+    print(f"{row['stage']:<10} {row['rows']:>11,} baris: {row['seconds']:.2f}s vs "
+          f"{row['previous_seconds']:.2f}s sebelumnya (x{row['ratio']:.2f})")
+  print(f"Benchmark Selesai. Riwayat disimpan di {args.history}")
+
+if __name__ == "__main__":
+  # Jalankan lewat modul `benchmark` agar proses anak (spawn) bisa mengimpor fungsi stage
+  import benchmark
+  benchmark.main()
@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.tree import DecisionTreeRegressor
+
+from inference import InferencePipeline, load_or_build_pipeline, save_pipeline
+from storage import load_split
+from tree_engine import NUMBA_AVAILABLE, FlatForest, tables_to_forest, tree_tables, verify_forest
+from utils import FEATURE_COLUMNS, SENSOR_RESOLUTION, load_model, register_model
+
+if NUMBA_AVAILABLE:
+  from numba import njit
+
+# Kompresi model untuk gateway edge: (1) pangkas jumlah pohon, kedalaman & node kecil,
+# (2) kuantisasi threshold ke resolusi sensor sehingga model bekerja langsung di kode integer
+# pembacaan (tanpa scaler) dan leaf disimpan int16, (3) opsional distilasi ensemble ke satu
+# pohon kecil. Hasil tiap varian dibandingkan dengan model asli pada X_test (akurasi/F1,
+# ukuran, latensi).
+OUTPUT_DIR = 'models/edge'
+
+def _node_depths(left, right):
+  # Indeks anak selalu > induk (sklearn & XGBoost), jadi satu pass berurutan cukup
+  depth = np.zeros(len(left), dtype=np.int64)
+  for node in range(len(left)):
+    if left[node] >= 0:
+      depth[left[node]] = depth[right[node]] = depth[node] + 1
+  return depth
+
+def prune_forest(model, n_trees=None, max_depth=None, min_weight=0.0):
+  # Ambil n_trees pohon pertama, potong di max_depth, dan jadikan leaf setiap split yang salah
+  # satu anaknya berbobot < min_weight (jumlah sampel sklearn / sum_hessian XGBoost). Nilai node
+  # internal (proporsi kelas / base_weight) menjadi nilai leaf baru.
+  trees, kind, n_features, base_margin = tree_tables(model)
+  trees = trees[:n_trees] if n_trees else trees
+  pruned = []
+  for t in trees:
+    left, right = t['left'].copy(), t['right'].copy()
+    internal = left >= 0
+    cut = np.zeros(len(left), dtype=bool)
+    if max_depth is not None:
+      cut |= internal & (_node_depths(left, right) >= max_depth)
+    if min_weight:
+      weight = t['weight']
+      cut |= internal & (np.minimum(weight[np.maximum(left, 0)], weight[np.maximum(right, 0)]) < min_weight)
+    left[cut] = right[cut] = -1
+    pruned.append({**t, 'left': left, 'right': right})
+  return tables_to_forest(pruned, kind, n_features, base_margin)
+
+def distill(teacher, X_train, max_depth=8, min_samples_leaf=5, random_state=42):
+  # Satu pohon regresi yang meniru probabilitas teacher pada data train (ruang ter-scaling)
+  X_train = np.asarray(X_train, dtype=np.float32)
+  target = teacher.predict_proba(X_train)[:, 1]
+  student = DecisionTreeRegressor(max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                  random_state=random_state).fit(X_train, target)
+  t = student.tree_
+  table = {'feature': t.feature, 'threshold': np.asarray(t.threshold, dtype=np.float32),
+           'left': t.children_left, 'right': t.children_right,
+           'default_left': np.ones(t.node_count, dtype=bool), 'value': t.value[:, 0, 0]}
+  # Threshold float64 sklearn -> float32 terbesar yang <= threshold (aturan sama dengan export)
+  thr = table['threshold']
+  above = thr.astype(np.float64) > t.threshold
+  thr[above] = np.nextafter(thr[above], np.float32(-np.inf))
+  return tables_to_forest([table], 'rf', X_train.shape[1])
+
+def quantize(forest, mean, scale, resolution=SENSOR_RESOLUTION):
+  # Threshold ruang ter-scaling -> kode integer pembacaan sensor. Untuk input tepat di grid
+  # resolusi, "x > t" setara "kode > k + 0.5" dengan k = floor(t_asli / resolusi).
+  step = np.array([resolution[c] for c in FEATURE_COLUMNS])
+  mean, scale = np.asarray(mean, dtype=np.float64), np.asarray(scale, dtype=np.float64)
+  internal = forest.left != np.arange(forest.n_nodes)
+  f = forest.feature[internal]
+  raw = forest.threshold[internal].astype(np.float64) * scale[f] + mean[f]
+  codes = np.floor(raw / step[f] + 1e-9)
+  if np.abs(codes).max(initial=0) >= np.iinfo(np.int16).max:
+    raise ValueError("Threshold di luar rentang int16 untuk resolusi sensor ini")
+  threshold = np.full(forest.n_nodes, np.inf, dtype=np.float32)
+  threshold[internal] = codes + 0.5
+
+  # Leaf int16 dengan satu faktor skala per model
+  value_scale = max(float(np.abs(forest.value).max()), 1e-12) / np.iinfo(np.int16).max
+  value_q = np.round(forest.value / value_scale).astype(np.int16)
+  quantized = FlatForest(forest.kind, forest.roots, forest.feature, threshold, forest.left,
+                         np.ones(forest.n_nodes, dtype=bool), value_q * value_scale,
+                         forest.max_depth, forest.n_features, forest.base_margin)
+  quantized.value_scale = value_scale
+  return quantized
+
+def compact_arrays(forest):
+  # Layout on-device: fitur uint8, threshold int16 (kode k), left (uint16 jika muat), leaf int16.
+  # Anak kanan = left + 1 dan leaf = node yang menunjuk dirinya sendiri, seperti FlatForest.
+  leaf = forest.left == np.arange(forest.n_nodes)
+  left_dtype = np.uint16 if forest.n_nodes <= np.iinfo(np.uint16).max else np.uint32
+  value_scale = getattr(forest, 'value_scale', None)
+  if value_scale is None:
+    raise ValueError("compact_arrays butuh forest hasil quantize()")
+  return {
+    'roots': forest.roots.astype(left_dtype),
+    'feature': forest.feature.astype(np.uint8),
+    'threshold': np.where(leaf, 0, forest.threshold - 0.5).astype(np.int16),
+    'left': forest.left.astype(left_dtype),
+    'value': np.round(forest.value / value_scale).astype(np.int16),
+  }
+
+def save_edge(forest, path):
+  arrays = compact_arrays(forest)
+  meta = {'kind': forest.kind, 'max_depth': forest.max_depth, 'n_features': forest.n_features,
+          'base_margin': forest.base_margin, 'value_scale': forest.value_scale,
+          'resolution': [SENSOR_RESOLUTION[c] for c in FEATURE_COLUMNS]}
+  np.savez(path, meta=json.dumps(meta), **arrays)
+  return sum(a.nbytes for a in arrays.values())
+
+def load_edge(path):
+  # Kembalikan FlatForest di ruang kode sensor (threshold k + 0.5)
+  with np.load(path) as data:
+    meta = json.loads(str(data['meta']))
+    arrays = {name: data[name] for name in ('roots', 'feature', 'threshold', 'left', 'value')}
+  leaf = arrays['left'] == np.arange(len(arrays['left']))
+  threshold = np.where(leaf, np.inf, arrays['threshold'] + 0.5)
+  forest = FlatForest(meta['kind'], arrays['roots'], arrays['feature'], threshold, arrays['left'],
+                      np.ones(len(leaf), dtype=bool), arrays['value'] * meta['value_scale'],
+                      meta['max_depth'], meta['n_features'], meta['base_margin'])
+  forest.value_scale = meta['value_scale']
+  return forest
+
+def edge_pipeline(forest, threshold=0.5, model_name=None, resolution=SENSOR_RESOLUTION):
+  # InferencePipeline biasa dengan mean 0 & scale = resolusi: transform() menghasilkan kode
+  # sensor, jadi model edge bisa dipakai serve.py / registry tanpa kode khusus
+  step = [resolution[c] for c in FEATURE_COLUMNS]
+  return InferencePipeline(forest, np.zeros(len(step)), step, threshold=threshold,
+                           model_name=model_name or f"EdgeForest[{forest.n_trees} pohon]")
+
+def _score_row_python(x, roots, feature, threshold, left, value):
+  total = 0.0
+  for root in roots:
+    node = root
+    while left[node] != node:
+      node = left[node] + (x[feature[node]] > threshold[node])
+    total += value[node]
+  return total
+
+if NUMBA_AVAILABLE:
+  # Satu baris, tanpa paralelisme: representasi loop di perangkat edge
+  _score_row = njit(cache=True)(_score_row_python)
+else:
+  _score_row = _score_row_python
+
+def row_latency_us(forest, X, n_calls=2000):
+  # Median waktu traversal satu baris (mikrodetik), tanpa overhead validasi/scaling
+  X = np.ascontiguousarray(X[:n_calls], dtype=np.float32)
+  args = (forest.roots, forest.feature, forest.threshold, forest.left, forest.value)
+  _score_row(X[0], *args)
+  times = np.empty(len(X))
+  for i, x in enumerate(X):
+    t0 = time.perf_counter()
+    _score_row(x, *args)
+    times[i] = time.perf_counter() - t0
+  return float(np.median(times) * 1e6)
+
+def measure(name, forest, X_model, y_test, threshold, baseline=None):
+  proba = forest.predict_proba(X_model)[:, 1]
+  y_pred = (proba > threshold).astype(int)
+  start = time.perf_counter()
+  forest.predict_proba(X_model)
+  batch_seconds = time.perf_counter() - start
+  size = sum(a.nbytes for a in compact_arrays(forest).values()) if hasattr(forest, 'value_scale') \
+    else forest.nbytes
+  row = {'variant': name, 'trees': forest.n_trees, 'nodes': forest.n_nodes,
+         'max_depth': forest.max_depth, 'size_kb': size / 1024,
+         'accuracy': float(accuracy_score(y_test, y_pred)), 'f1': float(f1_score(y_test, y_pred)),
+         'row_us': row_latency_us(forest, X_model),
+         'batch_rows_per_s': len(X_model) / batch_seconds if batch_seconds > 0 else 0.0}
+  if baseline is not None:
+    row['f1_loss'] = baseline['f1'] - row['f1']
+    row['size_ratio'] = row['size_kb'] / baseline['size_kb']
+    row['speedup'] = baseline['row_us'] / row['row_us'] if row['row_us'] > 0 else 0.0
+  return row
+
+def source_model(pipeline, model_path):
+  # Pruning butuh nilai & bobot node internal, yang tidak disimpan FlatForest. Jika artefak
+  # serving sudah dikompilasi, pohon diambil dari model asli (best_model.pkl) setelah dicek
+  # menghasilkan probabilitas yang sama dengan artefak.
+  if not isinstance(pipeline.model, FlatForest):
+    return pipeline.model
+  model = load_model(model_path)
+  try:
+    forest = tables_to_forest(*tree_tables(model))
+  except TypeError:
+    raise ValueError(f"Model asli {model_path} ({type(model).__name__}) tidak bisa dipangkas")
+  X_check = np.random.default_rng(0).normal(size=(1000, pipeline.model.n_features)).astype(np.float32)
+  try:
+    verify_forest(pipeline.model, forest, X_check)
+  except ValueError:
+    raise ValueError(f"Artefak serving berisi FlatForest yang bukan hasil kompilasi {model_path}; "
+                     "kompresi butuh model pohon aslinya")
+  return model
+
+def compress(data_path='data/processed', model_dir='models', output_dir=OUTPUT_DIR,
+             n_trees=50, max_depth=None, min_weight=0.0, distill_depth=8, register=None):
+  pipeline = load_or_build_pipeline(f"{model_dir}/inference_pipeline.pkl",
+                                    f"{model_dir}/best_model.pkl", f"{model_dir}/preprocessing.pkl")
+  model = source_model(pipeline, f"{model_dir}/best_model.pkl")
+  data = load_split(data_path, ['X_train', 'X_test', 'y_test'])
+  X_test = np.asarray(data['X_test'], dtype=np.float32)
+  y_test = np.asarray(data['y_test'])
+  # Pembacaan asli (grid resolusi sensor) -> kode integer untuk model terkuantisasi
+  step = np.array([SENSOR_RESOLUTION[c] for c in FEATURE_COLUMNS])
+  X_raw = np.round(X_test.astype(np.float64) * pipeline.scale + pipeline.mean, 4)
+  X_codes = np.round(X_raw / step).astype(np.float32)
+
+  threshold = pipeline.threshold
+  original = tables_to_forest(*tree_tables(model))
+  baseline = measure('original', original, X_test, y_test, threshold)
+  rows = [baseline]
+  variants = {}
+
+  pruned = prune_forest(model, n_trees, max_depth, min_weight)
+  rows.append(measure('pruned', pruned, X_test, y_test, threshold, baseline))
+  variants['pruned'] = quantize(pruned, pipeline.mean, pipeline.scale)
+  if distill_depth:
+    student = distill(original, data['X_train'], distill_depth)
+    rows.append(measure('distilled', student, X_test, y_test, threshold, baseline))
+    variants['distilled'] = quantize(student, pipeline.mean, pipeline.scale)
+
+  os.makedirs(output_dir, exist_ok=True)
+  for name, forest in variants.items():
+    rows.append(measure(f"{name}+quantized", forest, X_codes, y_test, threshold, baseline))
+    save_edge(forest, f"{output_dir}/{name}.npz")
+    save_pipeline(edge_pipeline(forest, threshold), f"{output_dir}/{name}_pipeline.pkl")
+
+  report = {'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'model': pipeline.model_name,
+            'threshold': threshold, 'test_rows': len(y_test),
+            'settings': {'n_trees': n_trees, 'max_depth': max_depth, 'min_weight': min_weight,
+                         'distill_depth': distill_depth},
+            'variants': rows}
+  with open(f"{output_dir}/report.json", 'w') as f:
+    json.dump(report, f, indent=2)
+
+  if register:
+    register_model(joblib.load(f"{output_dir}/{register}_pipeline.pkl"), f"{model_dir}/registry",
+                   activate=False, meta={'compressed_from': pipeline.version, 'variant': register})
+  return report
+
+def main():
+  parser = argparse.ArgumentParser(description="Kompresi model (pruning, kuantisasi, distilasi) untuk edge")
+  parser.add_argument('--data', default='data/processed')
+  parser.add_argument('--models', default='models')
+  parser.add_argument('--output', default=OUTPUT_DIR)
+  parser.add_argument('--n-trees', type=int, default=50)
+  parser.add_argument('--max-depth', type=int, default=None)
+  parser.add_argument('--min-weight', type=float, default=0.0,
+                      help="Potong split dengan anak berbobot < nilai ini (sampel / sum_hessian)")
+  parser.add_argument('--distill-depth', type=int, default=8, help="0 = tanpa distilasi")
+  parser.add_argument('--register', choices=['pruned', 'distilled'], default=None,
+                      help="Daftarkan varian ke registry (tidak diaktifkan)")
+  args = parser.parse_args()
+
+  report = compress(args.data, args.models, args.output, args.n_trees, args.max_depth,
+                    args.min_weight, args.distill_depth, args.register)
+  print(f"{'varian':<22}{'pohon':>6}{'node':>8}{'KB':>9}{'akurasi':>9}{'F1':>7}{'us/baris':>10}")
+  for r in report['variants']:
+    print(f"{r['variant']:<22}{r['trees']:>6}{r['nodes']:>8,}{r['size_kb']:>9.1f}{r['accuracy']:>9.4f}"
+          f"{r['f1']:>7.3f}{r['row_us']:>10.2f}")
+  print(f"Kompresi Selesai. Laporan disimpan di {args.output}/report.json")
+
+if __name__ == "__main__":
+  main()
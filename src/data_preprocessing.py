@@ -1,33 +1,62 @@
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+from inference import frame_to_matrix
+from ingest import MODEL_COLUMNS, read_ai4i
+from profiling import profiled, stage
+from storage import save_split
+from utils import FAILURE_MODES, FEATURE_COLUMNS, TARGET_COLUMN
+
+# Aturan split train/test (dipakai juga oleh pipeline.py inkremental, jadi kedua jalur
+# menghasilkan data/processed/split yang sama): deterministik per baris dari hash UDI, sehingga
+# baris lama tidak pindah train/test saat data baru ditambahkan. Urutan baris mengikuti file.
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+
+def assign_test(udi, test_size=TEST_SIZE, seed=SPLIT_SEED):
+  # Hash UDI seragam -> proporsi test ~test_size di tiap kelas (pengganti stratifikasi)
+  h = (udi.astype(np.uint64) * np.uint64(2654435761) + np.uint64(seed)) % np.uint64(2 ** 32)
+  return h.astype(np.float64) / 2 ** 32 < test_size
+
+@profiled('preprocess.total')
 def preprocess_data(input_path, output_data_path, output_model_path):
-  # Load Data
-  df = pd.read_csv(input_path)
+  # Load Data (dtype eksplisit; UDI & Product ID tidak di-parse karena langsung dibuang)
+  with stage('preprocess.read_csv') as s:
+    df = read_ai4i(input_path, ['UDI'] + MODEL_COLUMNS)
+    s.add_rows(len(df))
   
-  # Cleaning & Encoding (Sama seperti di notebook)
-  df = df.drop(columns=['UDI', 'Product ID', 'TWF', 'HDF', 'PWF', 'OSF', 'RNF'])
-  df['Type'] = df['Type'].map({'L': 0, 'M': 1, 'H': 2})
+  # Cleaning & Encoding (Sama seperti di notebook, Type L/M/H -> 0/1/2)
+  # Label mode kegagalan disimpan terpisah (target tambahan), bukan fitur.
+  # Baris dengan nilai kosong dibuang (sama seperti pipeline.py)
+  with stage('preprocess.encode', rows=len(df)):
+    X = frame_to_matrix(df)
+    valid = ~np.isnan(X).any(axis=1) & df[TARGET_COLUMN].notna().to_numpy()
+    X = pd.DataFrame(X[valid], columns=FEATURE_COLUMNS)
+    y = df[TARGET_COLUMN].to_numpy()[valid].astype('int8')
+    modes = df[FAILURE_MODES].fillna(0).to_numpy()[valid]
   
-  X = df.drop('Machine failure', axis=1)
-  y = df['Machine failure']
-  
-  # Split
-  X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=42)
+  # Split per baris dari hash UDI (lihat assign_test)
+  with stage('preprocess.split', rows=len(df)):
+    test = assign_test(df['UDI'].to_numpy()[valid])
+    X_train, X_test, y_train, y_test = X[~test], X[test], y[~test], y[test]
+    modes_train, modes_test = modes[~test], modes[test]
   
   # Scaling
-  scaler = StandardScaler()
-  X_train_scaled = scaler.fit_transform(X_train)
-  X_test_scaled = scaler.transform(X_test)
-  
-  # Save Scaler (sesuai struktur models/preprocessing.pkl)
-  joblib.dump(scaler, f"{output_model_path}/preprocessing.pkl")
+  with stage('preprocess.scale', rows=len(df)):
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
   
-  # Save Split Data
-  data = {'X_train': X_train_scaled, 'X_test': X_test_scaled, 'y_train': y_train, 'y_test': y_test}
-  joblib.dump(data, f"{output_data_path}/split_data.pkl")
+  with stage('preprocess.save', rows=len(df)):
+    # Save Scaler (sesuai struktur models/preprocessing.pkl)
+    joblib.dump(scaler, f"{output_model_path}/preprocessing.pkl")
+    
+    # Save Split Data (layout kolumnar .npy + manifest, bisa di-mmap per array)
+    save_split(output_data_path, X_train_scaled, X_test_scaled, y_train, y_test, X.columns.tolist(),
+               meta={'failure_modes': FAILURE_MODES},
+               y_modes_train=modes_train.astype('int8'), y_modes_test=modes_test.astype('int8'))
   
   print("Preprocessing Selesai.")
 
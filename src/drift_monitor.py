@@ -0,0 +1,342 @@
+import argparse
+import collections
+import json
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from storage import MANIFEST_NAME, load_arrays, load_manifest, load_split, save_arrays
+from utils import FEATURE_COLUMNS, OPERATOR_RANGES, TYPE_MAP
+
+# Monitor drift & kualitas data untuk aliran scoring. State per (grup, fitur) berukuran tetap:
+# histogram dengan bin dari quantile data train, jumlah/mean/M2 (Welford), counter NaN dan
+# di luar rentang operator. Grup 0 = semua baris, grup 1.. = per Type (L/M/H). Semua state
+# berupa penjumlahan, jadi monitor dari beberapa worker bisa di-merge tanpa menyimpan data mentah.
+# Baris yang ditolak validasi serving (nilai kosong / tidak berhingga) tetap dicatat, ditandai
+# counter `rejected`. RollingDriftMonitor menyimpan satu monitor per interval dan melaporkan
+# gabungan N interval terakhir, agar drift baru tidak teredam trafik lama.
+REFERENCE_DIR = 'models/drift_reference'
+DEFAULT_BINS = 20
+DEFAULT_INTERVAL = 300.0
+DEFAULT_INTERVALS = 12
+PSI_ALERT = 0.2
+KS_ALERT = 0.1
+MIN_ALERT_ROWS = 1000
+STATE_FIELDS = ['counts', 'n', 'mean', 'm2', 'missing', 'below', 'above', 'rows', 'rejected']
+GROUP_NAMES = ['Semua'] + [f"Type {label}" for label in TYPE_MAP]
+
+def _group_index(X):
+  # (n,) indeks grup per baris dari kolom Type (kode 0/1/2); Type tidak valid -> hanya grup 0
+  codes = X[:, 0]
+  valid = np.isin(codes, list(TYPE_MAP.values()))
+  group = np.zeros(len(X), dtype=np.int64)
+  group[valid] = codes[valid].astype(np.int64) + 1
+  return group
+
+def _moments(values, group, n_groups):
+  # count, mean, M2 per grup untuk satu kolom (NaN diabaikan)
+  ok = ~np.isnan(values)
+  g, v = group[ok], values[ok]
+  count = np.bincount(g, minlength=n_groups).astype(np.float64)
+  total = np.bincount(g, weights=v, minlength=n_groups)
+  mean = np.divide(total, count, out=np.zeros(n_groups), where=count > 0)
+  m2 = np.bincount(g, weights=(v - mean[g]) ** 2, minlength=n_groups)
+  # Grup 0 (semua baris) = gabungan seluruh baris valid
+  count[0], mean[0] = len(v), v.mean() if len(v) else 0.0
+  m2[0] = ((v - mean[0]) ** 2).sum()
+  return count, mean, m2
+
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+  # Rumus gabungan paralel Chan et al. (Welford untuk batch)
+  n = n_a + n_b
+  delta = mean_b - mean_a
+  safe = np.where(n > 0, n, 1)
+  mean = mean_a + delta * n_b / safe
+  m2 = m2_a + m2_b + delta ** 2 * n_a * n_b / safe
+  return n, mean, m2
+
+class DriftReference:
+  # Referensi dari data train: edge bin per fitur (quantile, unik, dipadding +inf) dan
+  # proporsi referensi per (grup, fitur, bin)
+  def __init__(self, edges, ref_counts, mean, std, feature_names):
+    self.edges = np.asarray(edges, dtype=np.float64)
+    self.ref_counts = np.asarray(ref_counts, dtype=np.float64)
+    self.mean = np.asarray(mean, dtype=np.float64)
+    self.std = np.asarray(std, dtype=np.float64)
+    self.feature_names = list(feature_names)
+
+  @property
+  def n_bins(self):
+    return self.edges.shape[1] + 1
+
+  def bin_index(self, X):
+    # (n, fitur) indeks bin; NaN dapat bin terakhir tapi dikeluarkan oleh pemanggil
+    return np.stack([np.searchsorted(self.edges[j], X[:, j], side='right')
+                     for j in range(X.shape[1])], axis=1)
+
+  @classmethod
+  def from_data(cls, X_raw, feature_names=FEATURE_COLUMNS, n_bins=DEFAULT_BINS):
+    X_raw = np.asarray(X_raw, dtype=np.float64)
+    quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+    edges = np.full((X_raw.shape[1], n_bins - 1), np.inf)
+    for j in range(X_raw.shape[1]):
+      unique = np.unique(np.nanquantile(X_raw[:, j], quantiles))
+      edges[j, :len(unique)] = unique
+    reference = cls(edges, np.zeros((len(GROUP_NAMES), X_raw.shape[1], n_bins)),
+                    np.nanmean(X_raw, axis=0), np.nanstd(X_raw, axis=0), feature_names)
+    reference.ref_counts = DriftMonitor(reference).update(X_raw).counts
+    return reference
+
+  def save(self, path=REFERENCE_DIR):
+    save_arrays(path, {'edges': self.edges, 'ref_counts': self.ref_counts, 'mean': self.mean,
+                       'std': self.std}, columns=self.feature_names)
+
+  @classmethod
+  def load(cls, path=REFERENCE_DIR):
+    arrays = load_arrays(path, mmap_mode=None)
+    return cls(arrays['edges'], arrays['ref_counts'], arrays['mean'], arrays['std'],
+               load_manifest(path)['columns'])
+
+class DriftMonitor:
+  def __init__(self, reference):
+    self.reference = reference
+    shape = (len(GROUP_NAMES), len(reference.feature_names))
+    self.counts = np.zeros(shape + (reference.n_bins,), dtype=np.int64)
+    self.n = np.zeros(shape)
+    self.mean = np.zeros(shape)
+    self.m2 = np.zeros(shape)
+    self.missing = np.zeros(shape, dtype=np.int64)
+    self.below = np.zeros(shape, dtype=np.int64)
+    self.above = np.zeros(shape, dtype=np.int64)
+    self.rows = np.zeros(len(GROUP_NAMES), dtype=np.int64)
+    self.rejected = np.zeros(len(GROUP_NAMES), dtype=np.int64)
+    self.lock = threading.Lock()
+    names = reference.feature_names
+    self._ranges = [(names.index(c), lo, hi) for c, (lo, hi) in OPERATOR_RANGES.items() if c in names]
+
+  def update(self, X_raw, rejected=False):
+    # X_raw: (n, fitur) mentah (Type kode 0/1/2, NaN = kosong). Biaya O(n x fitur), memori tetap.
+    # rejected=True: baris yang ditolak serving (tetap masuk counter kualitas data & histogram).
+    X = np.asarray(X_raw, dtype=np.float64)
+    if X.ndim == 1:
+      X = X.reshape(1, -1)
+    n_groups, n_features, n_bins = self.counts.shape
+    group = _group_index(X)
+    nan = np.isnan(X)
+    bins = self.reference.bin_index(X)
+
+    # Histogram: indeks datar (grup, fitur, bin) lalu satu bincount, untuk grup per-Type dan grup 0
+    flat = (group[:, None] * n_features + np.arange(n_features)) * n_bins + bins
+    flat_all = np.arange(n_features) * n_bins + bins
+    valid = ~nan
+    counts = np.bincount(flat[valid], minlength=self.counts.size)
+    counts[:n_features * n_bins] += np.bincount(flat_all[valid & (group[:, None] > 0)],
+                                                minlength=n_features * n_bins)
+    counts = counts.reshape(self.counts.shape)
+
+    # Counter per grup: jumlahkan indikator per baris dengan bincount lalu tambahkan total ke grup 0
+    def per_group(flags):
+      out = np.stack([np.bincount(group, weights=flags[:, j], minlength=n_groups)
+                      for j in range(flags.shape[1])], axis=1).astype(np.int64)
+      out[0] = flags.sum(axis=0)
+      return out
+
+    lo = np.full(n_features, -np.inf)
+    hi = np.full(n_features, np.inf)
+    for j, low, high in self._ranges:
+      lo[j], hi[j] = low, high
+    missing = per_group(nan)
+    below = per_group(X < lo)
+    above = per_group(X > hi)
+    rows = np.bincount(group, minlength=n_groups)
+    rows[0] = len(X)
+
+    stats = [_moments(X[:, j], group, n_groups) for j in range(n_features)]
+    n_b = np.stack([s[0] for s in stats], axis=1)
+    mean_b = np.stack([s[1] for s in stats], axis=1)
+    m2_b = np.stack([s[2] for s in stats], axis=1)
+
+    with self.lock:
+      self.counts += counts
+      self.missing += missing
+      self.below += below
+      self.above += above
+      self.rows += rows
+      if rejected:
+        self.rejected += rows
+      self.n, self.mean, self.m2 = _merge_moments(self.n, self.mean, self.m2, n_b, mean_b, m2_b)
+    return self
+
+  def snapshot(self):
+    # Salinan konsisten semua state (histogram + momen dari update yang sama) di bawah lock
+    with self.lock:
+      return {name: getattr(self, name).copy() for name in STATE_FIELDS}
+
+  def merge(self, other):
+    # Gabungkan state monitor dari worker/proses lain (referensi harus sama). State `other`
+    # disalin dulu di bawah lock-nya sendiri, baru digabung di bawah lock self: tidak ada dua
+    # lock yang dipegang bersamaan, dan monitor yang masih di-update tidak terbaca setengah jadi.
+    if not np.array_equal(self.reference.edges, other.reference.edges):
+      raise ValueError("Monitor dengan referensi berbeda tidak bisa digabung")
+    state = other.snapshot()
+    with self.lock:
+      self.counts += state['counts']
+      self.missing += state['missing']
+      self.below += state['below']
+      self.above += state['above']
+      self.rows += state['rows']
+      self.rejected += state['rejected']
+      self.n, self.mean, self.m2 = _merge_moments(self.n, self.mean, self.m2,
+                                                  state['n'], state['mean'], state['m2'])
+    return self
+
+  def psi_ks(self):
+    # PSI & KS (pada batas bin) per (grup, fitur) terhadap referensi train
+    live = self.counts.astype(np.float64)
+    ref = self.reference.ref_counts
+    live_p = live / np.maximum(live.sum(axis=2, keepdims=True), 1)
+    ref_p = ref / np.maximum(ref.sum(axis=2, keepdims=True), 1)
+    eps = 1e-4
+    lp, rp = np.maximum(live_p, eps), np.maximum(ref_p, eps)
+    used = (live > 0) | (ref > 0)
+    psi = np.where(used, (lp - rp) * np.log(lp / rp), 0.0).sum(axis=2)
+    ks = np.abs(np.cumsum(live_p, axis=2) - np.cumsum(ref_p, axis=2)).max(axis=2)
+    return psi, ks
+
+  def quantile(self, q, group=0):
+    # Estimasi quantile per fitur dari histogram (interpolasi linear di dalam bin)
+    edges = self.reference.edges
+    out = np.full(edges.shape[0], np.nan)
+    for j in range(edges.shape[0]):
+      counts = self.counts[group, j]
+      total = counts.sum()
+      if not total:
+        continue
+      real = edges[j][np.isfinite(edges[j])]
+      lower = np.r_[self.reference.mean[j] - 4 * self.reference.std[j], real]
+      upper = np.r_[real, self.reference.mean[j] + 4 * self.reference.std[j]]
+      cum = np.cumsum(counts[:len(real) + 1])
+      b = min(int(np.searchsorted(cum, q * total, side='left')), len(real))
+      before = cum[b - 1] if b else 0
+      frac = (q * total - before) / max(counts[b], 1)
+      out[j] = lower[b] + (upper[b] - lower[b]) * min(max(frac, 0.0), 1.0)
+    return out
+
+  def report(self):
+    with self.lock:
+      return self._report()
+
+  def _report(self):
+    psi, ks = self.psi_ks()
+    std = np.sqrt(np.divide(self.m2, self.n, out=np.zeros_like(self.m2), where=self.n > 0))
+    groups, alerts = {}, []
+    for g, group_name in enumerate(GROUP_NAMES):
+      features = {}
+      for j, name in enumerate(self.reference.feature_names):
+        features[name] = {
+          'count': int(self.n[g, j]), 'mean': float(self.mean[g, j]), 'std': float(std[g, j]),
+          'missing': int(self.missing[g, j]), 'below_range': int(self.below[g, j]),
+          'above_range': int(self.above[g, j]), 'psi': float(psi[g, j]), 'ks': float(ks[g, j]),
+        }
+        if self.n[g, j] >= MIN_ALERT_ROWS and (psi[g, j] > PSI_ALERT or ks[g, j] > KS_ALERT):
+          alerts.append({'group': group_name, 'feature': name,
+                         'psi': float(psi[g, j]), 'ks': float(ks[g, j])})
+      groups[group_name] = {'rows': int(self.rows[g]), 'rejected': int(self.rejected[g]),
+                            'features': features}
+    return {'groups': groups, 'alerts': alerts}
+
+  def save(self, path):
+    # State per worker; digabung lagi dengan load_state(...).merge(...)
+    save_arrays(path, self.snapshot(), meta={'reference_edges': self.reference.edges.tolist()})
+
+  @classmethod
+  def load_state(cls, path, reference):
+    monitor = cls(reference)
+    if not np.array_equal(np.asarray(load_manifest(path)['meta']['reference_edges']),
+                          reference.edges):
+      raise ValueError(f"State {path} dibuat dengan referensi berbeda")
+    for name, arr in load_arrays(path, mmap_mode=None).items():
+      setattr(monitor, name, np.array(arr))
+    return monitor
+
+class RollingDriftMonitor:
+  # Jendela geser: satu DriftMonitor per interval waktu, laporan & state tersimpan = gabungan
+  # n_intervals interval terakhir. API sama dengan DriftMonitor (update/report/save).
+  def __init__(self, reference, interval=DEFAULT_INTERVAL, n_intervals=DEFAULT_INTERVALS,
+               clock=time.time):
+    self.reference = reference
+    self.interval = interval
+    self.n_intervals = n_intervals
+    self.clock = clock
+    self.buckets = collections.deque()
+    self.lock = threading.Lock()
+
+  def _bucket(self):
+    # Monitor interval berjalan; interval yang sudah keluar jendela dibuang
+    slot = int(self.clock() // self.interval)
+    while self.buckets and self.buckets[0][0] <= slot - self.n_intervals:
+      self.buckets.popleft()
+    if not self.buckets or self.buckets[-1][0] != slot:
+      self.buckets.append((slot, DriftMonitor(self.reference)))
+    return self.buckets[-1][1]
+
+  def update(self, X_raw, rejected=False):
+    with self.lock:
+      bucket = self._bucket()
+    bucket.update(X_raw, rejected)
+    return self
+
+  def window(self):
+    with self.lock:
+      self._bucket()
+      buckets = [monitor for _, monitor in self.buckets]
+    merged = DriftMonitor(self.reference)
+    for monitor in buckets:
+      merged.merge(monitor)
+    return merged
+
+  def report(self):
+    report = self.window().report()
+    report['window_seconds'] = self.interval * self.n_intervals
+    return report
+
+  def save(self, path):
+    self.window().save(path)
+
+def build_reference(data_path='data/processed', scaler_path='models/preprocessing.pkl',
+                    output_path=REFERENCE_DIR, n_bins=DEFAULT_BINS):
+  # Referensi = distribusi mentah data train (X_train di-unscale dengan scaler yang sama)
+  scaler = joblib.load(scaler_path)
+  data = load_split(data_path, ['X_train'])
+  X_raw = np.round(np.asarray(data['X_train'], dtype=np.float64) * scaler.scale_ + scaler.mean_, 4)
+  reference = DriftReference.from_data(X_raw, list(data['feature_names'] or FEATURE_COLUMNS), n_bins)
+  reference.save(output_path)
+  print(f"Referensi drift Selesai. {len(X_raw):,} baris train, disimpan di {output_path}")
+  return reference
+
+def load_reference(path=REFERENCE_DIR):
+  if not os.path.exists(os.path.join(path, MANIFEST_NAME)):
+    return None
+  return DriftReference.load(path)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Referensi & laporan drift sensor")
+  parser.add_argument('--data', default='data/processed')
+  parser.add_argument('--scaler', default='models/preprocessing.pkl')
+  parser.add_argument('--reference', default=REFERENCE_DIR)
+  parser.add_argument('--bins', type=int, default=DEFAULT_BINS)
+  parser.add_argument('--merge', nargs='*', default=None,
+                      help="Folder state monitor dari worker untuk digabung & dilaporkan")
+  args = parser.parse_args()
+
+  if args.merge:
+    reference = DriftReference.load(args.reference)
+    monitor = DriftMonitor(reference)
+    for path in args.merge:
+      monitor.merge(DriftMonitor.load_state(path, reference))
+    print(json.dumps(monitor.report()['alerts'], indent=2))
+  else:
+    build_reference(args.data, args.scaler, args.reference, args.bins)
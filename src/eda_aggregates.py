@@ -0,0 +1,226 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from ingest import CLEANED_SCHEMA, read_ai4i
+from profiling import stage
+from utils import TARGET_COLUMN
+
+# Agregat EDA dihitung sekali per partisi (Type, Machine failure). Semua agregat bisa
+# dijumlahkan antar partisi, sehingga filter di dashboard cukup menggabungkan partisi
+# tanpa menyentuh baris mentah; ukuran payload ke browser tetap walau data bertambah.
+HIST_COLUMN = 'Air temperature [K]'
+HIST_BINS = 60
+BOX_COLUMN = 'Torque [Nm]'
+BOX_RESOLUTION = 0.1  # resolusi sensor torsi, quantile dari histogram ini jadi eksak
+DENSITY_X = 'Rotational speed [rpm]'
+DENSITY_Y = 'Process temperature [K]'
+DENSITY_BINS = 50
+SCATTER_COLUMNS = ['Rotational speed [rpm]', 'Torque [Nm]', 'Tool wear [min]']
+SCATTER_MAX_NORMAL = 5000
+# Naikkan jika isi cache agregat berubah (cache lama dengan versi lain tidak dipakai)
+CACHE_VERSION = 2  # 2: payload (FilterIndex, agregat)
+
+class FilterIndex:
+  # Indeks baris per partisi (Type, Machine failure) dalam layout CSR: satu array row-id
+  # yang diurutkan per partisi + offset. Filter = gabungan slice, KPI dari statistik partisi.
+  def __init__(self, df, stat_columns=None):
+    types = np.sort(df['Type'].unique())
+    type_code = np.searchsorted(types, df['Type'].to_numpy())
+    code = type_code * 2 + df[TARGET_COLUMN].to_numpy().astype(np.int64)
+    # argsort stabil pada kode integer kecil = radix sort, O(n)
+    self.row_ids = np.argsort(code, kind='stable').astype(np.int64)
+    counts = np.bincount(code, minlength=len(types) * 2)
+    self.offsets = np.concatenate([[0], np.cumsum(counts)])
+    self.types = types.tolist()
+    self.total = len(df)
+
+    stat_columns = stat_columns or [c for c in df.columns if c not in ('Type', TARGET_COLUMN)]
+    self.stat_columns = list(stat_columns)
+    sorted_values = df[self.stat_columns].to_numpy(dtype=np.float64)[self.row_ids]
+    self.stats = {}
+    for key, start, stop in self._partitions():
+      block = sorted_values[start:stop]
+      self.stats[key] = {
+        'count': stop - start,
+        'sum': block.sum(axis=0),
+        'sumsq': (block ** 2).sum(axis=0),
+        'min': block.min(axis=0) if len(block) else np.full(len(self.stat_columns), np.inf),
+        'max': block.max(axis=0) if len(block) else np.full(len(self.stat_columns), -np.inf),
+      }
+
+  def _partitions(self):
+    for i, t in enumerate(self.types):
+      for f in (0, 1):
+        k = i * 2 + f
+        yield (t, f), self.offsets[k], self.offsets[k + 1]
+
+  def _selected(self, types, failures):
+    return [(key, start, stop) for key, start, stop in self._partitions()
+            if key[0] in types and key[1] in failures]
+
+  def rows(self, types, failures, start=0, limit=None):
+    # Row-id hasil filter (posisi baris di DataFrame asal); start/limit -> hanya satu halaman
+    # yang disalin, bukan seluruh hasil filter
+    parts = []
+    for _, lo, hi in self._selected(types, failures):
+      if start >= hi - lo:
+        start -= hi - lo
+        continue
+      lo, start = lo + start, 0
+      if limit is not None:
+        hi = min(hi, lo + limit)
+        limit -= hi - lo
+      parts.append(self.row_ids[lo:hi])
+      if limit == 0:
+        break
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+  def count(self, types, failures):
+    return int(sum(stop - start for _, start, stop in self._selected(types, failures)))
+
+  def summary(self, types, failures):
+    # Gabungkan statistik partisi: count, failures, mean/std/min/max per kolom tanpa scan
+    keys = [key for key, _, _ in self._selected(types, failures)]
+    n = sum(self.stats[k]['count'] for k in keys)
+    out = {'count': n, 'failures': sum(self.stats[k]['count'] for k in keys if k[1] == 1)}
+    if n == 0:
+      return out
+    total = sum(self.stats[k]['sum'] for k in keys)
+    total_sq = sum(self.stats[k]['sumsq'] for k in keys)
+    mean = total / n
+    std = np.sqrt(np.maximum(total_sq / n - mean ** 2, 0.0))
+    lo = np.min([self.stats[k]['min'] for k in keys], axis=0)
+    hi = np.max([self.stats[k]['max'] for k in keys], axis=0)
+    out['columns'] = {c: {'mean': mean[j], 'std': std[j], 'min': lo[j], 'max': hi[j]}
+                      for j, c in enumerate(self.stat_columns)}
+    return out
+
+def _edges(values, bins):
+  lo, hi = float(np.nanmin(values)), float(np.nanmax(values))
+  return np.linspace(lo, hi if hi > lo else lo + 1.0, bins + 1)
+
+def build_aggregates(df, index=None, seed=42):
+  if index is None:
+    index = FilterIndex(df)
+  failure = df[TARGET_COLUMN].to_numpy()
+  hist_edges = _edges(df[HIST_COLUMN], HIST_BINS)
+  box_min = float(df[BOX_COLUMN].min())
+  box_bins = int(round((float(df[BOX_COLUMN].max()) - box_min) / BOX_RESOLUTION)) + 1
+  density_x_edges = _edges(df[DENSITY_X], DENSITY_BINS)
+  density_y_edges = _edges(df[DENSITY_Y], DENSITY_BINS)
+
+  # Semua baris gagal selalu disimpan; baris normal di-sample proporsional per Type
+  n_normal = int((failure == 0).sum())
+  normal_rate = min(1.0, SCATTER_MAX_NORMAL / n_normal) if n_normal else 1.0
+  rng = np.random.RandomState(seed)
+
+  partitions = {}
+  for t in index.types:
+    for f in (0, 1):
+      part = df.iloc[index.rows([t], [f])]
+      box_idx = np.rint((part[BOX_COLUMN].to_numpy() - box_min) / BOX_RESOLUTION).astype(np.int64)
+      density, _, _ = np.histogram2d(part[DENSITY_X], part[DENSITY_Y],
+                                     bins=[density_x_edges, density_y_edges])
+      if f == 1:
+        sample = part[SCATTER_COLUMNS]
+      else:
+        sample = part[SCATTER_COLUMNS].sample(frac=normal_rate, random_state=rng)
+      partitions[(t, f)] = {
+        'count': len(part),
+        'hist': np.histogram(part[HIST_COLUMN], bins=hist_edges)[0],
+        'box_hist': np.bincount(box_idx, minlength=box_bins),
+        'density': density.astype(np.int64),
+        'scatter': sample.to_numpy(dtype=np.float32),
+      }
+
+  return {
+    'types': index.types,
+    'total': len(df),
+    'hist_edges': hist_edges,
+    'box_min': box_min,
+    'density_x_edges': density_x_edges,
+    'density_y_edges': density_y_edges,
+    'partitions': partitions,
+  }
+
+def load_or_build_aggregates(csv_path, cache_dir='data/cache'):
+  # Cache di disk dengan kunci versi format + path + ukuran + mtime file sumber.
+  # Return (DataFrame, FilterIndex, agregat); indeks & agregat dibangun sekali per file.
+  with stage('eda.read_csv') as s:
+    df = read_ai4i(csv_path, schema=CLEANED_SCHEMA)
+    s.add_rows(len(df))
+  stat = os.stat(csv_path)
+  key = joblib.hash((CACHE_VERSION, os.path.abspath(csv_path), stat.st_size, stat.st_mtime))
+  cache_path = os.path.join(cache_dir, f"eda_aggregates_v{CACHE_VERSION}_{key[:16]}.pkl")
+  if os.path.exists(cache_path):
+    index, aggs = joblib.load(cache_path)
+    return df, index, aggs
+  with stage('eda.build_aggregates', rows=len(df)):
+    index = FilterIndex(df)
+    aggs = build_aggregates(df, index)
+  os.makedirs(cache_dir, exist_ok=True)
+  joblib.dump((index, aggs), cache_path)
+  return df, index, aggs
+
+def _selected(aggs, types, failures):
+  return [(t, f) for t in types for f in failures if (t, f) in aggs['partitions']]
+
+def histogram(aggs, types, failures):
+  # {failure: counts} dengan bin edges bersama
+  out = {}
+  for f in failures:
+    keys = _selected(aggs, types, [f])
+    if keys:
+      out[f] = sum(aggs['partitions'][k]['hist'] for k in keys)
+  return aggs['hist_edges'], out
+
+def _quantiles_from_hist(counts, start, resolution):
+  # Statistik box-plot (Tukey) dari histogram bernilai diskrit
+  total = counts.sum()
+  values = np.round(start + np.arange(len(counts)) * resolution, 6)
+  cum = np.cumsum(counts)
+
+  def q(p):
+    # Interpolasi linear antar rank (sama seperti quantile default NumPy/Plotly)
+    rank = p * (total - 1)
+    lo = values[np.searchsorted(cum, np.floor(rank) + 1)]
+    hi = values[np.searchsorted(cum, np.ceil(rank) + 1)]
+    return float(lo + (hi - lo) * (rank - np.floor(rank)))
+
+  q1, median, q3 = q(0.25), q(0.5), q(0.75)
+  iqr = q3 - q1
+  present = values[counts > 0]
+  lower = float(present[present >= q1 - 1.5 * iqr].min())
+  upper = float(present[present <= q3 + 1.5 * iqr].max())
+  outliers = int(counts[(values < lower) | (values > upper)].sum())
+  return {'q1': q1, 'median': median, 'q3': q3, 'lowerfence': lower, 'upperfence': upper,
+          'outliers': outliers, 'count': int(total)}
+
+def box_stats(aggs, types, failures):
+  out = {}
+  for f in failures:
+    keys = _selected(aggs, types, [f])
+    counts = sum(aggs['partitions'][k]['box_hist'] for k in keys) if keys else None
+    if counts is not None and counts.sum() > 0:
+      out[f] = _quantiles_from_hist(counts, aggs['box_min'], BOX_RESOLUTION)
+  return out
+
+def density(aggs, types, failures):
+  keys = _selected(aggs, types, failures)
+  grid = sum(aggs['partitions'][k]['density'] for k in keys) if keys else \
+    np.zeros((DENSITY_BINS, DENSITY_BINS), dtype=np.int64)
+  return aggs['density_x_edges'], aggs['density_y_edges'], grid
+
+def scatter_sample(aggs, types, failures):
+  # DataFrame kecil untuk scatter 3D (semua baris gagal + sample baris normal)
+  frames = []
+  for t, f in _selected(aggs, types, failures):
+    part = pd.DataFrame(aggs['partitions'][(t, f)]['scatter'], columns=SCATTER_COLUMNS)
+    part[TARGET_COLUMN] = f
+    frames.append(part)
+  if not frames:
+    return pd.DataFrame(columns=SCATTER_COLUMNS + [TARGET_COLUMN])
+  return pd.concat(frames, ignore_index=True)
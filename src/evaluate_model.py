@@ -0,0 +1,211 @@
+import argparse
+import copy
+import os
+import time
+
+import joblib
+import numpy as np
+
+from inference import load_or_build_pipeline, save_pipeline
+from storage import MANIFEST_NAME, load_arrays, load_manifest, load_split, save_arrays
+from utils import REGISTRY_DIR, active_version, load_source_model, load_version, register_model
+
+# Laporan evaluasi dibuat sekali saat training (prediksi, probabilitas, confusion matrix,
+# kurva threshold) dan disimpan di models/evaluation/<key>/, dengan key = hash model + data test.
+# Halaman evaluasi cukup membaca artefak ini, tanpa pass ulang ke seluruh data test.
+# File pointer models/evaluation/LATEST berisi key laporan dari training terakhir, sehingga
+# pembaca tidak perlu me-load dan meng-hash model.
+REPORT_DIR = 'evaluation'
+LATEST_NAME = 'LATEST'
+
+def data_hash(X_test, y_test):
+  return joblib.hash((np.asarray(X_test), np.asarray(y_test)))
+
+def report_key(model, X_test, y_test):
+  return joblib.hash((joblib.hash(model), data_hash(X_test, y_test)))
+
+def threshold_curve(y_true, proba):
+  # Urutkan probabilitas sekali (desc), lalu cumsum: TP/FP untuk setiap threshold unik.
+  # Prediksi positif jika proba >= thresholds[i].
+  order = np.argsort(-proba, kind='stable')
+  p_sorted = proba[order]
+  y_sorted = y_true[order].astype(np.int64)
+  last = np.r_[np.flatnonzero(np.diff(p_sorted)), len(p_sorted) - 1]
+  tp = np.cumsum(y_sorted)[last]
+  fp = (last + 1) - tp
+  return p_sorted[last], tp, fp
+
+def cost_sweep(thresholds, tp, fp, n_positive, cost_maintenance, cost_failure):
+  # Biaya di semua threshold sekaligus, O(k) dari kurva TP/FP yang sudah diurutkan.
+  # Opsi ke-0 = tanpa alarm sama sekali. `cuts` memakai aturan serving: alarm jika proba > cut
+  # (titik tengah antara dua probabilitas unik berurutan). Cut terakhir (alarm semua) harus
+  # di bawah probabilitas terkecil, termasuk saat probabilitas itu 0.0.
+  thresholds = np.asarray(thresholds, dtype=np.float64)
+  tp = np.r_[0, tp]
+  fp = np.r_[0, fp]
+  lower = np.r_[thresholds[1:], np.nextafter(min(thresholds[-1], 0.0), -np.inf)]
+  middle = (thresholds + lower) / 2
+  # Titik tengah dua float yang bersebelahan bisa terbulatkan ke nilai atas -> pakai nilai bawah
+  cuts = np.r_[1.0, np.where(middle < thresholds, middle, lower)]
+  cost = (tp + fp) * cost_maintenance + (n_positive - tp) * cost_failure
+  return {'cuts': cuts, 'tp': tp, 'fp': fp, 'fn': n_positive - tp, 'cost': cost}
+
+def optimal_threshold(report, cost_maintenance, cost_failure):
+  meta = report['meta']
+  sweep = cost_sweep(report['thresholds'], report['tp'], report['fp'], meta['n_positive'],
+                     cost_maintenance, cost_failure)
+  best = int(np.argmin(sweep['cost']))
+  tp, fp, fn = int(sweep['tp'][best]), int(sweep['fp'][best]), int(sweep['fn'][best])
+  return {
+    'threshold': float(sweep['cuts'][best]),
+    'cost': float(sweep['cost'][best]),
+    'cost_without_model': float(meta['n_positive'] * cost_failure),
+    'confusion': {'tn': meta['n_rows'] - tp - fp - fn, 'fp': fp, 'fn': fn, 'tp': tp},
+    'sweep': sweep,
+  }
+
+def confusion_at_threshold(report, threshold):
+  # Confusion matrix untuk alarm proba > threshold, O(log k) lewat binary search di kurva
+  k = int(np.searchsorted(-np.asarray(report['thresholds']), -threshold, side='left'))
+  tp = int(report['tp'][k - 1]) if k else 0
+  fp = int(report['fp'][k - 1]) if k else 0
+  fn = report['meta']['n_positive'] - tp
+  return {'tn': report['meta']['n_rows'] - tp - fp - fn, 'fp': fp, 'fn': fn, 'tp': tp}
+
+def serving_threshold(pipeline_path='models/inference_pipeline.pkl', registry_dir=REGISTRY_DIR):
+  # Threshold yang sedang dipakai serving: versi aktif registry jika ada, selain itu artefak file
+  version = active_version(registry_dir)
+  if version is not None:
+    return load_version(version, registry_dir).threshold
+  return load_or_build_pipeline(pipeline_path).threshold
+
+def adopt_threshold(threshold, pipeline_path='models/inference_pipeline.pkl',
+                    registry_dir=REGISTRY_DIR):
+  # Simpan threshold baru ke artefak serving (dipakai batch_score.py & serve.py --pipeline).
+  # Jika registry dipakai, salinan versi aktif (bukan artefak file, yang bisa berbeda setelah
+  # rollback) diberi threshold baru lalu didaftarkan sebagai versi aktif baru (hot-swap).
+  pipeline = load_or_build_pipeline(pipeline_path)
+  pipeline.threshold = float(threshold)
+  save_pipeline(pipeline, pipeline_path)
+  version = active_version(registry_dir)
+  if version is not None:
+    pipeline = copy.copy(load_version(version, registry_dir))
+    pipeline.threshold = float(threshold)
+    register_model(pipeline, registry_dir, meta={'threshold': float(threshold), 'parent': version},
+                   source_model=load_source_model(version, registry_dir))
+  return pipeline
+
+def confusion_at(y_true, y_pred):
+  y_true = np.asarray(y_true).astype(bool)
+  y_pred = np.asarray(y_pred).astype(bool)
+  tp = int((y_true & y_pred).sum())
+  fp = int((~y_true & y_pred).sum())
+  fn = int((y_true & ~y_pred).sum())
+  return {'tn': len(y_true) - tp - fp - fn, 'fp': fp, 'fn': fn, 'tp': tp}
+
+def metrics_from_confusion(cm):
+  tp, fp, fn, tn = cm['tp'], cm['fp'], cm['fn'], cm['tn']
+  precision = tp / (tp + fp) if tp + fp else 0.0
+  recall = tp / (tp + fn) if tp + fn else 0.0
+  return {
+    'accuracy': (tp + tn) / max(tp + fp + fn + tn, 1),
+    'precision': precision,
+    'recall': recall,
+    'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+  }
+
+def build_report(model, X_test, y_test, feature_names=None, threshold=0.5):
+  y_true = np.asarray(y_test).astype(np.int8)
+  proba = model.predict_proba(X_test)[:, 1].astype(np.float64)
+  y_pred = (proba > threshold).astype(np.int8)
+  thresholds, tp, fp = threshold_curve(y_true, proba)
+
+  cm = confusion_at(y_true, y_pred)
+  importances = getattr(model, 'feature_importances_', None)
+  meta = {
+    'model_hash': joblib.hash(model),
+    'data_hash': data_hash(X_test, y_test),
+    'model_name': type(model).__name__,
+    'threshold': threshold,
+    'n_rows': len(y_true),
+    'n_positive': int(y_true.sum()),
+    'confusion': cm,
+    'metrics': metrics_from_confusion(cm),
+    'feature_names': list(feature_names or []),
+    'feature_importances': None if importances is None else [float(v) for v in importances],
+    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+  }
+  meta['key'] = joblib.hash((meta['model_hash'], meta['data_hash']))
+  arrays = {'y_true': y_true, 'proba': proba.astype(np.float32), 'y_pred': y_pred,
+            'thresholds': thresholds, 'tp': tp, 'fp': fp}
+  return arrays, meta
+
+def report_path(model_dir, key):
+  return os.path.join(model_dir, REPORT_DIR, key[:16])
+
+def save_report(model_dir, arrays, meta):
+  path = report_path(model_dir, meta['key'])
+  save_arrays(path, arrays, meta=meta)
+  return path
+
+def mark_latest(model_dir, key):
+  # Ganti pointer laporan terbaru secara atomik
+  tmp = os.path.join(model_dir, REPORT_DIR, f"{LATEST_NAME}.tmp")
+  with open(tmp, 'w') as f:
+    f.write(key[:16])
+  os.replace(tmp, os.path.join(model_dir, REPORT_DIR, LATEST_NAME))
+
+def latest_report_path(model_dir='models'):
+  # Folder laporan dari training terakhir, None jika belum pernah dibuat
+  try:
+    with open(os.path.join(model_dir, REPORT_DIR, LATEST_NAME)) as f:
+      name = f.read().strip()
+  except FileNotFoundError:
+    return None
+  path = os.path.join(model_dir, REPORT_DIR, name)
+  return path if name and os.path.exists(os.path.join(path, MANIFEST_NAME)) else None
+
+def load_report(path, mmap_mode='r'):
+  # Return dict: array (di-mmap) + 'meta' (metrik, confusion matrix, feature importance)
+  report = load_arrays(path, mmap_mode=mmap_mode)
+  report['meta'] = load_manifest(path)['meta']
+  return report
+
+def evaluate(data_path='data/processed', model_dir='models', model=None, threshold=0.5):
+  # Dipanggil di akhir training: hitung laporan untuk model + data test saat ini (sekali per versi)
+  model = model if model is not None else joblib.load(f"{model_dir}/best_model.pkl")
+  data = load_split(data_path, ['X_test', 'y_test'])
+  key = report_key(model, data['X_test'], data['y_test'])
+  path = report_path(model_dir, key)
+  if not os.path.exists(os.path.join(path, MANIFEST_NAME)):
+    arrays, meta = build_report(model, data['X_test'], data['y_test'], data['feature_names'],
+                                threshold)
+    save_report(model_dir, arrays, meta)
+    print(f"Evaluasi Selesai. F1 {meta['metrics']['f1']:.4f}, laporan disimpan di {path}")
+  mark_latest(model_dir, key)
+  return load_report(path)
+
+def load_latest_report(model_dir='models', mmap_mode='r'):
+  # Read-only: laporan dari training terakhir tanpa load model / data test, None jika belum ada
+  path = latest_report_path(model_dir)
+  return load_report(path, mmap_mode) if path is not None else None
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Buat laporan evaluasi model pada data test")
+  parser.add_argument('--data', default='data/processed')
+  parser.add_argument('--models', default='models')
+  parser.add_argument('--cost-maintenance', type=float, default=None,
+                      help="Biaya inspeksi per alarm; bersama --cost-failure mencari threshold optimal")
+  parser.add_argument('--cost-failure', type=float, default=None)
+  parser.add_argument('--apply', action='store_true',
+                      help="Simpan threshold optimal ke models/inference_pipeline.pkl")
+  args = parser.parse_args()
+
+  report = evaluate(args.data, args.models)
+  if args.cost_maintenance is not None and args.cost_failure is not None:
+    best = optimal_threshold(report, args.cost_maintenance, args.cost_failure)
+    print(f"Threshold optimal {best['threshold']:.4f}: biaya ${best['cost']:,.0f} "
+          f"(tanpa model ${best['cost_without_model']:,.0f})")
+    if args.apply:
+      adopt_threshold(best['threshold'], f"{args.models}/inference_pipeline.pkl",
+                      f"{args.models}/registry")
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+
+from storage import load_split
+from tree_engine import FlatForest, export_model
+from utils import FEATURE_COLUMNS, REGISTRY_DIR, SENSOR_RESOLUTION, load_model, load_source_model
+
+# shap opsional: XGBoost punya TreeSHAP bawaan (pred_contribs), shap hanya perlu untuk model lain
+try:
+  import shap
+  SHAP_AVAILABLE = True
+except ImportError:
+  SHAP_AVAILABLE = False
+
+try:
+  import xgboost as xgb
+  XGBOOST_AVAILABLE = True
+except ImportError:
+  XGBOOST_AVAILABLE = False
+
+SUMMARY_NAME = 'shap_summary.json'
+
+def make_explainer(model):
+  # Return fungsi X_scaled -> kontribusi TreeSHAP kelas positif, (n, fitur + 1);
+  # kolom terakhir = expected value (bias). Skala: log-odds (XGBoost) / probabilitas (RF).
+  if isinstance(model, FlatForest):
+    raise ValueError("FlatForest tidak menyimpan cover node, gunakan model asli (best_model.pkl)")
+  if XGBOOST_AVAILABLE and hasattr(model, 'get_booster'):
+    booster = model.get_booster()
+    return lambda X: booster.predict(xgb.DMatrix(X), pred_contribs=True)
+  if not SHAP_AVAILABLE:
+    raise ImportError("Paket shap dibutuhkan untuk menjelaskan model selain XGBoost")
+
+  explainer = shap.TreeExplainer(model)
+  expected = np.atleast_1d(explainer.expected_value)
+
+  def explain(X):
+    values = explainer.shap_values(X, check_additivity=False)
+    if isinstance(values, list):
+      values = values[-1]
+    elif values.ndim == 3:
+      values = values[:, :, -1]
+    return np.column_stack([values, np.full(len(X), expected[-1])])
+  return explain
+
+def source_model(pipeline, version=None, registry_dir=REGISTRY_DIR,
+                 model_path='models/best_model.pkl'):
+  # Model yang bisa dijelaskan untuk pipeline ini. Artefak registry berisi FlatForest, jadi dipakai
+  # model asli yang disimpan di versi tersebut, atau best_model.pkl jika hasil kompilasinya sama
+  # persis dengan FlatForest artefak (versi lama yang belum menyimpan model asli).
+  if not isinstance(pipeline.model, FlatForest):
+    return pipeline.model
+  model = load_source_model(version, registry_dir) if version else None
+  if model is not None:
+    return model
+  if os.path.exists(model_path):
+    model = load_model(model_path)
+    try:
+      if joblib.hash(export_model(model)) == pipeline.model_hash:
+        return model
+    except TypeError:
+      pass
+  raise ValueError("Model asli untuk FlatForest ini tidak ditemukan, penjelasan tidak tersedia")
+
+_WORKER_EXPLAIN = None
+
+def _worker_init(model):
+  # Model + explainer dibuat sekali per worker, bukan per batch
+  global _WORKER_EXPLAIN
+  if hasattr(model, 'set_params') and hasattr(model, 'get_booster'):
+    model.set_params(n_jobs=1)
+  _WORKER_EXPLAIN = make_explainer(model)
+
+def _worker_explain(X):
+  return _WORKER_EXPLAIN(X)
+
+class ExplanationService:
+  # Penjelasan per prediksi: input mentah di-dedup per vektor terkuantisasi, dicari di cache LRU,
+  # dan hanya baris yang belum pernah dilihat yang dihitung (batch, paralel jika besar).
+  def __init__(self, pipeline, model=None, cache_size=100_000, n_jobs=1, parallel_min_rows=4096):
+    self.pipeline = pipeline
+    self.model = model if model is not None else pipeline.model
+    self.feature_names = list(pipeline.feature_columns)
+    # Kolom sensor mentah dibulatkan ke resolusi pembacaan (utils.SENSOR_RESOLUTION) untuk kunci
+    # cache dan penjelasan dihitung pada nilai yang sudah dibulatkan; fitur turunan (model
+    # streaming) tidak punya grid, jadi dipakai nilai persisnya.
+    self.quantized = np.array([c in SENSOR_RESOLUTION for c in self.feature_names])
+    self.steps = np.array([SENSOR_RESOLUTION[c] for c in self.feature_names if c in SENSOR_RESOLUTION])
+    self.cache_size = cache_size
+    self.n_jobs = n_jobs
+    self.parallel_min_rows = parallel_min_rows
+    self.cache = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self._explain = make_explainer(self.model)
+    self._pool = None
+
+  def _compute(self, X_raw):
+    X = self.pipeline.transform(X_raw)
+    if self.n_jobs > 1 and len(X) >= self.parallel_min_rows:
+      if self._pool is None:
+        self._pool = ProcessPoolExecutor(self.n_jobs, initializer=_worker_init, initargs=(self.model,))
+      chunks = np.array_split(X, self.n_jobs)
+      return np.concatenate(list(self._pool.map(_worker_explain, chunks)))
+    return self._explain(X)
+
+  def explain(self, X_raw):
+    # X_raw: matriks mentah (n, fitur) seperti input InferencePipeline -> kontribusi (n, fitur + 1)
+    X_raw = self.pipeline.validate(X_raw)
+    codes = np.array(X_raw, dtype=np.float64)
+    codes[:, self.quantized] = np.rint(codes[:, self.quantized] / self.steps)
+    unique, inverse = np.unique(codes, axis=0, return_inverse=True)
+    keys = [row.tobytes() for row in unique]
+
+    out = np.empty((len(unique), len(self.feature_names) + 1))
+    missing = []
+    for i, key in enumerate(keys):
+      cached = self.cache.get(key)
+      if cached is None:
+        missing.append(i)
+      else:
+        self.cache.move_to_end(key)
+        out[i] = cached
+    if missing:
+      values = unique[missing]
+      values[:, self.quantized] *= self.steps
+      out[missing] = self._compute(values)
+      for i in missing:
+        self.cache[keys[i]] = out[i].copy()
+      while len(self.cache) > self.cache_size:
+        self.cache.popitem(last=False)
+
+    self.hits += len(keys) - len(missing)
+    self.misses += len(missing)
+    return out[inverse.ravel()]
+
+  def top_features(self, X_raw, k=1):
+    # k sensor dengan kontribusi terbesar ke arah kegagalan, per baris: [(nama, kontribusi), ...]
+    contrib = self.explain(X_raw)[:, :-1]
+    order = np.argsort(-contrib, axis=1, kind='stable')[:, :k]
+    return [[(self.feature_names[j], float(row[j])) for j in idx] for row, idx in zip(contrib, order)]
+
+  def stats(self):
+    total = self.hits + self.misses
+    return {'hits': self.hits, 'misses': self.misses, 'size': len(self.cache),
+            'hit_rate': self.hits / total if total else 0.0}
+
+  def close(self):
+    if self._pool is not None:
+      self._pool.shutdown()
+      self._pool = None
+
+def summarize(data_path='data/processed', model_dir='models', model=None, sample_rows=2000,
+              random_state=42):
+  # Ringkasan background saat training: expected value + rata-rata |SHAP| per fitur
+  # dari sample data train, disimpan di models/shap_summary.json
+  model = model if model is not None else joblib.load(f"{model_dir}/best_model.pkl")
+  try:
+    explain = make_explainer(model)
+  except ImportError as e:
+    print(f"Ringkasan SHAP dilewati: {e}")
+    return None
+
+  data = load_split(data_path, ['X_train'])
+  X_train = data['X_train']
+  rng = np.random.RandomState(random_state)
+  idx = np.sort(rng.choice(len(X_train), min(sample_rows, len(X_train)), replace=False))
+  contrib = explain(np.ascontiguousarray(X_train[idx], dtype=np.float32))
+
+  summary = {
+    'model_hash': joblib.hash(model),
+    'feature_names': list(data['feature_names'] or FEATURE_COLUMNS),
+    'expected_value': float(contrib[:, -1].mean()),
+    'mean_abs_shap': np.abs(contrib[:, :-1]).mean(axis=0).tolist(),
+    'sample_rows': len(idx),
+    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+  }
+  with open(os.path.join(model_dir, SUMMARY_NAME), 'w') as f:
+    json.dump(summary, f, indent=2)
+  print(f"Ringkasan SHAP Selesai ({len(idx)} baris sample).")
+  return summary
+
+def load_summary(model_dir='models'):
+  path = os.path.join(model_dir, SUMMARY_NAME)
+  if not os.path.exists(path):
+    return None
+  with open(path) as f:
+    return json.load(f)
+
+def main():
+  parser = argparse.ArgumentParser(description="Ringkasan SHAP global dari sample data train")
+  parser.add_argument('--data', default='data/processed')
+  parser.add_argument('--models', default='models')
+  parser.add_argument('--sample-rows', type=int, default=2000)
+  args = parser.parse_args()
+
+  summarize(args.data, args.models, sample_rows=args.sample_rows)
+
+if __name__ == "__main__":
+  # Jalankan lewat modul `explain` agar worker process pool bisa mengimpor fungsi worker
+  import explain
+  explain.main()
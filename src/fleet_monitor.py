@@ -0,0 +1,300 @@
+import argparse
+import collections
+import os
+import time
+
+import numpy as np
+
+from fleet_simulator import FleetSimulator, parse_inject
+from profiling import stage
+from utils import FEATURE_COLUMNS, TYPE_MAP
+
+# Monitoring armada dari feed lokal: pembacaan baru di-tail dari file biner append-only (atau
+# dibangkitkan FleetSimulator in-process), di-skor per batch, lalu state per mesin disimpan di
+# array (indeks = id mesin). Tiap langkah hanya mengembalikan mesin yang statusnya berubah,
+# sehingga UI cukup memperbarui tile & alarm yang berubah.
+FEED_PATH = 'data/cache/fleet/feed.bin'
+# Satu record = id mesin, timestamp, 6 nilai mentah urutan FEATURE_COLUMNS (Type kode 0/1/2)
+FEED_DTYPE = np.dtype([('machine', '<u4'), ('time', '<f8'), ('x', '<f4', (len(FEATURE_COLUMNS),))])
+STATUS_NAMES = ['Belum ada data', 'Normal', 'Waspada', 'Alarm']
+STATUS_COLORS = np.array([[200, 200, 200], [46, 204, 113], [241, 196, 15], [231, 76, 60]],
+                         dtype=np.uint8)
+
+def records(machine_ids, X, timestamp=None):
+  out = np.empty(len(X), dtype=FEED_DTYPE)
+  out['machine'] = machine_ids
+  out['time'] = time.time() if timestamp is None else timestamp
+  out['x'] = X
+  return out
+
+class FeedWriter:
+  # Append record utuh; pembaca hanya mengambil record lengkap. truncate=True membuat file baru
+  # lalu rename ke path (inode baru), sehingga pembaca yang sedang tail mendeteksi restart
+  # producer meski file baru sudah lebih panjang dari offset lama.
+  def __init__(self, path=FEED_PATH, truncate=True):
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    if truncate:
+      tmp = f"{path}.tmp"
+      self.file = open(tmp, 'wb')
+      os.replace(tmp, path)
+    else:
+      self.file = open(path, 'ab')
+
+  def write(self, machine_ids, X, timestamp=None):
+    self.file.write(records(machine_ids, X, timestamp).tobytes())
+    self.file.flush()
+
+  def close(self):
+    self.file.close()
+
+class FileFeed:
+  # Tail file feed: baca byte baru sejak offset terakhir. File yang dibuat ulang (inode berubah)
+  # dibaca dari awal setelah sisa file lama dihabiskan lewat handle lama; file yang dipotong di
+  # tempat (ukuran mengecil) juga dibaca lagi dari awal.
+  def __init__(self, path=FEED_PATH, from_start=False):
+    self.path = path
+    self.file = None
+    self.inode = None
+    self.offset = 0
+    self.from_start = from_start
+
+  def _reopen(self):
+    if self.file is not None:
+      self.file.close()
+    self.file = open(self.path, 'rb')
+    stat = os.fstat(self.file.fileno())
+    first = self.inode is None
+    self.inode = stat.st_ino
+    # Saat pertama dibuka tanpa from_start: mulai dari record lengkap terakhir (hanya data baru)
+    self.offset = 0 if self.from_start or not first else stat.st_size - stat.st_size % FEED_DTYPE.itemsize
+
+  def _read(self, size, max_records):
+    n = (size - self.offset) // FEED_DTYPE.itemsize
+    if max_records is not None:
+      n = min(n, max_records)
+    if n <= 0:
+      return np.empty(0, dtype=FEED_DTYPE)
+    self.file.seek(self.offset)
+    data = self.file.read(n * FEED_DTYPE.itemsize)
+    data = data[:len(data) - len(data) % FEED_DTYPE.itemsize]
+    self.offset += len(data)
+    return np.frombuffer(data, dtype=FEED_DTYPE)
+
+  def poll(self, max_records=None):
+    try:
+      stat = os.stat(self.path)
+    except FileNotFoundError:
+      return np.empty(0, dtype=FEED_DTYPE)
+    if self.file is not None and stat.st_ino != self.inode:
+      # Producer restart: habiskan dulu record file lama, file baru dibaca di poll berikutnya
+      rest = self._read(os.fstat(self.file.fileno()).st_size, max_records)
+      if len(rest):
+        return rest
+      self._reopen()
+    elif self.file is None or stat.st_size < self.offset:
+      self._reopen()
+    return self._read(stat.st_size, max_records)
+
+class SimulatedFeed:
+  # Feed in-process: setiap mesin mengirim satu pembacaan per `interval` detik
+  def __init__(self, n_machines, interval=1.0, seed=42, inject=None):
+    self.simulator = FleetSimulator(n_machines, seed, inject)
+    self.interval = interval
+    self.last = time.monotonic()
+    self.pending = 0.0
+
+  def poll(self, max_records=None):
+    now = time.monotonic()
+    self.pending += (now - self.last) / self.interval
+    self.last = now
+    n_steps = int(self.pending)
+    if max_records is not None:
+      n_steps = min(n_steps, max(max_records // self.simulator.n_machines, 1))
+    self.pending -= n_steps
+    ids = np.arange(self.simulator.n_machines)
+    parts = [records(ids, self.simulator.step()[0]) for _ in range(n_steps)]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=FEED_DTYPE)
+
+class FleetState:
+  # State per mesin dalam array; kapasitas tumbuh mengikuti id mesin terbesar
+  # warn_threshold default = setengah threshold alarm
+  def __init__(self, capacity=1024, warn_threshold=None, alarm_threshold=0.5, max_events=200):
+    self.warn_threshold = alarm_threshold / 2 if warn_threshold is None else warn_threshold
+    self.alarm_threshold = alarm_threshold
+    self.n_machines = 0
+    self.events = collections.deque(maxlen=max_events)
+    self._allocate(capacity)
+
+  def _allocate(self, capacity):
+    old = getattr(self, 'status', None)
+    arrays = {
+      'last_x': np.zeros((capacity, len(FEATURE_COLUMNS)), dtype=np.float32),
+      'proba': np.full(capacity, np.nan, dtype=np.float32),
+      'status': np.zeros(capacity, dtype=np.int8),
+      'updated': np.zeros(capacity),
+      'alarm_since': np.zeros(capacity),
+      'readings': np.zeros(capacity, dtype=np.uint32),
+    }
+    for name, arr in arrays.items():
+      if old is not None:
+        prev = getattr(self, name)
+        arr[:len(prev)] = prev
+      setattr(self, name, arr)
+
+  def classify(self, proba):
+    return np.where(proba > self.alarm_threshold, 3, np.where(proba > self.warn_threshold, 2, 1))
+
+  def update(self, machine, timestamp, X, proba):
+    # Batch berurutan waktu; per mesin hanya pembacaan terakhir yang disimpan.
+    # Return id mesin yang statusnya berubah.
+    machine = np.asarray(machine, dtype=np.int64)
+    if not len(machine):
+      return np.empty(0, dtype=np.int64)
+    top = int(machine.max()) + 1
+    if top > len(self.status):
+      self._allocate(max(top, 2 * len(self.status)))
+    self.n_machines = max(self.n_machines, top)
+    self.readings[:top] += np.bincount(machine, minlength=top).astype(np.uint32)
+
+    ids, last = np.unique(machine[::-1], return_index=True)
+    last = len(machine) - 1 - last
+    status = self.classify(proba[last]).astype(np.int8)
+    changed = status != self.status[ids]
+    self.last_x[ids] = X[last]
+    self.proba[ids] = proba[last]
+    self.updated[ids] = timestamp[last]
+
+    # Event hanya untuk mesin yang berubah status (biasanya sedikit)
+    raised = ids[changed & (status == 3)]
+    self.alarm_since[raised] = timestamp[last][changed & (status == 3)]
+    for i in raised:
+      self.events.append({'Waktu': time.strftime('%H:%M:%S', time.localtime(self.alarm_since[i])),
+                          'Mesin': int(i), 'Probabilitas': float(self.proba[i])})
+    self.status[ids] = status
+    return ids[changed]
+
+  def counts(self):
+    return np.bincount(self.status[:self.n_machines], minlength=len(STATUS_NAMES))
+
+  def active_alarms(self, limit=20):
+    # Mesin berstatus alarm, risiko tertinggi dulu
+    alarm = np.flatnonzero(self.status[:self.n_machines] == 3)
+    alarm = alarm[np.argsort(-self.proba[alarm], kind='stable')][:limit]
+    letters = np.array(list(TYPE_MAP))
+    return [{'Mesin': int(i), 'Type': letters[int(self.last_x[i, 0])],
+             'Probabilitas': float(self.proba[i]),
+             **{c: float(v) for c, v in zip(FEATURE_COLUMNS[1:], self.last_x[i, 1:])},
+             'Alarm sejak': time.strftime('%H:%M:%S', time.localtime(self.alarm_since[i]))}
+            for i in alarm]
+
+class TileMap:
+  # Peta status armada: satu tile (tile x tile piksel) per mesin, warna = status. Hanya tile
+  # mesin yang berubah status yang digambar ulang; gambar penuh hanya saat jumlah baris bertambah.
+  def __init__(self, columns=100, tile=6):
+    self.columns = columns
+    self.tile = tile
+    self.image = np.zeros((0, 0, 3), dtype=np.uint8)
+    self.n_rows = 0
+
+  def update(self, state, changed=None):
+    # changed=None -> gambar ulang semua. Return True jika gambar berubah.
+    n_rows = -(-max(state.n_machines, 1) // self.columns)
+    if n_rows != self.n_rows or changed is None:
+      self.n_rows = n_rows
+      status = np.zeros(n_rows * self.columns, dtype=np.int8)
+      status[:state.n_machines] = state.status[:state.n_machines]
+      image = STATUS_COLORS[status].reshape(n_rows, self.columns, 3)
+      self.image = np.repeat(np.repeat(image, self.tile, axis=0), self.tile, axis=1)
+      return True
+    if not len(changed):
+      return False
+    tiles = self.image.reshape(self.n_rows, self.tile, self.columns, self.tile, 3)
+    row, col = np.divmod(np.asarray(changed), self.columns)
+    tiles[row, :, col, :] = STATUS_COLORS[state.status[changed]][:, None, None, :]
+    return True
+
+class FleetMonitor:
+  # Satu langkah = poll feed -> skor batch baru -> update state. Seperti MicroBatcher,
+  # dengan registry versi aktif diambil per langkah (hot-swap berlaku di langkah berikutnya).
+  def __init__(self, feed, state, pipeline=None, registry=None, max_batch=200_000):
+    self.feed = feed
+    self.state = state
+    self.pipeline = pipeline
+    self.registry = registry
+    self.max_batch = max_batch
+    self.rows = 0
+    self.started = time.monotonic()
+    self.last_step = {'rows': 0, 'changed': 0, 'seconds': 0.0, 'model_version': None}
+
+  def step(self):
+    start = time.perf_counter()
+    with stage('monitor.poll') as s:
+      batch = self.feed.poll(self.max_batch)
+      s.add_rows(len(batch))
+    if self.registry is not None:
+      version, pipeline = self.registry.get()
+    else:
+      version, pipeline = self.pipeline.version, self.pipeline
+    changed = np.empty(0, dtype=np.int64)
+    if len(batch):
+      X = batch['x'].astype(np.float64)
+      with stage('monitor.score', rows=len(batch)):
+        proba = pipeline.predict_modes(X, validate=False)[:, 0]
+      with stage('monitor.update', rows=len(batch)):
+        changed = self.state.update(batch['machine'], batch['time'], X, proba)
+    self.rows += len(batch)
+    self.last_step = {'rows': len(batch), 'changed': len(changed),
+                      'seconds': time.perf_counter() - start, 'model_version': version}
+    return changed
+
+  def rows_per_sec(self):
+    elapsed = time.monotonic() - self.started
+    return self.rows / elapsed if elapsed > 0 else 0.0
+
+def produce(path, n_machines, interval=1.0, seconds=60.0, seed=42, inject=None):
+  # Tulis feed: setiap mesin satu pembacaan per `interval` detik selama `seconds` detik
+  simulator = FleetSimulator(n_machines, seed, inject)
+  writer = FeedWriter(path)
+  ids = np.arange(n_machines)
+  start = time.monotonic()
+  steps = 0
+  try:
+    while time.monotonic() - start < seconds:
+      writer.write(ids, simulator.step()[0])
+      steps += 1
+      delay = start + steps * interval - time.monotonic()
+      if delay > 0:
+        time.sleep(delay)
+  finally:
+    writer.close()
+  return steps * n_machines
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Feed & monitoring armada mesin")
+  parser.add_argument('mode', choices=['produce', 'watch'])
+  parser.add_argument('--feed', default=FEED_PATH)
+  parser.add_argument('--machines', type=int, default=5000)
+  parser.add_argument('--interval', type=float, default=1.0, help="Detik antar pembacaan per mesin")
+  parser.add_argument('--seconds', type=float, default=60.0)
+  parser.add_argument('--inject', nargs='*', default=None, help="Mis. HDF=0.0005 PWF=0.0005")
+  parser.add_argument('--pipeline', default='models/inference_pipeline.pkl')
+  args = parser.parse_args()
+
+  if args.mode == 'produce':
+    rows = produce(args.feed, args.machines, args.interval, args.seconds,
+                   inject=parse_inject(args.inject))
+    print(f"Feed Selesai. {rows:,} pembacaan ditulis ke {args.feed}")
+  else:
+    from inference import load_or_build_pipeline
+    pipeline = load_or_build_pipeline(args.pipeline)
+    monitor = FleetMonitor(FileFeed(args.feed), FleetState(alarm_threshold=pipeline.threshold),
+                           pipeline)
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+      monitor.step()
+      counts = monitor.state.counts()
+      print(f"{monitor.state.n_machines:,} mesin | " +
+            ' | '.join(f"{name}: {c:,}" for name, c in zip(STATUS_NAMES, counts)) +
+            f" | {monitor.last_step['rows']:,} baris dalam {monitor.last_step['seconds'] * 1000:.1f} ms")
+      time.sleep(args.interval)
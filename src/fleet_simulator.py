@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils import FAILURE_MODES, FEATURE_COLUMNS, TARGET_COLUMN, TYPE_MAP
+
+# Simulator armada mesin berskema AI4I, tervektorisasi per langkah: satu step = satu pembacaan
+# untuk setiap mesin. State per mesin (suhu, beban, tool wear) berupa proses AR(1) sehingga
+# pembacaan berurutan saling berkorelasi; suhu proses mengikuti suhu udara dan torsi bergerak
+# berlawanan dengan RPM (daya ~konstan). Fault bisa diinjeksikan per mode dengan laju tertentu.
+TYPE_WEIGHTS = {'L': 0.5, 'M': 0.3, 'H': 0.2}
+OSF_LIMIT = {'L': 11000, 'M': 12000, 'H': 13000}  # batas overstrain (tool wear x torsi) per Type
+WEAR_STEP = {'L': 2, 'M': 3, 'H': 5}  # menit tool wear per proses, seperti dataset AI4I
+INJECTABLE_MODES = ['TWF', 'HDF', 'PWF', 'OSF']
+DEFAULT_FAULT_STEPS = 5
+
+def failure_labels(types, air, process, rpm, torque, tool_wear, twf, rnf):
+  # Aturan mode kegagalan AI4I 2020; types berupa kode 0/1/2, twf & rnf berupa mask acak
+  power = torque * rpm * 2 * np.pi / 60
+  limit = np.array([OSF_LIMIT[t] for t in TYPE_MAP])[types]
+  return {
+    'TWF': twf,
+    'HDF': (process - air < 8.6) & (rpm < 1380),
+    'PWF': (power < 3500) | (power > 9000),
+    'OSF': tool_wear * torque > limit,
+    'RNF': rnf,
+  }
+
+class FleetSimulator:
+  # inject: {mode: peluang per mesin per step} untuk memaksa pembacaan ke kondisi mode tersebut
+  # selama fault_steps step berikutnya. step() -> (X mentah (n, 6) urutan FEATURE_COLUMNS,
+  # label (n, 1 + mode): kolom 0 = Machine failure).
+  def __init__(self, n_machines, seed=42, inject=None, fault_steps=DEFAULT_FAULT_STEPS,
+               air_phi=0.98, load_phi=0.9):
+    self.n_machines = n_machines
+    self.rng = np.random.default_rng(seed)
+    self.inject = {m: float(r) for m, r in (inject or {}).items() if r}
+    unknown = set(self.inject) - set(INJECTABLE_MODES)
+    if unknown:
+      raise ValueError(f"Mode injeksi tidak dikenal: {sorted(unknown)}")
+    self.fault_steps = fault_steps
+    self.air_phi = air_phi
+    self.load_phi = load_phi
+    rng = self.rng
+    self.types = rng.choice(len(TYPE_WEIGHTS), n_machines, p=list(TYPE_WEIGHTS.values()))
+    self.wear_step = np.array([WEAR_STEP[t] for t in TYPE_MAP])[self.types]
+    # Deviasi suhu udara (K) & beban (z-score) per mesin, mulai dari distribusi stasioner
+    self.air_dev = rng.normal(0, 2, n_machines)
+    self.load = rng.normal(0, 1, n_machines)
+    self.tool_wear = rng.integers(0, 200, n_machines)
+    self.replace_at = rng.integers(200, 241, n_machines)
+    self.fault_mode = np.full(n_machines, -1)
+    self.fault_left = np.zeros(n_machines, dtype=np.int64)
+    self.steps = 0
+
+  def _start_faults(self):
+    # Mesin sehat yang terkena injeksi masuk ke fault; satu mode per mesin
+    healthy = self.fault_left == 0
+    for mode, rate in self.inject.items():
+      hit = healthy & (self.rng.random(self.n_machines) < rate)
+      self.fault_mode[hit] = INJECTABLE_MODES.index(mode)
+      self.fault_left[hit] = self.fault_steps
+      healthy &= ~hit
+
+  def step(self, force_mode=None, machines=None):
+    # force_mode: paksa mode (mis. 'HDF') pada mesin tertentu untuk step ini (default semua mesin)
+    rng, n = self.rng, self.n_machines
+    self.air_dev = self.air_phi * self.air_dev + np.sqrt(1 - self.air_phi ** 2) * rng.normal(0, 2, n)
+    self.load = self.load_phi * self.load + np.sqrt(1 - self.load_phi ** 2) * rng.normal(0, 1, n)
+    air = 300 + self.air_dev
+    process = air + 10 + rng.normal(0, 1, n)
+    torque = 40 + 10 * self.load
+    rpm = 1540 - 180 * (0.88 * self.load + 0.475 * rng.normal(0, 1, n))
+
+    # Tool wear naik per proses; diganti saat mencapai batas, sebagian penggantian = TWF
+    self.tool_wear = self.tool_wear + self.wear_step
+    worn = self.tool_wear >= self.replace_at
+    twf = worn & (rng.random(n) < 0.5)
+
+    if self.inject:
+      self._start_faults()
+    mode = np.where(self.fault_left > 0, self.fault_mode, -1)
+    if force_mode is not None:
+      mode[np.arange(n) if machines is None else machines] = INJECTABLE_MODES.index(force_mode)
+    # Dorong pembacaan ke wilayah mode kegagalan (tanpa memutus korelasi antar sensor lain)
+    hdf, pwf, osf, tw = (mode == INJECTABLE_MODES.index(m) for m in ['HDF', 'PWF', 'OSF', 'TWF'])
+    air = np.where(hdf, air + rng.uniform(1.5, 3.5, n), air)
+    process = np.where(hdf, air + rng.uniform(7.6, 8.5, n), process)
+    rpm = np.where(hdf, rng.uniform(1250, 1370, n), rpm)
+    torque = np.where(hdf, rng.uniform(50, 65, n), torque)
+    torque = np.where(pwf, rng.uniform(62, 76, n), torque)
+    rpm = np.where(pwf, np.maximum(rpm, 1500), rpm)
+    limit = np.array([OSF_LIMIT[t] for t in TYPE_MAP])[self.types]
+    wear_osf = np.maximum(self.tool_wear, 180)
+    torque = np.where(osf, np.maximum(torque, limit / wear_osf * rng.uniform(1.02, 1.15, n)), torque)
+    self.tool_wear = np.where(osf, wear_osf, self.tool_wear)
+    # TWF: tool dipakai sampai batas penggantiannya lalu gagal
+    self.tool_wear = np.where(tw, np.maximum(self.tool_wear, self.replace_at), self.tool_wear)
+    twf |= tw
+    worn |= tw
+
+    air = np.round(air, 1)
+    process = np.round(process, 1)
+    torque = np.round(np.clip(torque, 3.8, 76.6), 1)
+    rpm = np.round(np.clip(rpm, 1168, 2886))
+    wear = self.tool_wear.astype(np.float64)
+    modes = failure_labels(self.types, air, process, rpm, torque, wear, twf,
+                           rng.random(n) < 0.001)
+
+    self.tool_wear = np.where(worn, 0, self.tool_wear)
+    self.replace_at = np.where(worn, rng.integers(200, 241, n), self.replace_at)
+    self.fault_left = np.maximum(self.fault_left - 1, 0)
+    self.steps += 1
+
+    X = np.column_stack([self.types.astype(np.float64), air, process, rpm, torque, wear])
+    labels = np.column_stack([modes[m] for m in FAILURE_MODES]).astype(np.uint8)
+    return X, np.column_stack([labels.any(axis=1), labels]).astype(np.uint8)
+
+  def generate(self, n_rows):
+    # n_rows pembacaan (step berurutan x mesin), dipotong ke n_rows
+    n_steps = -(-n_rows // self.n_machines)
+    parts = [self.step() for _ in range(n_steps)]
+    X = np.concatenate([p[0] for p in parts])[:n_rows]
+    y = np.concatenate([p[1] for p in parts])[:n_rows]
+    return X, y
+
+def to_frame(X, y, start_udi=1):
+  # Format CSV mentah AI4I (UDI, Product ID, Type L/M/H, sensor, label & mode)
+  letters = np.array(list(TYPE_MAP))[X[:, 0].astype(np.int64)]
+  udi = np.arange(start_udi, start_udi + len(X))
+  df = pd.DataFrame({'UDI': udi,
+                     'Product ID': np.char.add(letters, (udi + 10000).astype(str)),
+                     'Type': letters})
+  for j, name in enumerate(FEATURE_COLUMNS[1:], start=1):
+    values = X[:, j]
+    df[name] = values.astype(np.int64) if name in ('Rotational speed [rpm]', 'Tool wear [min]') else values
+  df[TARGET_COLUMN] = y[:, 0].astype(np.int64)
+  for i, mode in enumerate(FAILURE_MODES, start=1):
+    df[mode] = y[:, i].astype(np.int64)
+  return df
+
+def write_csv(path, n_rows, n_machines=1000, seed=42, inject=None, chunk_rows=1_000_000):
+  # Dataset sintetis besar ditulis per chunk; state armada berlanjut antar chunk
+  simulator = FleetSimulator(n_machines, seed, inject)
+  if os.path.dirname(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+  tmp = f"{path}.tmp"
+  for i, start in enumerate(range(0, n_rows, chunk_rows)):
+    X, y = simulator.generate(min(chunk_rows, n_rows - start))
+    to_frame(X, y, start_udi=start + 1).to_csv(tmp, mode='w' if i == 0 else 'a', header=i == 0,
+                                              index=False)
+  os.replace(tmp, path)
+  return path
+
+def pipeline_sink(pipeline):
+  # Jalur prediksi in-process (sama dengan MicroBatcher di serve.py)
+  return lambda X: pipeline.predict_modes(X, validate=False)
+
+def http_sink(url, timeout=10.0):
+  # POST ke serve.py; Type dikirim sebagai kode 0/1/2
+  def send(X):
+    request = urllib.request.Request(url, data=json.dumps({'instances': X.tolist()}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+      return json.loads(response.read())
+  return send
+
+def replay(simulator, sink, rate, seconds=10.0, max_rows=None, concurrency=1, min_tick=0.001):
+  # Putar ulang pembacaan ke sink dengan laju target (baris/detik). Satu tick = beberapa step
+  # armada sekaligus sehingga laju tinggi tidak dibatasi overhead per panggilan.
+  steps_per_tick = max(1, int(np.ceil(rate * min_tick / simulator.n_machines)))
+  tick_rows = steps_per_tick * simulator.n_machines
+  interval = tick_rows / rate
+  latencies, errors = [], [0]
+  lock = threading.Lock()
+  in_flight = threading.Semaphore(max(concurrency, 1) * 2)
+
+  def call(X):
+    t0 = time.perf_counter()
+    try:
+      sink(X)
+    except Exception:
+      with lock:
+        errors[0] += 1
+    finally:
+      with lock:
+        latencies.append(time.perf_counter() - t0)
+      in_flight.release()
+
+  rows = 0
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max(concurrency, 1)) as pool:
+    while time.perf_counter() - start < seconds and (max_rows is None or rows < max_rows):
+      parts = [simulator.step() for _ in range(steps_per_tick)]
+      X = np.concatenate([p[0] for p in parts])
+      in_flight.acquire()
+      if concurrency > 1:
+        pool.submit(call, X)
+      else:
+        call(X)
+      rows += len(X)
+      # Tahan laju: tidur sampai jadwal tick berikutnya (tidak tidur jika tertinggal)
+      delay = start + (rows / tick_rows) * interval - time.perf_counter()
+      if delay > 0:
+        time.sleep(delay)
+  elapsed = time.perf_counter() - start
+  latencies = np.asarray(latencies)
+  p50, p99 = (np.percentile(latencies, [50, 99]) * 1000) if len(latencies) else (0.0, 0.0)
+  return {'rows': rows, 'seconds': elapsed, 'target_rows_per_s': rate,
+          'rows_per_s': rows / elapsed if elapsed > 0 else 0.0, 'calls': len(latencies),
+          'batch_rows': tick_rows, 'errors': errors[0],
+          'sink_p50_ms': float(p50), 'sink_p99_ms': float(p99)}
+
+def parse_inject(values):
+  # ['HDF=0.001', 'PWF=0.0005'] -> {'HDF': 0.001, 'PWF': 0.0005}
+  inject = {}
+  for value in values or []:
+    mode, _, rate = value.partition('=')
+    inject[mode.upper()] = float(rate)
+  return inject
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Simulator armada mesin / load generator scoring")
+  parser.add_argument('--machines', type=int, default=1000)
+  parser.add_argument('--seed', type=int, default=42)
+  parser.add_argument('--inject', nargs='*', default=None, help="Mis. HDF=0.001 PWF=0.0005")
+  parser.add_argument('--output', default=None, help="Tulis dataset CSV (butuh --rows)")
+  parser.add_argument('--rows', type=int, default=1_000_000)
+  parser.add_argument('--rate', type=float, default=100_000, help="Target baris/detik untuk replay")
+  parser.add_argument('--seconds', type=float, default=10.0)
+  parser.add_argument('--url', default=None, help="Replay ke serve.py, mis. http://localhost:8000/predict")
+  parser.add_argument('--pipeline', default='models/inference_pipeline.pkl')
+  parser.add_argument('--concurrency', type=int, default=1)
+  args = parser.parse_args()
+
+  inject = parse_inject(args.inject)
+  if args.output:
+    start = time.perf_counter()
+    write_csv(args.output, args.rows, args.machines, args.seed, inject)
+    print(f"Dataset armada Selesai. {args.rows:,} baris dalam {time.perf_counter() - start:.1f} "
+          f"detik, disimpan di {args.output}")
+  else:
+    if args.url:
+      sink = http_sink(args.url)
+    else:
+      from inference import load_or_build_pipeline
+      sink = pipeline_sink(load_or_build_pipeline(args.pipeline))
+    stats = replay(FleetSimulator(args.machines, args.seed, inject), sink, args.rate, args.seconds,
+                   concurrency=args.concurrency)
+    print(json.dumps(stats, indent=2))
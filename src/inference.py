@@ -0,0 +1,155 @@
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+from utils import FEATURE_COLUMNS, TARGET_COLUMN, TYPE_MAP, load_model
+
+# Naikkan jika struktur artefak berubah (artefak lama akan ditolak saat load)
+ARTIFACT_VERSION = 1
+# Input float32 dibulatkan balik ke presisi pembacaan sensor sebelum scaling,
+# karena float32(298.1) - mean bisa bergeser melewati threshold split model.
+INPUT_DECIMALS = 4
+
+def encode_type(values):
+  # Encoding Type secara vektor (L/M/H -> 0/1/2), nilai tak dikenal jadi NaN
+  if np.issubdtype(values.dtype, np.number):
+    codes = values.astype(np.float64)
+    codes[~np.isin(codes, list(TYPE_MAP.values()))] = np.nan
+    return codes
+  codes = np.full(len(values), np.nan, dtype=np.float64)
+  for label, code in TYPE_MAP.items():
+    codes[values == label] = code
+  return codes
+
+def frame_to_matrix(df):
+  # Konversi DataFrame skema AI4I ke matriks mentah (sekali per batch, bukan per baris)
+  X = np.empty((len(df), len(FEATURE_COLUMNS)), dtype=np.float64)
+  types = df['Type']
+  if isinstance(types.dtype, pd.CategoricalDtype):
+    # Type categorical (ingest.py): lookup per kategori, kode -1 (kosong) jadi NaN
+    lut = np.array([TYPE_MAP.get(c, np.nan) for c in types.cat.categories] + [np.nan])
+    X[:, 0] = lut[types.cat.codes.to_numpy()]
+  else:
+    X[:, 0] = encode_type(types.to_numpy())
+  for j, col in enumerate(FEATURE_COLUMNS[1:], start=1):
+    X[:, j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    if df[col].dtype == np.float32:
+      # Kolom float32 dari ingest.py: pulihkan desimal pembacaan sensor sebelum scaling
+      X[:, j] = np.round(X[:, j], INPUT_DECIMALS)
+  return X
+
+class InferencePipeline:
+  # Artefak inferensi tunggal: encoding Type + StandardScaler + model.
+  # Input: matriks mentah (n, 6) dengan urutan FEATURE_COLUMNS, Type sudah berupa kode 0/1/2
+  # (atau FEATURE_COLUMNS + fitur turunan, untuk model dengan fitur streaming).
+  def __init__(self, model, mean, scale, threshold=0.5, model_name=None, feature_columns=None):
+    self.artifact_version = ARTIFACT_VERSION
+    self.feature_columns = list(feature_columns or FEATURE_COLUMNS)
+    self.type_map = dict(TYPE_MAP)
+    self.model = model
+    self.mean = np.asarray(mean, dtype=np.float64)
+    self.scale = np.asarray(scale, dtype=np.float64)
+    self.threshold = threshold
+    self.model_name = model_name or type(model).__name__
+    self.model_hash = joblib.hash(model)
+    self.created_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+  @classmethod
+  def from_scaler(cls, model, scaler, **kwargs):
+    fitted_columns = list(getattr(scaler, 'feature_names_in_', FEATURE_COLUMNS))
+    if fitted_columns[:len(FEATURE_COLUMNS)] != FEATURE_COLUMNS:
+      raise ValueError(f"Urutan kolom scaler tidak sesuai skema: {fitted_columns}")
+    return cls(model, scaler.mean_, scaler.scale_, feature_columns=fitted_columns, **kwargs)
+
+  @property
+  def version(self):
+    # Kunci cache prediksi: hash model + semua yang mengubah input model (scaler, kolom, encoding
+    # Type), agar artefak yang dirakit ulang dengan scaler baru tidak memakai hasil cache lama.
+    # Array diubah ke list dulu agar hash sama untuk array biasa maupun memmap (registry).
+    content = joblib.hash((self.model_hash, self.mean.tolist(), self.scale.tolist(),
+                           self.feature_columns, self.type_map))
+    return f"v{self.artifact_version}-{content[:12]}"
+
+  def validate(self, X):
+    # Validasi skema sekali per batch
+    X = np.asarray(X)
+    if X.ndim == 1:
+      X = X.reshape(1, -1)
+    if X.ndim != 2 or X.shape[1] != len(self.feature_columns):
+      raise ValueError(f"Input harus berbentuk (n, {len(self.feature_columns)}), didapat {X.shape}")
+    if not np.issubdtype(X.dtype, np.floating):
+      X = X.astype(np.float64)
+    if not np.isin(X[:, 0], list(self.type_map.values())).all():
+      raise ValueError("Kolom Type harus berisi kode 0/1/2 (L/M/H)")
+    if not np.isfinite(X).all():
+      raise ValueError("Input mengandung NaN atau inf")
+    return X
+
+  def transform(self, X):
+    # Scaling di float64 lalu cast ke float32 (sama dengan scaler.transform + cast model)
+    if X.dtype == np.float32:
+      X = np.round(X.astype(np.float64), INPUT_DECIMALS)
+    return ((X - self.mean) / self.scale).astype(np.float32)
+
+  def predict_proba(self, X, validate=True):
+    with stage('inference.predict_proba') as s:
+      if validate:
+        X = self.validate(X)
+      s.add_rows(len(X))
+      return self.model.predict_proba(self.transform(X))
+
+  @property
+  def failure_modes(self):
+    # Nama mode kegagalan jika model multi-output (MultiForest), selain itu list kosong
+    return list(getattr(self.model, 'output_names', [TARGET_COLUMN]))[1:]
+
+  def predict_modes(self, X, validate=True):
+    # (n, 1 + jumlah mode): kolom 0 = Machine failure, sisanya per mode, dari satu traversal
+    with stage('inference.predict_modes') as s:
+      if validate:
+        X = self.validate(X)
+      s.add_rows(len(X))
+      X = self.transform(X)
+      if self.failure_modes:
+        return self.model.predict_outputs(X)
+      return self.model.predict_proba(X)[:, 1:]
+
+  def predict(self, X, validate=True):
+    return (self.predict_proba(X, validate)[:, 1] > self.threshold).astype(np.int8)
+
+def save_pipeline(pipeline, path):
+  joblib.dump(pipeline, path)
+  print(f"Inference pipeline {pipeline.version} disimpan di {path}")
+
+def load_pipeline(path):
+  pipeline = joblib.load(path)
+  version = getattr(pipeline, 'artifact_version', None)
+  if version != ARTIFACT_VERSION:
+    raise ValueError(f"Versi artefak {path} tidak didukung: {version} (butuh {ARTIFACT_VERSION})")
+  return pipeline
+
+def load_or_build_pipeline(pipeline_path='models/inference_pipeline.pkl',
+                           model_path='models/best_model.pkl',
+                           scaler_path='models/preprocessing.pkl'):
+  # Pakai artefak gabungan jika ada, kalau belum ada rakit dari pasangan model + scaler lama
+  if pipeline_path and os.path.exists(pipeline_path):
+    return load_pipeline(pipeline_path)
+  return InferencePipeline.from_scaler(load_model(model_path), load_model(scaler_path))
+
+def build_pipeline(model_path, scaler_path, output_path, threshold=0.5):
+  pipeline = InferencePipeline.from_scaler(load_model(model_path), load_model(scaler_path),
+                                           threshold=threshold)
+  save_pipeline(pipeline, output_path)
+  return pipeline
+
+if __name__ == "__main__":
+  # Jalankan lewat modul `inference` (bukan __main__) agar artefak bisa di-unpickle proses lain
+  from inference import build_pipeline
+  from utils import register_model
+  pipeline = build_pipeline('models/best_model.pkl', 'models/preprocessing.pkl',
+                            'models/inference_pipeline.pkl')
+  register_model(pipeline, 'models/registry')
@@ -0,0 +1,138 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from profiling import profiled, stage
+from storage import MANIFEST_NAME, load_arrays, load_manifest, save_arrays
+from utils import FAILURE_MODES, FEATURE_COLUMNS, TARGET_COLUMN, TYPE_MAP
+
+# Ingest CSV berskema AI4I dengan dtype eksplisit (tanpa inferensi): sensor float32, RPM & tool
+# wear uint16, Type categorical, label uint8. Hanya kolom yang diminta yang di-parse, dan tiap
+# file bisa dikonversi sekali ke cache biner kolumnar (.npy per kolom) yang dipakai ulang.
+# Nilai float32 dipulihkan ke desimal pembacaan sensor (float64) di frame_to_matrix sebelum scaling.
+TYPE_DTYPE = pd.CategoricalDtype(list(TYPE_MAP))
+RAW_SCHEMA = {
+  'UDI': np.uint32,
+  'Product ID': str,
+  'Type': TYPE_DTYPE,
+  'Air temperature [K]': np.float32,
+  'Process temperature [K]': np.float32,
+  'Rotational speed [rpm]': np.uint16,
+  'Torque [Nm]': np.float32,
+  'Tool wear [min]': np.uint16,
+  TARGET_COLUMN: np.uint8,
+  **{mode: np.uint8 for mode in FAILURE_MODES},
+}
+# data_cleaned.csv: Type sudah berupa kode 0/1/2, kolom id & mode sudah dibuang
+CLEANED_SCHEMA = {**{c: RAW_SCHEMA[c] for c in FEATURE_COLUMNS + [TARGET_COLUMN]}, 'Type': np.uint8}
+MODEL_COLUMNS = FEATURE_COLUMNS + [TARGET_COLUMN] + FAILURE_MODES
+CACHE_DIR = 'data/cache/ingest'
+
+def _nullable(dtypes):
+  # Kolom integer tidak bisa menampung NaN: dibaca sebagai float (baris kosong tetap terdeteksi),
+  # float64 untuk integer lebar (UDI) agar tetap eksak
+  def as_float(d):
+    if isinstance(d, type) and np.issubdtype(d, np.integer):
+      return np.float32 if np.dtype(d).itemsize <= 2 else np.float64
+    return d
+  return {c: as_float(d) for c, d in dtypes.items()}
+
+# Untuk input yang boleh berisi nilai kosong (batch scoring per chunk); UDI diinferensi pandas
+NULLABLE_SCHEMA = _nullable({c: d for c, d in RAW_SCHEMA.items() if c != 'UDI'})
+
+def read_header(path):
+  return pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns.tolist()
+
+def csv_options(header, columns=None, schema=RAW_SCHEMA):
+  # usecols + dtype untuk pd.read_csv; kolom di luar skema dibiarkan diinferensi pandas
+  columns = list(columns or [c for c in header if c in schema])
+  missing = [c for c in columns if c not in header]
+  if missing:
+    raise ValueError(f"Kolom wajib tidak ditemukan: {missing}")
+  return {'usecols': columns, 'dtype': {c: schema[c] for c in columns if c in schema}}
+
+def read_csv_typed(source, columns=None, schema=RAW_SCHEMA, header=None, **kwargs):
+  # source: path atau buffer; header wajib diberikan jika source berupa buffer
+  options = csv_options(header or read_header(source), columns, schema)
+  position = source.tell() if hasattr(source, 'tell') else None
+  try:
+    df = pd.read_csv(source, encoding='utf-8-sig', **options, **kwargs)
+  except ValueError:
+    if position is not None:
+      source.seek(position)
+    df = pd.read_csv(source, encoding='utf-8-sig', usecols=options['usecols'],
+                     dtype=_nullable(options['dtype']), **kwargs)
+  return df[options['usecols']]
+
+def cache_key(path, schema=RAW_SCHEMA):
+  stat = os.stat(path)
+  return joblib.hash((os.path.abspath(path), stat.st_size, stat.st_mtime,
+                      {c: str(d) for c, d in schema.items()}))
+
+def _cacheable(schema, header):
+  # String (Product ID) tidak ikut cache biner; kolom lain disimpan satu .npy per kolom
+  return [c for c in header if c in schema and schema[c] is not str]
+
+def convert(path, schema=RAW_SCHEMA, cache_dir=CACHE_DIR):
+  # Parse CSV sekali ke cache kolumnar; return folder cache
+  cache_path = os.path.join(cache_dir, cache_key(path, schema)[:16])
+  if os.path.exists(os.path.join(cache_path, MANIFEST_NAME)):
+    return cache_path
+  header = read_header(path)
+  with stage('ingest.parse_csv') as s:
+    df = read_csv_typed(path, _cacheable(schema, header), schema, header)
+    s.add_rows(len(df))
+  arrays, categories = {}, {}
+  for name in df.columns:
+    values = df[name]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+      categories[name] = list(values.cat.categories)
+      arrays[name] = values.cat.codes.to_numpy()
+    else:
+      arrays[name] = values.to_numpy()
+  save_arrays(cache_path, arrays, columns=list(df.columns),
+              meta={'source': os.path.abspath(path), 'rows': len(df), 'categories': categories})
+  return cache_path
+
+def load_cached(cache_path, columns=None):
+  manifest = load_manifest(cache_path)
+  columns = list(columns or manifest['columns'])
+  missing = [c for c in columns if c not in manifest['columns']]
+  if missing:
+    raise KeyError(f"Kolom {missing} tidak ada di cache {cache_path}")
+  arrays = load_arrays(cache_path, columns, mmap_mode=None)
+  categories = manifest['meta'].get('categories', {})
+  return pd.DataFrame({c: pd.Categorical.from_codes(arrays[c], categories[c]) if c in categories
+                       else arrays[c] for c in columns})
+
+@profiled('ingest.read', rows=len)
+def read_ai4i(path, columns=None, schema=RAW_SCHEMA, cache=True, cache_dir=CACHE_DIR):
+  # Pintu masuk utama: pakai cache biner jika kolom yang diminta bisa dilayani cache
+  # (columns=None dengan cache -> semua kolom non-string)
+  if cache and all(schema.get(c) not in (None, str) for c in columns or []):
+    return load_cached(convert(path, schema, cache_dir), columns)
+  return read_csv_typed(path, columns, schema)
+
+def read_many(paths, columns=None, schema=RAW_SCHEMA, cache=True, cache_dir=CACHE_DIR, n_jobs=None):
+  # Beberapa file (mis. drop harian) di-parse paralel; parser C pandas melepas GIL saat tokenizing
+  n_jobs = n_jobs or min(len(paths), os.cpu_count() or 1)
+  with ThreadPoolExecutor(max(n_jobs, 1)) as pool:
+    frames = list(pool.map(lambda p: read_ai4i(p, columns, schema, cache, cache_dir), paths))
+  return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Konversi CSV AI4I ke cache biner bertipe")
+  parser.add_argument('paths', nargs='+')
+  parser.add_argument('--cache-dir', default=CACHE_DIR)
+  parser.add_argument('--n-jobs', type=int, default=None)
+  args = parser.parse_args()
+
+  start = time.perf_counter()
+  df = read_many(args.paths, MODEL_COLUMNS, cache_dir=args.cache_dir, n_jobs=args.n_jobs)
+  print(f"Ingest Selesai. {len(args.paths)} file, {len(df):,} baris, "
+        f"{df.memory_usage(deep=True).sum() / 2 ** 20:.1f} MB dalam {time.perf_counter() - start:.2f} detik.")
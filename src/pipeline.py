@@ -0,0 +1,240 @@
+import argparse
+import copy
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from data_preprocessing import SPLIT_SEED, TEST_SIZE, assign_test
+from inference import frame_to_matrix
+from ingest import read_csv_typed, read_header
+from profiling import profiled
+from storage import MANIFEST_NAME, SPLIT_DIR, append_arrays, load_arrays, load_manifest, save_arrays, save_split
+from utils import FAILURE_MODES, FEATURE_COLUMNS, TARGET_COLUMN, TYPE_MAP
+
+# Pipeline bertahap: load -> clean/encode -> split -> scale.
+# Tiap blok byte baru dari CSV mentah jadi satu "segmen" yang di-cache dengan hash dari
+# isi blok + parameter; scaler di-update via partial_fit hanya dengan segmen baru.
+# Hasil akhirnya sama dengan preprocess_data: data/processed/split/ + models/preprocessing.pkl
+# (aturan split yang sama, assign_test). Split yang sudah ada hanya ditambah baris segmen baru,
+# di-scale dengan scaler yang dipakai split itu; seluruh riwayat di-scale ulang hanya jika
+# statistik scaler berjalan sudah bergeser lebih dari RESCALE_TOLERANCE (relatif thd std).
+PIPELINE_PARAMS = {
+  'features': FEATURE_COLUMNS,
+  'target': TARGET_COLUMN,
+  'failure_modes': FAILURE_MODES,
+  'type_map': TYPE_MAP,
+  'test_size': TEST_SIZE,
+  'split_seed': SPLIT_SEED,
+}
+STATE_NAME = 'state.json'
+APPLIED_SCALER_NAME = 'applied_scaler.pkl'
+RESCALE_TOLERANCE = 0.01
+FINGERPRINT_BYTES = 64 * 1024
+
+def _hash(*parts):
+  h = hashlib.sha1()
+  for part in parts:
+    h.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True).encode())
+  return h.hexdigest()
+
+def _tail_fingerprint(path, offset):
+  # Sidik jari murah untuk prefix yang sudah diproses: 64KB terakhir sebelum offset
+  with open(path, 'rb') as f:
+    f.seek(max(offset - FINGERPRINT_BYTES, 0))
+    return _hash(f.read(min(offset, FINGERPRINT_BYTES)), offset)
+
+def load_state(cache_dir):
+  path = os.path.join(cache_dir, STATE_NAME)
+  if not os.path.exists(path):
+    return None
+  with open(path) as f:
+    return json.load(f)
+
+def save_state(cache_dir, state):
+  tmp = os.path.join(cache_dir, f"{STATE_NAME}.tmp")
+  with open(tmp, 'w') as f:
+    json.dump(state, f, indent=2)
+  os.replace(tmp, os.path.join(cache_dir, STATE_NAME))
+
+def stage_load(source, state, block_bytes=64 * 1024 * 1024):
+  # Stage 1: hanya byte yang belum pernah diproses yang dibaca (file mentah bersifat append-only).
+  # Blok dipotong di batas baris agar tiap blok bisa di-parse sendiri.
+  with open(source, 'rb') as f:
+    header = f.readline()
+    f.seek(state['offset'] if state['offset'] else len(header))
+    pending = b''
+    while True:
+      block = f.read(block_bytes)
+      if not block:
+        break
+      block = pending + block
+      cut = block.rfind(b'\n') + 1
+      pending = block[cut:]
+      if cut:
+        yield header, block[:cut]
+    # Baris terakhir tanpa newline dianggap belum lengkap dan diproses di refresh berikutnya
+
+@profiled('pipeline.clean_split')
+def stage_clean_split(header, block, segments_dir, params):
+  # Stage 2 + 3: clean/encode + split, di-cache dengan hash isi blok + parameter
+  key = _hash(block, params)
+  seg_dir = os.path.join(segments_dir, key[:20])
+  if os.path.exists(os.path.join(seg_dir, MANIFEST_NAME)):
+    return seg_dir, False
+
+  df = read_csv_typed(io.BytesIO(header + block), ['UDI'] + params['features'] + [params['target']]
+                      + params['failure_modes'], header=read_header(io.BytesIO(header)))
+  X = frame_to_matrix(df)
+  valid = ~np.isnan(X).any(axis=1) & df[params['target']].notna().to_numpy()
+  udi = df['UDI'].to_numpy()[valid]
+  save_arrays(seg_dir, {
+    'X': X[valid],
+    'y': df[params['target']].to_numpy()[valid].astype(np.int8),
+    'y_modes': df[params['failure_modes']].fillna(0).to_numpy()[valid].astype(np.int8),
+    'is_test': assign_test(udi, params['test_size'], params['split_seed']),
+  }, columns=params['features'], meta={'rows': int(valid.sum()), 'dropped': int((~valid).sum())})
+  return seg_dir, True
+
+@profiled('pipeline.scale')
+def stage_scale(scaler, seg_dirs):
+  # Stage 4: statistik scaler di-update inkremental dengan baris train dari segmen baru saja
+  for seg_dir in seg_dirs:
+    seg = load_arrays(seg_dir, ['X', 'is_test'])
+    X_train = seg['X'][~seg['is_test']]
+    if len(X_train):
+      scaler.partial_fit(pd.DataFrame(X_train, columns=FEATURE_COLUMNS))
+  return scaler
+
+def scaler_shift(applied, scaler):
+  # Pergeseran mean & std scaler berjalan terhadap scaler yang dipakai split, relatif thd std
+  return max((np.abs(scaler.mean_ - applied.mean_) / applied.scale_).max(),
+             np.abs(scaler.scale_ / applied.scale_ - 1).max())
+
+def _segment_parts(seg_dirs, scaler):
+  # Baris segmen di-scale (transform affine) lalu dipisah train/test
+  parts = {'X_train': [], 'X_test': [], 'y_train': [], 'y_test': [],
+           'y_modes_train': [], 'y_modes_test': []}
+  for seg_dir in seg_dirs:
+    seg = load_arrays(seg_dir)
+    test = np.asarray(seg['is_test'])
+    X = (seg['X'] - scaler.mean_) / scaler.scale_
+    parts['X_train'].append(X[~test])
+    parts['X_test'].append(X[test])
+    parts['y_train'].append(seg['y'][~test])
+    parts['y_test'].append(seg['y'][test])
+    parts['y_modes_train'].append(seg['y_modes'][~test])
+    parts['y_modes_test'].append(seg['y_modes'][test])
+  arrays = {k: np.concatenate(v) for k, v in parts.items()}
+  for name in ('X_train', 'X_test'):
+    arrays[name] = arrays[name].astype(np.float32)
+  for name in ('y_train', 'y_test'):
+    arrays[name] = arrays[name].astype(np.int8)
+  return arrays
+
+@profiled('pipeline.materialize', rows=lambda counts: counts['y_train'] + counts['y_test'])
+def materialize(seg_dirs, scaler, output_data_path, meta=None):
+  # Tulis ulang split dari semua segmen (mmap) dengan scaler ini
+  arrays = _segment_parts(seg_dirs, scaler)
+  save_split(output_data_path, arrays['X_train'], arrays['X_test'], arrays['y_train'],
+             arrays['y_test'], FEATURE_COLUMNS, meta={**(meta or {}), 'failure_modes': FAILURE_MODES},
+             y_modes_train=arrays['y_modes_train'], y_modes_test=arrays['y_modes_test'])
+  return {k: len(v) for k, v in arrays.items() if k in ('y_train', 'y_test')}
+
+@profiled('pipeline.append', rows=lambda counts: counts['y_train'] + counts['y_test'])
+def append_segments(seg_dirs, scaler, output_data_path, meta=None):
+  # Hanya baris segmen baru yang di-scale dan ditambahkan ke split yang sudah ada
+  arrays = _segment_parts(seg_dirs, scaler)
+  append_arrays(os.path.join(output_data_path, SPLIT_DIR), arrays, meta=meta)
+  return {k: len(v) for k, v in arrays.items() if k in ('y_train', 'y_test')}
+
+def run_pipeline(source='data/raw/ai4i2020.csv', output_data_path='data/processed',
+                 output_model_path='models', cache_dir='data/cache/pipeline', full=False,
+                 rescale_tolerance=RESCALE_TOLERANCE):
+  params_hash = _hash(PIPELINE_PARAMS)
+  segments_dir = os.path.join(cache_dir, 'segments')
+  os.makedirs(segments_dir, exist_ok=True)
+
+  state = None if full else load_state(cache_dir)
+  size = os.path.getsize(source)
+  if state is not None:
+    # Reset jika parameter berubah atau prefix file mentah tidak sama lagi (bukan sekadar append)
+    if (state['params_hash'] != params_hash or state['source'] != os.path.abspath(source)
+        or size < state['offset'] or _tail_fingerprint(source, state['offset']) != state['fingerprint']):
+      print("Parameter/data lama berubah, pipeline dijalankan ulang dari awal.")
+      state = None
+  if state is None:
+    state = {'source': os.path.abspath(source), 'params_hash': params_hash,
+             'offset': 0, 'fingerprint': None, 'segments': []}
+    scaler = StandardScaler()
+  else:
+    scaler = joblib.load(os.path.join(cache_dir, 'scaler.pkl'))
+
+  new_segments = []
+  for header, block in stage_load(source, state):
+    seg_dir, computed = stage_clean_split(header, block, segments_dir, PIPELINE_PARAMS)
+    new_segments.append(seg_dir)
+    state['offset'] = (state['offset'] or len(header)) + len(block)
+    print(f"Segmen {os.path.basename(seg_dir)}: {'diproses' if computed else 'dari cache'} "
+          f"({len(block) / 1e6:.1f} MB)")
+
+  split_dir = os.path.join(output_data_path, SPLIT_DIR)
+  split_meta = (load_manifest(split_dir)['meta'] if os.path.exists(os.path.join(split_dir, MANIFEST_NAME))
+                else {})
+  if not new_segments and split_meta.get('pipeline_offset') == state['offset']:
+    print("Tidak ada data baru, semua stage dilewati.")
+    return state
+
+  scaler = stage_scale(scaler, new_segments)
+  # Split di disk bisa ditambah hanya jika memang hasil run sebelumnya (segmen & parameter sama)
+  applied_path = os.path.join(cache_dir, APPLIED_SCALER_NAME)
+  appendable = (split_meta.get('params_hash') == params_hash and state['segments']
+                and split_meta.get('pipeline_segments') == len(state['segments'])
+                and os.path.exists(applied_path))
+  applied = joblib.load(applied_path) if appendable else None
+  state['segments'] += [os.path.relpath(s, cache_dir) for s in new_segments]
+  state['fingerprint'] = _tail_fingerprint(source, state['offset'])
+  joblib.dump(scaler, os.path.join(cache_dir, 'scaler.pkl'))
+
+  meta = {'pipeline_offset': state['offset'], 'pipeline_segments': len(state['segments']),
+          'params_hash': params_hash}
+  if applied is not None and scaler_shift(applied, scaler) <= rescale_tolerance:
+    counts = append_segments(new_segments, applied, output_data_path, meta=meta)
+    total = load_manifest(split_dir)['arrays']
+    action = f"{counts['y_train'] + counts['y_test']:,} baris ditambahkan"
+    counts = {k: total[k]['shape'][0] for k in ('y_train', 'y_test')}
+  else:
+    applied = copy.deepcopy(scaler)
+    seg_dirs = [os.path.join(cache_dir, s) for s in state['segments']]
+    counts = materialize(seg_dirs, applied, output_data_path, meta=meta)
+    action = "split ditulis ulang"
+
+  # preprocessing.pkl selalu scaler yang dipakai split (bukan statistik berjalan)
+  joblib.dump(applied, applied_path)
+  joblib.dump(applied, f"{output_model_path}/preprocessing.pkl")
+  save_state(cache_dir, state)
+  print(f"Preprocessing Selesai. {len(new_segments)} segmen baru ({action}), "
+        f"{counts['y_train']:,} baris train, {counts['y_test']:,} baris test.")
+  return state
+
+def clear_cache(cache_dir='data/cache/pipeline'):
+  shutil.rmtree(cache_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Preprocessing inkremental dengan cache per stage")
+  parser.add_argument('--source', default='data/raw/ai4i2020.csv')
+  parser.add_argument('--data', default='data/processed')
+  parser.add_argument('--models', default='models')
+  parser.add_argument('--cache-dir', default='data/cache/pipeline')
+  parser.add_argument('--full', action='store_true', help="Abaikan state lama, proses ulang semua data")
+  parser.add_argument('--rescale-tolerance', type=float, default=RESCALE_TOLERANCE,
+                      help="Pergeseran scaler (relatif thd std) sebelum seluruh split di-scale ulang")
+  args = parser.parse_args()
+
+  run_pipeline(args.source, args.data, args.models, args.cache_dir, args.full, args.rescale_tolerance)
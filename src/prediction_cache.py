@@ -0,0 +1,235 @@
+import argparse
+import hashlib
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from utils import FEATURE_COLUMNS, SENSOR_RESOLUTION
+
+# Cache hasil prediksi dengan kunci = kode pembacaan sensor (nilai / resolusi) + versi model.
+# Tabel set-associative berukuran tetap: kunci di-hash ke satu set berisi `ways` slot, dan slot
+# yang paling lama tidak dipakai di set itu yang diganti (LRU per set). Semua state berupa array
+# NumPy yang bisa ditempatkan di shared memory, sehingga beberapa worker (proses) berbagi satu
+# cache lewat nama. Tanpa lock: tiap slot punya checksum, slot yang sedang ditulis proses lain
+# gagal dicek dan dianggap miss. Baris yang tidak tepat di grid resolusi tidak di-cache.
+DEFAULT_CAPACITY = 65536
+DEFAULT_WAYS = 8
+DEFAULT_OUTPUTS = 6  # Machine failure + 5 mode kegagalan
+HEADER = np.dtype([('magic', '<u8'), ('n_sets', '<i8'), ('ways', '<i8'), ('n_features', '<i8'),
+                   ('n_outputs', '<i8')])
+MAGIC = 0x5044_4D43_4143_4845  # "PDMCACHE"
+STAT_NAMES = ['hits', 'misses', 'inserts', 'tick']
+
+def _mix(h):
+  # Finalizer splitmix64 (aritmetika uint64 dengan wrap-around)
+  with np.errstate(over='ignore'):
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+def version_hash(version):
+  # Stabil antar proses (hash() Python diacak per proses)
+  digest = hashlib.blake2b(str(version).encode(), digest_size=8).digest()
+  return np.uint64(int.from_bytes(digest, 'little'))
+
+def _layout(n_sets, ways, n_features, n_outputs):
+  # (nama, dtype, shape) tiap array dalam blok memori, setelah header
+  slots = (n_sets, ways)
+  return [('key', np.uint64, slots), ('version', np.uint64, slots), ('check', np.uint64, slots),
+          ('used', np.uint64, slots), ('codes', np.int32, slots + (n_features,)),
+          ('values', np.float64, slots + (n_outputs,)), ('stats', np.uint64, (len(STAT_NAMES),))]
+
+class PredictionCache:
+  # name=None -> cache privat di memori proses; name='...' -> shared memory, dibuat jika belum
+  # ada lalu dipakai bersama proses lain dengan nama sama (ukuran mengikuti pembuatnya)
+  def __init__(self, capacity=DEFAULT_CAPACITY, ways=DEFAULT_WAYS, n_outputs=DEFAULT_OUTPUTS,
+               name=None, resolution=SENSOR_RESOLUTION):
+    self.step = np.array([resolution[c] for c in FEATURE_COLUMNS])
+    n_sets = 1 << max(int(np.ceil(np.log2(max(capacity, ways) / ways))), 0)
+    self.shm = None
+    self.owner = False
+    if name is None:
+      buffer = None
+      header = np.zeros(1, dtype=HEADER)[0]
+      header['n_sets'], header['ways'] = n_sets, ways
+      header['n_features'], header['n_outputs'] = len(self.step), n_outputs
+    else:
+      header, buffer = self._open_shared(name, n_sets, ways, n_outputs)
+    self.n_sets, self.ways = int(header['n_sets']), int(header['ways'])
+    self.n_outputs = int(header['n_outputs'])
+    if int(header['n_features']) != len(self.step):
+      raise ValueError(f"Cache {name} dibuat untuk {header['n_features']} fitur")
+    self.mask = np.uint64(self.n_sets - 1)
+
+    offset = HEADER.itemsize
+    for field, dtype, shape in _layout(self.n_sets, self.ways, len(self.step), self.n_outputs):
+      if buffer is None:
+        setattr(self, field, np.zeros(shape, dtype=dtype))
+      else:
+        setattr(self, field, np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    self.local = dict.fromkeys(STAT_NAMES[:3], 0)
+
+  def _open_shared(self, name, n_sets, ways, n_outputs):
+    size = HEADER.itemsize + sum(int(np.prod(shape)) * np.dtype(dtype).itemsize
+                                 for _, dtype, shape in _layout(n_sets, ways, len(self.step), n_outputs))
+    try:
+      self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+      self.owner = True
+      header = np.ndarray(1, dtype=HEADER, buffer=self.shm.buf)[0]
+      header['n_sets'], header['ways'] = n_sets, ways
+      header['n_features'], header['n_outputs'] = len(self.step), n_outputs
+      header['magic'] = MAGIC
+    except FileExistsError:
+      self.shm = shared_memory.SharedMemory(name=name)
+      # Proses yang hanya menumpang tidak boleh menghapus blok saat keluar (resource tracker
+      # Python < 3.13 melakukannya untuk semua SharedMemory yang dibuka)
+      resource_tracker.unregister(self.shm._name, 'shared_memory')
+      header = np.ndarray(1, dtype=HEADER, buffer=self.shm.buf)[0]
+      deadline = time.monotonic() + 1.0
+      while header['magic'] != MAGIC and time.monotonic() < deadline:
+        time.sleep(0.001)  # pembuat belum selesai menulis header
+      if header['magic'] != MAGIC:
+        raise ValueError(f"Shared memory {name} bukan cache prediksi")
+    return header, self.shm.buf
+
+  def close(self, unlink=None):
+    # Pemilik menghapus blok shared memory secara default
+    if self.shm is None:
+      return
+    for field, _, _ in _layout(1, 1, 1, 1):
+      setattr(self, field, None)
+    self.shm.close()
+    if self.owner if unlink is None else unlink:
+      self.shm.unlink()
+    self.shm = None
+
+  def quantize(self, X):
+    # Kode integer per fitur + mask baris yang tepat di grid resolusi (boleh di-cache)
+    scaled = np.asarray(X, dtype=np.float64) / self.step
+    codes = np.round(scaled)
+    on_grid = (np.abs(scaled - codes) < 1e-6).all(axis=1) & (np.abs(codes) < 2 ** 31).all(axis=1)
+    return np.where(on_grid[:, None], codes, 0).astype(np.int64), on_grid
+
+  def _keys(self, codes, vhash):
+    h = np.full(len(codes), vhash, dtype=np.uint64)
+    for j in range(codes.shape[1]):
+      h = _mix(h ^ codes[:, j].astype(np.uint64))
+    return h
+
+  def _checksum(self, key, values):
+    # key (n,) + bit nilai float64 (n, n_outputs) -> uint64 bukan nol
+    bits = values.view(np.uint64)
+    h = key
+    for j in range(bits.shape[-1]):
+      h = _mix(h ^ bits[..., j])
+    return h | np.uint64(1)
+
+  def lookup(self, X, version):
+    # Return (hit (n,), values (n, n_outputs)); values baris miss berisi NaN.
+    # Kandidat slot dicari lewat hash kunci, lalu hanya slot itu yang diverifikasi penuh
+    # (versi, kode asli, checksum) sehingga tabrakan hash / slot setengah tertulis jadi miss.
+    codes, on_grid = self.quantize(X)
+    vhash = version_hash(version)
+    key = self._keys(codes, vhash)
+    sets = (key & self.mask).astype(np.int64)
+    match = self.key[sets] == key[:, None]
+    way = match.argmax(axis=1)
+    values = self.values[sets, way]
+    hit = (match[np.arange(len(key)), way] & on_grid & (self.version[sets, way] == vhash)
+           & (self.codes[sets, way] == codes).all(axis=1)
+           & (self.check[sets, way] == self._checksum(key, values)))
+    out = np.where(hit[:, None], values, np.nan)
+
+    self.used[sets[hit], way[hit]] = self._tick()
+    n_hit = int(hit.sum())
+    self.local['hits'] += n_hit
+    self.local['misses'] += len(hit) - n_hit
+    self.stats[0] += np.uint64(n_hit)
+    self.stats[1] += np.uint64(len(hit) - n_hit)
+    return hit, out
+
+  def store(self, X, version, values):
+    # Simpan hasil; tiap putaran mengisi satu slot per set (slot dengan kunci sama dipakai
+    # ulang, selain itu slot LRU), maksimal `ways` putaran per panggilan
+    codes, on_grid = self.quantize(X)
+    values = np.asarray(values, dtype=np.float64)
+    if values.shape[1] > self.n_outputs:
+      return 0
+    padded = np.full((len(values), self.n_outputs), np.nan)
+    padded[:, :values.shape[1]] = values
+    vhash = version_hash(version)
+    key = self._keys(codes, vhash)
+    rows = np.flatnonzero(on_grid)
+    rows = rows[np.unique(key[rows], return_index=True)[1]]
+    sets = (key & self.mask).astype(np.int64)
+    stored = 0
+    for _ in range(self.ways):
+      if not len(rows):
+        break
+      first = np.unique(sets[rows], return_index=True)[1]
+      batch, rows = rows[first], np.delete(rows, first)
+      s = sets[batch]
+      same = self.key[s] == key[batch, None]
+      way = np.where(same.any(axis=1), same.argmax(axis=1), self.used[s].argmin(axis=1))
+
+      self.check[s, way] = 0
+      self.key[s, way] = key[batch]
+      self.version[s, way] = vhash
+      self.codes[s, way] = codes[batch]
+      self.values[s, way] = padded[batch]
+      self.used[s, way] = self._tick()
+      self.check[s, way] = self._checksum(key[batch], padded[batch])
+      stored += len(batch)
+    self.local['inserts'] += stored
+    self.stats[2] += np.uint64(stored)
+    return stored
+
+  def _tick(self):
+    self.stats[3] += np.uint64(1)
+    return self.stats[3]
+
+  def get_or_compute(self, X, version, compute, n_outputs=1):
+    # compute(X_miss) -> (m, n_outputs); hanya baris miss yang diskor model
+    X = np.atleast_2d(X)
+    if n_outputs > self.n_outputs:
+      return np.asarray(compute(X))
+    hit, cached = self.lookup(X, version)
+    out = cached[:, :n_outputs]
+    if not hit.all():
+      miss = ~hit
+      computed = np.asarray(compute(X[miss]))
+      out[miss] = computed
+      self.store(X[miss], version, computed)
+    return out
+
+  def snapshot(self):
+    # Statistik proses ini + total semua proses (shared, perkiraan karena tanpa lock)
+    hits, misses = self.local['hits'], self.local['misses']
+    shared_hits, shared_misses = int(self.stats[0]), int(self.stats[1])
+    return {
+      'hits': hits, 'misses': misses, 'inserts': self.local['inserts'],
+      'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+      'shared_hit_rate': shared_hits / (shared_hits + shared_misses) if shared_hits + shared_misses else 0.0,
+      'entries': int((self.check != 0).sum()), 'capacity': self.n_sets * self.ways,
+    }
+
+if __name__ == "__main__":
+  # Buat cache bersama lebih dulu (mis. sebelum menjalankan beberapa worker serve.py --cache-name)
+  parser = argparse.ArgumentParser(description="Cache prediksi bersama (shared memory)")
+  parser.add_argument('--name', default='pdm_prediction_cache')
+  parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY)
+  parser.add_argument('--ways', type=int, default=DEFAULT_WAYS)
+  args = parser.parse_args()
+
+  cache = PredictionCache(args.capacity, args.ways, name=args.name)
+  print(f"Cache prediksi {args.name} siap ({cache.n_sets * cache.ways:,} slot). Ctrl+C untuk menghapus.")
+  try:
+    while True:
+      time.sleep(10)
+      print(cache.snapshot())
+  except KeyboardInterrupt:
+    pass
+  finally:
+    cache.close(unlink=True)
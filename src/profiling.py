@@ -0,0 +1,168 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Instrumentasi per stage (pipeline) dan per section (halaman app): wall time, CPU time thread,
+# jumlah baris, dan peak alokasi (tracemalloc, opsional). Aktif lewat env PDM_PROFILE=1 atau
+# enable(); saat nonaktif stage() mengembalikan objek no-op bersama, jadi biayanya satu cek flag.
+# Ekspor: teks Prometheus (to_prometheus) atau file JSON (export_json / env PDM_PROFILE_OUT).
+ENABLED = os.environ.get('PDM_PROFILE', '') not in ('', '0')
+TRACE_ALLOC = os.environ.get('PDM_PROFILE_ALLOC', '') not in ('', '0')
+OUTPUT_PATH = os.environ.get('PDM_PROFILE_OUT')
+METRIC_PREFIX = 'pdm_stage'
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}
+
+class _NullStage:
+  # Dipakai saat profiling nonaktif: tidak mengukur apa pun
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+  def add_rows(self, n):
+    pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+  def __init__(self, name, rows=0):
+    self.name = name
+    self.rows = rows
+    self.alloc_peak = None
+
+  def add_rows(self, n):
+    self.rows += int(n)
+
+  def __enter__(self):
+    if TRACE_ALLOC and tracemalloc.is_tracing():
+      # Stage bersarang: peak milik stage luar disimpan dulu sebelum peak di-reset
+      stack = _local.__dict__.setdefault('stack', [])
+      current, peak = tracemalloc.get_traced_memory()
+      if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+      tracemalloc.reset_peak()
+      self.start_bytes = self.peak = current
+      stack.append(self)
+    self.cpu = time.thread_time()
+    self.wall = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    wall = time.perf_counter() - self.wall
+    cpu = time.thread_time() - self.cpu
+    stack = _local.__dict__.get('stack')
+    if stack and stack[-1] is self:
+      stack.pop()
+      self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+      self.alloc_peak = self.peak - self.start_bytes
+      if stack:
+        stack[-1].peak = max(stack[-1].peak, self.peak)
+    record(self.name, wall, cpu, self.rows, self.alloc_peak)
+    return False
+
+def stage(name, rows=0):
+  # with stage('preprocess.scale', rows=len(X)) as s: ... ; s.add_rows(n) untuk baris yang
+  # baru diketahui di dalam blok
+  return _Stage(name, rows) if ENABLED else _NULL_STAGE
+
+def profiled(name=None, rows=None):
+  # Decorator: satu stage per panggilan. rows: fungsi(hasil) -> jumlah baris (opsional)
+  def decorate(func):
+    stage_name = name or f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      if not ENABLED:
+        return func(*args, **kwargs)
+      with _Stage(stage_name) as s:
+        result = func(*args, **kwargs)
+        if rows is not None:
+          s.add_rows(rows(result))
+        return result
+    return wrapper
+  return decorate
+
+def record(name, wall, cpu, rows=0, alloc_peak=None):
+  with _lock:
+    s = _stats.get(name)
+    if s is None:
+      s = _stats[name] = {'calls': 0, 'wall_seconds': 0.0, 'wall_seconds_max': 0.0,
+                          'cpu_seconds': 0.0, 'rows': 0, 'alloc_peak_bytes': None}
+    s['calls'] += 1
+    s['wall_seconds'] += wall
+    s['wall_seconds_max'] = max(s['wall_seconds_max'], wall)
+    s['cpu_seconds'] += cpu
+    s['rows'] += rows
+    if alloc_peak is not None:
+      s['alloc_peak_bytes'] = max(s['alloc_peak_bytes'] or 0, alloc_peak)
+
+def enable(trace_alloc=False):
+  global ENABLED, TRACE_ALLOC
+  ENABLED = True
+  TRACE_ALLOC = trace_alloc
+  if trace_alloc and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+def disable():
+  global ENABLED
+  ENABLED = False
+
+def reset():
+  with _lock:
+    _stats.clear()
+
+def snapshot():
+  with _lock:
+    return {name: dict(s) for name, s in sorted(_stats.items())}
+
+def _escape(value):
+  return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def to_prometheus(stats=None, prefix=METRIC_PREFIX):
+  # Format teks eksposisi Prometheus, satu seri per stage
+  stats = snapshot() if stats is None else stats
+  metrics = [
+    ('calls_total', 'counter', 'Jumlah eksekusi stage', 'calls'),
+    ('wall_seconds_total', 'counter', 'Total wall time stage', 'wall_seconds'),
+    ('wall_seconds_max', 'gauge', 'Wall time terlama satu eksekusi', 'wall_seconds_max'),
+    ('cpu_seconds_total', 'counter', 'Total CPU time thread stage', 'cpu_seconds'),
+    ('rows_total', 'counter', 'Total baris yang diproses stage', 'rows'),
+    ('alloc_peak_bytes', 'gauge', 'Peak alokasi Python (tracemalloc) satu eksekusi',
+     'alloc_peak_bytes'),
+  ]
+  lines = []
+  for suffix, kind, help_text, key in metrics:
+    series = [(name, s[key]) for name, s in stats.items() if s[key] is not None]
+    if not series:
+      continue
+    lines.append(f"# HELP {prefix}_{suffix} {help_text}")
+    lines.append(f"# TYPE {prefix}_{suffix} {kind}")
+    lines += [f'{prefix}_{suffix}{{stage="{_escape(name)}"}} {value}' for name, value in series]
+  return '\n'.join(lines) + '\n'
+
+def export_json(path=None):
+  # Tulis snapshot ke file JSON (atomik); dipanggil di akhir CLI/halaman, no-op jika nonaktif
+  path = path or OUTPUT_PATH
+  if not ENABLED or not path:
+    return None
+  if os.path.dirname(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+  tmp = f"{path}.{os.getpid()}.tmp"
+  with open(tmp, 'w') as f:
+    json.dump({'pid': os.getpid(), 'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'stages': snapshot()}, f, indent=2)
+  os.replace(tmp, path)
+  return path
+
+if ENABLED and TRACE_ALLOC:
+  tracemalloc.start()
+if ENABLED and OUTPUT_PATH:
+  atexit.register(export_json)
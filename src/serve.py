@@ -0,0 +1,399 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import profiling
+from drift_monitor import (DEFAULT_INTERVAL, DEFAULT_INTERVALS, REFERENCE_DIR, DriftMonitor,
+                           RollingDriftMonitor, load_reference)
+from inference import load_or_build_pipeline
+from prediction_cache import DEFAULT_CAPACITY, PredictionCache
+from streaming_features import engine_exists, load_engine, model_features, uses_stream_features
+from utils import FEATURE_COLUMNS, REGISTRY_DIR, TYPE_MAP, ModelRegistry, active_version
+
+# Id mesin per instance, untuk riwayat fitur streaming
+MACHINE_KEY = 'machine_id'
+MISSING_MACHINE_ID = f"Setiap instance harus punya '{MACHINE_KEY}' (model memakai fitur streaming per mesin)"
+
+class LatencyStats:
+  # Simpan latensi terakhir di ring buffer agar p50/p99 tidak butuh memori tak terbatas
+  def __init__(self, window=10_000):
+    self.lock = threading.Lock()
+    self.latencies = np.zeros(window, dtype=np.float64)
+    self.window = window
+    self.count = 0
+    self.rows = 0
+    self.batches = 0
+    self.batch_rows = 0
+    self.started = time.time()
+
+  def record_request(self, seconds, n_rows):
+    with self.lock:
+      self.latencies[self.count % self.window] = seconds
+      self.count += 1
+      self.rows += n_rows
+
+  def record_batch(self, n_rows):
+    with self.lock:
+      self.batches += 1
+      self.batch_rows += n_rows
+
+  def snapshot(self):
+    with self.lock:
+      recent = self.latencies[:min(self.count, self.window)].copy()
+      uptime = time.time() - self.started
+      p50, p99 = (np.percentile(recent, [50, 99]) * 1000) if len(recent) else (0.0, 0.0)
+      return {
+        'requests': self.count,
+        'rows': self.rows,
+        'batches': self.batches,
+        'avg_batch_rows': self.batch_rows / self.batches if self.batches else 0.0,
+        'latency_p50_ms': float(p50),
+        'latency_p99_ms': float(p99),
+        'requests_per_sec': self.count / uptime if uptime > 0 else 0.0,
+        'rows_per_sec': self.rows / uptime if uptime > 0 else 0.0,
+        'uptime_sec': uptime,
+      }
+
+class MicroBatcher:
+  # Gabungkan request yang datang bersamaan jadi satu panggilan predict_proba.
+  # Dengan registry, versi aktif diambil per batch: hot-swap berlaku mulai batch berikutnya,
+  # batch yang sedang jalan tetap selesai dengan model lamanya.
+  # Monitor drift (opsional) di-update per batch setelah semua request dijawab; state-nya
+  # disimpan berkala ke drift_state_path agar bisa di-merge dengan worker lain.
+  # Dengan cache (PredictionCache), hanya baris yang belum pernah diskor versi model ini
+  # yang masuk ke model; kunci cache memakai pipeline.version (hash model + scaler).
+  # Untuk model dengan fitur streaming, pembacaan di-update ke riwayat per machine_id sesuai
+  # urutan kedatangan (satu thread worker) dan model menerima fitur jendela yang sama seperti
+  # saat training; request tanpa machine_id ditolak. Model tanpa fitur streaming langsung
+  # memakai pembacaan mentah (lewat cache jika ada), tanpa biaya fitur.
+  def __init__(self, pipeline=None, max_wait_ms=2.0, max_batch_rows=4096, stats=None,
+               registry=None, monitor=None, drift_state_path=None, drift_save_interval=60.0,
+               cache=None, engine=None):
+    self.pipeline = pipeline
+    self.registry = registry
+    self.cache = cache
+    self.engine = engine
+    self.monitor = monitor
+    self.drift_state_path = drift_state_path
+    self.drift_save_interval = drift_save_interval
+    self.drift_saved = time.monotonic()
+    self.max_wait = max_wait_ms / 1000
+    self.max_batch_rows = max_batch_rows
+    self.stats = stats or LatencyStats()
+    self.queue = queue.Queue()
+    self.worker = threading.Thread(target=self._run, daemon=True)
+    self.worker.start()
+
+  def current(self):
+    # (versi, pipeline) yang dipakai batch berikutnya
+    if self.registry is not None:
+      return self.registry.get()
+    return self.pipeline.version, self.pipeline
+
+  def needs_machine_ids(self):
+    return uses_stream_features(self.current()[1])
+
+  def submit(self, X, machine_ids=None):
+    future = Future()
+    self.queue.put((X, machine_ids, future))
+    return future
+
+  def _collect(self):
+    items = [self.queue.get()]
+    n_rows = len(items[0][0])
+    deadline = time.perf_counter() + self.max_wait
+    while n_rows < self.max_batch_rows:
+      remaining = deadline - time.perf_counter()
+      if remaining <= 0:
+        break
+      try:
+        item = self.queue.get(timeout=remaining)
+      except queue.Empty:
+        break
+      items.append(item)
+      n_rows += len(item[0])
+    return items
+
+  def _run(self):
+    while True:
+      items = self._collect()
+      try:
+        # Skema tiap request sudah dicek di read_instances
+        version, pipeline = self.current()
+        streaming = uses_stream_features(pipeline)
+        if streaming:
+          # Versi streaming bisa aktif setelah request dicek handler (hot-swap): tolak di sini
+          complete = [ids is not None and None not in ids for _, ids, _ in items]
+          for (_, _, future), ok in zip(items, complete):
+            if not ok:
+              future.set_exception(ValueError(MISSING_MACHINE_ID))
+          items = [item for item, ok in zip(items, complete) if ok]
+          if not items:
+            continue
+        X = np.concatenate([x for x, _, _ in items])
+        # (n, 1 + mode): kolom 0 = Machine failure; artefak multi-mode juga mengisi TWF/HDF/...
+        if streaming:
+          machine_ids = [m for _, ids, _ in items for m in ids]
+          proba = pipeline.predict_modes(model_features(self.engine, pipeline, machine_ids, X),
+                                         validate=False)
+        elif self.cache is not None:
+          proba = self.cache.get_or_compute(X, pipeline.version,
+                                            lambda X_miss: pipeline.predict_modes(X_miss, validate=False),
+                                            1 + len(pipeline.failure_modes))
+        else:
+          proba = pipeline.predict_modes(X, validate=False)
+      except Exception as e:
+        for _, _, future in items:
+          future.set_exception(e)
+        continue
+      self.stats.record_batch(len(X))
+
+      # Pecah hasil kembali sesuai request asal
+      offset = 0
+      for x, _, future in items:
+        future.set_result((proba[offset:offset + len(x)], pipeline, version))
+        offset += len(x)
+
+      if self.monitor is not None:
+        self.monitor.update(X)
+        if self.drift_state_path and time.monotonic() - self.drift_saved >= self.drift_save_interval:
+          self.monitor.save(self.drift_state_path)
+          self.drift_saved = time.monotonic()
+
+def _sensor_value(value):
+  # Nilai kosong / bukan angka -> NaN (dicatat sebagai data kosong oleh monitor drift)
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return np.nan
+
+def read_instances(payload):
+  # Terima satu objek, list objek, atau {"instances": [...]}; Type boleh L/M/H atau 0/1/2.
+  # Return (X, machine_ids, errors): kolom hilang, nilai bukan angka / tidak berhingga dan Type
+  # tak dikenal menjadi NaN + pesan di errors, agar baris yang ditolak tetap bisa dicatat
+  # monitor kualitas data. machine_id (opsional, hanya untuk instance objek) dibutuhkan model
+  # dengan fitur streaming, None jika tidak ada. Payload yang salah bentuk langsung ValueError.
+  instances = payload.get('instances', payload) if isinstance(payload, dict) else payload
+  if isinstance(instances, dict):
+    instances = [instances]
+  if not isinstance(instances, list) or not instances:
+    raise ValueError("Payload harus berisi minimal satu instance")
+
+  X = np.empty((len(instances), len(FEATURE_COLUMNS)), dtype=np.float64)
+  machine_ids = [None] * len(instances)
+  errors = []
+  for i, inst in enumerate(instances):
+    n_errors = len(errors)
+    if isinstance(inst, dict):
+      machine_ids[i] = inst.get(MACHINE_KEY)
+      missing = [c for c in FEATURE_COLUMNS if c not in inst]
+      if missing:
+        errors.append(f"Instance {i} tidak punya kolom {missing}")
+      values = [inst.get(c) for c in FEATURE_COLUMNS]
+    elif isinstance(inst, (list, tuple)):
+      values = list(inst)
+      if len(values) != len(FEATURE_COLUMNS):
+        raise ValueError(f"Instance {i} harus berisi {len(FEATURE_COLUMNS)} nilai")
+    else:
+      raise ValueError(f"Instance {i} harus berupa objek atau list")
+    type_value = values[0]
+    if isinstance(type_value, str) and type_value in TYPE_MAP:
+      X[i, 0] = TYPE_MAP[type_value]
+    elif type_value in TYPE_MAP.values() and not isinstance(type_value, bool):
+      X[i, 0] = type_value
+    else:
+      X[i, 0] = np.nan
+      if type_value is not None:
+        errors.append(f"Instance {i}: Type tidak dikenal ({type_value!r})")
+    X[i, 1:] = [_sensor_value(v) for v in values[1:]]
+    if not np.isfinite(X[i]).all() and len(errors) == n_errors:
+      errors.append(f"Instance {i}: nilai sensor harus berupa angka berhingga")
+  return X, machine_ids, errors
+
+def metrics_snapshot(batcher):
+  # Statistik serving + statistik cache prediksi (prefix cache_) jika cache aktif
+  snapshot = batcher.stats.snapshot()
+  if batcher.cache is not None:
+    snapshot.update({f"cache_{key}": value for key, value in batcher.cache.snapshot().items()})
+  return snapshot
+
+def prometheus_text(batcher):
+  # Statistik serving sebagai gauge + statistik stage dari modul profiling (jika aktif)
+  lines = []
+  for key, value in metrics_snapshot(batcher).items():
+    lines += [f"# TYPE pdm_serve_{key} gauge", f"pdm_serve_{key} {value}"]
+  return '\n'.join(lines) + '\n' + profiling.to_prometheus()
+
+def make_handler(batcher, threshold, timeout):
+  # threshold=None -> pakai threshold milik versi model yang menjawab request
+  class PredictHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, body):
+      data = json.dumps(body).encode()
+      self.send_response(status)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(data)))
+      self.end_headers()
+      self.wfile.write(data)
+
+    def do_GET(self):
+      if self.path == '/health':
+        self._send_json(200, {'status': 'ok'})
+      elif self.path == '/metrics':
+        self._send_json(200, metrics_snapshot(batcher))
+      elif self.path == '/metrics/prometheus':
+        data = prometheus_text(batcher).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+      elif self.path == '/drift':
+        if batcher.monitor is None:
+          self._send_json(404, {'error': 'Referensi drift belum dibuat (python src/drift_monitor.py)'})
+        else:
+          self._send_json(200, batcher.monitor.report())
+      else:
+        self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+      if self.path != '/predict':
+        self._send_json(404, {'error': 'Not found'})
+        return
+      start = time.perf_counter()
+      try:
+        length = int(self.headers.get('Content-Length', 0))
+        X, machine_ids, errors = read_instances(json.loads(self.rfile.read(length)))
+        if errors:
+          # Baris yang ditolak tetap dicatat monitor (kualitas data input)
+          if batcher.monitor is not None:
+            batcher.monitor.update(X, rejected=True)
+          raise ValueError(errors[0])
+        if None in machine_ids and batcher.needs_machine_ids():
+          raise ValueError(MISSING_MACHINE_ID)
+      except (ValueError, TypeError) as e:
+        self._send_json(400, {'error': str(e)})
+        return
+
+      try:
+        scores, pipeline, version = batcher.submit(X, machine_ids).result(timeout=timeout)
+      except ValueError as e:
+        self._send_json(400, {'error': str(e)})
+        return
+      except Exception as e:
+        self._send_json(500, {'error': str(e)})
+        return
+      batcher.stats.record_request(time.perf_counter() - start, len(X))
+      proba = scores[:, 0]
+      cut = pipeline.threshold if threshold is None else threshold
+      body = {
+        'probabilities': proba.tolist(),
+        'predictions': (proba > cut).astype(int).tolist(),
+        'model_version': version,
+      }
+      if pipeline.failure_modes:
+        body['failure_modes'] = [dict(zip(pipeline.failure_modes, row))
+                                 for row in scores[:, 1:].tolist()]
+      self._send_json(200, body)
+
+    def log_message(self, format, *args):
+      # Matikan log per request agar tidak jadi bottleneck
+      pass
+
+  return PredictHandler
+
+def run_server(host='0.0.0.0', port=8000, pipeline_path=None,
+               model_path='models/best_model.pkl', scaler_path='models/preprocessing.pkl',
+               max_wait_ms=2.0, max_batch_rows=4096, threshold=None, timeout=5.0,
+               registry_dir=REGISTRY_DIR, drift_reference=REFERENCE_DIR, drift_state=None,
+               cache_size=0, cache_name=None, stream_dir=None, drift_interval=DEFAULT_INTERVAL,
+               drift_intervals=DEFAULT_INTERVALS):
+  # Tanpa --pipeline: pakai versi aktif registry (hot-swap otomatis) jika ada,
+  # selain itu model & scaler di-load sekali saat startup.
+  # Konfigurasi fitur streaming dicari di stream_dir, default folder artefak / induk registry.
+  stream_dir = stream_dir or os.path.dirname(pipeline_path or registry_dir) or '.'
+  engine = load_engine(stream_dir) if engine_exists(stream_dir) else None
+  if engine is not None:
+    print(f"Fitur streaming aktif (window {engine.window}, config {stream_dir})")
+  # GET /drift = gabungan drift_intervals interval terakhir (0 = kumulatif sejak start)
+  reference = load_reference(drift_reference) if drift_reference else None
+  monitor = None
+  if reference is not None:
+    monitor = (RollingDriftMonitor(reference, drift_interval, drift_intervals) if drift_intervals > 0
+               else DriftMonitor(reference))
+  drift = {'monitor': monitor, 'drift_state_path': drift_state}
+  # cache_name -> cache di shared memory, dipakai bersama worker lain dengan nama yang sama
+  cache = None
+  if cache_size > 0 or cache_name:
+    cache = PredictionCache(cache_size or DEFAULT_CAPACITY, name=cache_name)
+  if cache is not None:
+    print(f"Cache prediksi aktif: {cache.n_sets * cache.ways:,} slot" +
+          (f" (shared memory {cache_name})" if cache_name else ""))
+  if pipeline_path is None and active_version(registry_dir) is not None:
+    registry = ModelRegistry(registry_dir)
+    print(f"Memakai registry {registry_dir}, versi aktif {registry.get()[0]}")
+    batcher = MicroBatcher(max_wait_ms=max_wait_ms, max_batch_rows=max_batch_rows, registry=registry,
+                           cache=cache, engine=engine, **drift)
+  else:
+    pipeline = load_or_build_pipeline(pipeline_path or 'models/inference_pipeline.pkl',
+                                      model_path, scaler_path)
+    batcher = MicroBatcher(pipeline, max_wait_ms, max_batch_rows, cache=cache, engine=engine,
+                           **drift)
+
+  server = ThreadingHTTPServer((host, port), make_handler(batcher, threshold, timeout))
+  server.daemon_threads = True
+  print(f"Server prediksi berjalan di http://{host}:{port} "
+        f"(POST /predict, GET /metrics, GET /metrics/prometheus, GET /drift)")
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    if cache is not None:
+      cache.close()
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="HTTP service prediksi kegagalan mesin")
+  parser.add_argument('--host', default='0.0.0.0')
+  parser.add_argument('--port', type=int, default=8000)
+  parser.add_argument('--pipeline', default=None,
+                      help="Artefak tetap; default: versi aktif registry, lalu models/inference_pipeline.pkl")
+  parser.add_argument('--registry', default=REGISTRY_DIR)
+  parser.add_argument('--model', default='models/best_model.pkl')
+  parser.add_argument('--scaler', default='models/preprocessing.pkl')
+  parser.add_argument('--max-wait-ms', type=float, default=2.0)
+  parser.add_argument('--max-batch-rows', type=int, default=4096)
+  parser.add_argument('--threshold', type=float, default=None)
+  parser.add_argument('--drift-reference', default=REFERENCE_DIR,
+                      help="Referensi distribusi train untuk GET /drift ('' = nonaktif)")
+  parser.add_argument('--drift-state', default=None,
+                      help="Folder state monitor drift worker ini (disimpan berkala, untuk merge)")
+  parser.add_argument('--drift-interval', type=float, default=DEFAULT_INTERVAL,
+                      help="Lebar satu interval jendela drift (detik)")
+  parser.add_argument('--drift-intervals', type=int, default=DEFAULT_INTERVALS,
+                      help="Jumlah interval dalam jendela GET /drift (0 = kumulatif sejak start)")
+  parser.add_argument('--cache-size', type=int, default=0,
+                      help="Kapasitas cache prediksi (jumlah pembacaan unik, 0 = nonaktif kecuali --cache-name)")
+  parser.add_argument('--cache-name', default=None,
+                      help="Nama shared memory cache agar dipakai bersama beberapa worker")
+  parser.add_argument('--stream-config', default=None,
+                      help="Folder stream_features.json; default folder --pipeline / induk --registry")
+  parser.add_argument('--profile', action='store_true',
+                      help="Catat waktu per stage (sama dengan env PDM_PROFILE=1)")
+  args = parser.parse_args()
+
+  if args.profile:
+    profiling.enable()
+
+  run_server(args.host, args.port, args.pipeline, args.model, args.scaler, args.max_wait_ms,
+             args.max_batch_rows, args.threshold, registry_dir=args.registry,
+             drift_reference=args.drift_reference, drift_state=args.drift_state,
+             cache_size=args.cache_size, cache_name=args.cache_name, stream_dir=args.stream_config,
+             drift_interval=args.drift_interval, drift_intervals=args.drift_intervals)
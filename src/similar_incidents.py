@@ -0,0 +1,252 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+
+from storage import MANIFEST_NAME, load_arrays, load_manifest, load_split, save_arrays
+from utils import FAILURE_MODES, FEATURE_COLUMNS
+
+# Numba opsional: kalau tidak terpasang, pencarian memakai loop Python + NumPy per leaf
+try:
+  from numba import njit
+  NUMBA_AVAILABLE = True
+except ImportError:
+  NUMBA_AVAILABLE = False
+
+# Indeks "insiden serupa": KD-tree seimbang dalam array (layout implisit, anak node i = 2i+1/2i+2,
+# semua leaf di kedalaman yang sama). Titik diurutkan ulang sesuai urutan leaf sehingga tiap leaf
+# = satu slice kontigu. Semua array disimpan sebagai .npy dan di-mmap saat serving, jadi proses
+# hanya menyentuh node & leaf yang dikunjungi. Pencarian k-NN eksak dengan pruning bounding box.
+INDEX_DIR = 'models/similar_incidents'
+DEFAULT_LEAF_SIZE = 32
+
+def _tree_depth(n_points, leaf_size):
+  return max(int(np.ceil(np.log2(max(n_points, 1) / leaf_size))), 0)
+
+def build_tree(X, leaf_size=DEFAULT_LEAF_SIZE):
+  # Return (perm, node_start, node_end, lo, hi, depth); split di median dimensi dengan rentang terbesar
+  X = np.asarray(X, dtype=np.float32)
+  n, d = X.shape
+  depth = _tree_depth(n, leaf_size)
+  n_nodes = 2 ** (depth + 1) - 1
+  perm = np.arange(n, dtype=np.int64)
+  node_start = np.zeros(n_nodes, dtype=np.int64)
+  node_end = np.zeros(n_nodes, dtype=np.int64)
+  node_end[0] = n
+
+  for node in range(2 ** depth - 1):
+    s, e = node_start[node], node_end[node]
+    mid = s + (e - s) // 2
+    if e - s > 1:
+      block = X[perm[s:e]]
+      dim = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+      order = np.argpartition(block[:, dim], mid - s)
+      perm[s:e] = perm[s:e][order]
+    node_start[2 * node + 1], node_end[2 * node + 1] = s, mid
+    node_start[2 * node + 2], node_end[2 * node + 2] = mid, e
+
+  # Bounding box: leaf dari data (reduceat), node internal dari gabungan kedua anak
+  points = X[perm]
+  lo = np.full((n_nodes, d), np.inf, dtype=np.float32)
+  hi = np.full((n_nodes, d), -np.inf, dtype=np.float32)
+  first_leaf = 2 ** depth - 1
+  leaves = np.arange(first_leaf, n_nodes)
+  filled = leaves[node_end[leaves] > node_start[leaves]]
+  if len(filled):
+    lo[filled] = np.minimum.reduceat(points, node_start[filled], axis=0)
+    hi[filled] = np.maximum.reduceat(points, node_start[filled], axis=0)
+  for node in range(first_leaf - 1, -1, -1):
+    lo[node] = np.minimum(lo[2 * node + 1], lo[2 * node + 2])
+    hi[node] = np.maximum(hi[2 * node + 1], hi[2 * node + 2])
+  return perm, node_start, node_end, lo, hi, depth
+
+def _box_distance(lo, hi, q):
+  gap = np.maximum(np.maximum(lo - q, q - hi), 0.0)
+  return float(gap @ gap)
+
+def _knn_numpy(points, lo, hi, node_start, node_end, depth, q, k):
+  best_d = np.full(k, np.inf)
+  best_i = np.full(k, -1, dtype=np.int64)
+  first_leaf = 2 ** depth - 1
+  stack = [0]
+  while stack:
+    node = stack.pop()
+    if _box_distance(lo[node], hi[node], q) >= best_d[-1]:
+      continue
+    if node >= first_leaf:
+      s, e = node_start[node], node_end[node]
+      dist = ((np.asarray(points[s:e], dtype=np.float64) - q) ** 2).sum(axis=1)
+      cand_d = np.concatenate([best_d, dist])
+      cand_i = np.concatenate([best_i, np.arange(s, e)])
+      keep = np.argsort(cand_d, kind='stable')[:k]
+      best_d, best_i = cand_d[keep], cand_i[keep]
+      continue
+    left, right = 2 * node + 1, 2 * node + 2
+    # Anak yang lebih dekat di-pop lebih dulu
+    if _box_distance(lo[left], hi[left], q) <= _box_distance(lo[right], hi[right], q):
+      stack += [right, left]
+    else:
+      stack += [left, right]
+  return best_i, best_d
+
+if NUMBA_AVAILABLE:
+  @njit(cache=True)
+  def _box_distance_numba(lo, hi, node, q):
+    total = 0.0
+    for j in range(q.shape[0]):
+      if q[j] < lo[node, j]:
+        diff = lo[node, j] - q[j]
+      elif q[j] > hi[node, j]:
+        diff = q[j] - hi[node, j]
+      else:
+        diff = 0.0
+      total += diff * diff
+    return total
+
+  @njit(cache=True)
+  def _knn_numba(points, lo, hi, node_start, node_end, depth, q, k):
+    best_d = np.full(k, np.inf)
+    best_i = np.full(k, -1, dtype=np.int64)
+    first_leaf = 2 ** depth - 1
+    stack = np.empty(2 * depth + 2, dtype=np.int64)
+    stack[0] = 0
+    sp = 1
+    while sp > 0:
+      sp -= 1
+      node = stack[sp]
+      if _box_distance_numba(lo, hi, node, q) >= best_d[k - 1]:
+        continue
+      if node >= first_leaf:
+        for i in range(node_start[node], node_end[node]):
+          dist = 0.0
+          for j in range(q.shape[0]):
+            diff = points[i, j] - q[j]
+            dist += diff * diff
+          if dist < best_d[k - 1]:
+            # Sisipkan ke daftar terurut k terbaik
+            pos = k - 1
+            while pos > 0 and best_d[pos - 1] > dist:
+              best_d[pos] = best_d[pos - 1]
+              best_i[pos] = best_i[pos - 1]
+              pos -= 1
+            best_d[pos] = dist
+            best_i[pos] = i
+        continue
+      left, right = 2 * node + 1, 2 * node + 2
+      if _box_distance_numba(lo, hi, left, q) <= _box_distance_numba(lo, hi, right, q):
+        stack[sp], stack[sp + 1] = right, left
+      else:
+        stack[sp], stack[sp + 1] = left, right
+      sp += 2
+    return best_i, best_d
+
+class IncidentIndex:
+  # Dibuka dari folder indeks (array di-mmap). query() menerima vektor fitur ter-scaling
+  # (ruang preprocessing.pkl saat indeks dibangun), query_raw() menerima input mentah dan
+  # men-scaling-nya dengan mean/scale yang disimpan di indeks, bukan scaler model serving.
+  def __init__(self, path=INDEX_DIR, mmap_mode='r'):
+    self.path = path
+    self.meta = load_manifest(path)['meta']
+    arrays = load_arrays(path, mmap_mode=mmap_mode)
+    self.labels, self.modes = arrays['labels'], arrays['modes']
+    self.lo, self.hi = arrays['lo'], arrays['hi']
+    self.node_start, self.node_end = arrays['node_start'], arrays['node_end']
+    self.points = arrays['points']
+    self.depth = self.meta['depth']
+    self.mean = np.asarray(self.meta['mean'])
+    self.scale = np.asarray(self.meta['scale'])
+    self.feature_names = self.meta['feature_names']
+    self.failure_modes = self.meta['failure_modes']
+
+  def __len__(self):
+    return len(self.labels)
+
+  def query(self, X_scaled, k=5):
+    # Return (indeks, jarak euclidean) berbentuk (n, k); -1 / inf jika data < k
+    X_scaled = np.atleast_2d(np.asarray(X_scaled, dtype=np.float32))
+    k = max(int(k), 1)
+    idx = np.full((len(X_scaled), k), -1, dtype=np.int64)
+    dist = np.full((len(X_scaled), k), np.inf)
+    knn = _knn_numba if NUMBA_AVAILABLE else _knn_numpy
+    for r, q in enumerate(X_scaled):
+      idx[r], dist[r] = knn(self.points, self.lo, self.hi, self.node_start, self.node_end,
+                            self.depth, q, k)
+    return idx, np.sqrt(dist)
+
+  def records(self, idx, dist):
+    # Baris histori dalam satuan asli sensor + label kegagalan & mode
+    out = []
+    for i, d in zip(idx, dist):
+      if i < 0:
+        continue
+      raw = np.asarray(self.points[i], dtype=np.float64) * self.scale + self.mean
+      out.append({
+        **{c: float(v) for c, v in zip(self.feature_names, np.round(raw, 4))},
+        'Machine failure': int(self.labels[i]),
+        'modes': [m for m, flag in zip(self.failure_modes, self.modes[i]) if flag],
+        'distance': float(d),
+      })
+    return out
+
+  def query_raw(self, X_raw, k=5):
+    # Input mentah (n, 6), Type kode 0/1/2 -> list (per baris) berisi k insiden terdekat
+    X_raw = np.atleast_2d(np.asarray(X_raw, dtype=np.float64))
+    if X_raw.ndim != 2 or X_raw.shape[1] != len(self.mean):
+      raise ValueError(f"Input harus berbentuk (n, {len(self.mean)}), didapat {X_raw.shape}")
+    if not np.isfinite(X_raw).all():
+      raise ValueError("Input mengandung NaN atau inf")
+    idx, dist = self.query((X_raw - self.mean) / self.scale, k)
+    return [self.records(i, d) for i, d in zip(idx, dist)]
+
+def build_index(X_scaled, labels, modes, output_path=INDEX_DIR, leaf_size=DEFAULT_LEAF_SIZE,
+                meta=None):
+  perm, node_start, node_end, lo, hi, depth = build_tree(X_scaled, leaf_size)
+  # points disimpan column-major (save_arrays): satu leaf = satu slice kontigu per kolom
+  save_arrays(output_path, {
+    'points': np.asarray(X_scaled, dtype=np.float32)[perm],
+    'labels': np.asarray(labels, dtype=np.int8)[perm],
+    'modes': np.asarray(modes, dtype=np.int8)[perm],
+    'node_start': node_start, 'node_end': node_end, 'lo': lo, 'hi': hi,
+  }, meta={'depth': depth, 'leaf_size': leaf_size, 'rows': len(perm), **(meta or {})})
+  return output_path
+
+def build_from_split(data_path='data/processed', output_path=INDEX_DIR, scaler_path=None,
+                     failures_only=True, leaf_size=DEFAULT_LEAF_SIZE):
+  # Indeks dibangun offline dari split ter-scaling (train + test) hasil preprocessing
+  data = load_split(data_path, ['X_train', 'X_test', 'y_train', 'y_test',
+                                'y_modes_train', 'y_modes_test'])
+  X = np.concatenate([data['X_train'], data['X_test']])
+  y = np.concatenate([data['y_train'], data['y_test']])
+  modes = np.concatenate([data['y_modes_train'], data['y_modes_test']])
+  if failures_only:
+    keep = y == 1
+    X, y, modes = X[keep], y[keep], modes[keep]
+
+  scaler = joblib.load(scaler_path or 'models/preprocessing.pkl')
+  start = time.perf_counter()
+  build_index(X, y, modes, output_path, leaf_size, meta={
+    'feature_names': list(data['feature_names'] or FEATURE_COLUMNS),
+    'failure_modes': FAILURE_MODES,
+    'mean': scaler.mean_.tolist(), 'scale': scaler.scale_.tolist(),
+    'failures_only': failures_only,
+  })
+  print(f"Indeks insiden serupa Selesai. {len(y):,} baris dalam {time.perf_counter() - start:.2f} "
+        f"detik, disimpan di {output_path}")
+  return output_path
+
+def index_exists(path=INDEX_DIR):
+  return os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Bangun indeks KD-tree insiden serupa (offline)")
+  parser.add_argument('--data', default='data/processed')
+  parser.add_argument('--output', default=INDEX_DIR)
+  parser.add_argument('--scaler', default='models/preprocessing.pkl')
+  parser.add_argument('--all-readings', action='store_true',
+                      help="Indeks semua pembacaan, bukan hanya yang berakhir gagal")
+  parser.add_argument('--leaf-size', type=int, default=DEFAULT_LEAF_SIZE)
+  args = parser.parse_args()
+
+  build_from_split(args.data, args.output, args.scaler, not args.all_readings, args.leaf_size)
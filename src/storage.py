@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+
+# Layout kolumnar: satu file .npy per array + manifest.json kecil.
+# Matriks 2D disimpan column-major (Fortran order) sehingga satu kolom = satu blok kontigu
+# di file, dan bisa di-mmap tanpa copy.
+MANIFEST_NAME = 'manifest.json'
+SPLIT_DIR = 'split'
+SPLIT_PICKLE = 'split_data.pkl'
+
+def save_arrays(directory, arrays, columns=None, meta=None):
+  # Tulis ke folder sementara lalu rename, agar pembaca tidak pernah melihat data setengah jadi
+  tmp_dir = f"{directory.rstrip('/')}.tmp"
+  shutil.rmtree(tmp_dir, ignore_errors=True)
+  os.makedirs(tmp_dir)
+
+  manifest = {'arrays': {}, 'columns': list(columns or []), 'meta': meta or {}}
+  for name, arr in arrays.items():
+    arr = np.asarray(arr)
+    if arr.ndim == 2:
+      arr = np.asfortranarray(arr)
+    np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+    manifest['arrays'][name] = {'file': f"{name}.npy", 'dtype': arr.dtype.str,
+                                'shape': list(arr.shape)}
+  with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+    json.dump(manifest, f, indent=2)
+
+  shutil.rmtree(directory, ignore_errors=True)
+  os.replace(tmp_dir, directory)
+
+def append_arrays(directory, arrays, meta=None):
+  # Tambah baris di akhir array yang sudah ada (axis 0), tanpa mengubah baris lama. Tetap lewat
+  # folder sementara + rename (pembaca tidak melihat file yang sedang tumbuh); baris lama hanya
+  # disalin blok demi blok dari mmap, tanpa dihitung ulang.
+  manifest = load_manifest(directory)
+  tmp_dir = f"{directory.rstrip('/')}.tmp"
+  shutil.rmtree(tmp_dir, ignore_errors=True)
+  os.makedirs(tmp_dir)
+
+  for name, info in manifest['arrays'].items():
+    old = np.load(os.path.join(directory, info['file']), mmap_mode='r')
+    new = np.asarray(arrays[name], dtype=old.dtype)
+    if new.shape[1:] != old.shape[1:]:
+      raise ValueError(f"Bentuk {name} tidak cocok: {old.shape} + {new.shape}")
+    shape = (len(old) + len(new),) + old.shape[1:]
+    out = np.lib.format.open_memmap(os.path.join(tmp_dir, info['file']), mode='w+', dtype=old.dtype,
+                                    shape=shape, fortran_order=old.ndim == 2)
+    out[:len(old)] = old
+    out[len(old):] = new
+    out.flush()
+    del out
+    info['shape'] = list(shape)
+  manifest['meta'] = {**manifest['meta'], **(meta or {})}
+  with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+    json.dump(manifest, f, indent=2)
+
+  shutil.rmtree(directory, ignore_errors=True)
+  os.replace(tmp_dir, directory)
+
+def load_manifest(directory):
+  with open(os.path.join(directory, MANIFEST_NAME)) as f:
+    return json.load(f)
+
+def load_arrays(directory, names=None, mmap_mode='r'):
+  # Hanya array yang diminta yang dibuka; dengan mmap_mode='r' data tidak disalin ke RAM
+  manifest = load_manifest(directory)
+  names = names or list(manifest['arrays'])
+  missing = [n for n in names if n not in manifest['arrays']]
+  if missing:
+    raise KeyError(f"Array {missing} tidak ada di {directory}")
+  return {n: np.load(os.path.join(directory, manifest['arrays'][n]['file']), mmap_mode=mmap_mode)
+          for n in names}
+
+def load_columns(directory, name, columns, mmap_mode='r'):
+  # Ambil kolom tertentu dari matriks 2D (view ke mmap, tanpa copy)
+  manifest = load_manifest(directory)
+  X = load_arrays(directory, [name], mmap_mode)[name]
+  index = [manifest['columns'].index(c) if isinstance(c, str) else c for c in columns]
+  return {c: X[:, j] for c, j in zip(columns, index)}
+
+def save_split(data_path, X_train, X_test, y_train, y_test, feature_names, meta=None, **arrays):
+  # Pengganti split_data.pkl: data/processed/split/{X_train,X_test,y_train,y_test}.npy
+  arrays = {'X_train': np.asarray(X_train, dtype=np.float32),
+            'X_test': np.asarray(X_test, dtype=np.float32),
+            'y_train': np.asarray(y_train, dtype=np.int8),
+            'y_test': np.asarray(y_test, dtype=np.int8), **arrays}
+  save_arrays(os.path.join(data_path, SPLIT_DIR), arrays, columns=feature_names, meta=meta)
+
+def load_split(data_path, names=None, mmap_mode='r'):
+  # Baca split dari layout kolumnar; fallback ke split_data.pkl lama jika belum dikonversi
+  split_dir = os.path.join(data_path, SPLIT_DIR)
+  if os.path.exists(os.path.join(split_dir, MANIFEST_NAME)):
+    data = load_arrays(split_dir, names, mmap_mode)
+    data['feature_names'] = load_manifest(split_dir)['columns']
+    return data
+
+  legacy = joblib.load(os.path.join(data_path, SPLIT_PICKLE))
+  names = names or [k for k in legacy if k != 'feature_names']
+  data = {n: np.asarray(legacy[n]) for n in names}
+  data['feature_names'] = list(legacy.get('feature_names', []))
+  return data
+
+def convert_split_pickle(data_path):
+  # Konversi sekali split_data.pkl lama ke layout kolumnar
+  legacy = joblib.load(os.path.join(data_path, SPLIT_PICKLE))
+  save_split(data_path, legacy['X_train'], legacy['X_test'], legacy['y_train'], legacy['y_test'],
+             legacy.get('feature_names'))
+  print(f"{SPLIT_PICKLE} dikonversi ke {os.path.join(data_path, SPLIT_DIR)}/")
+
+if __name__ == "__main__":
+  convert_split_pickle('data/processed')
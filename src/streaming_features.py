@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from data_preprocessing import assign_test
+from inference import frame_to_matrix
+from ingest import read_ai4i
+from storage import save_split
+from utils import FEATURE_COLUMNS, TARGET_COLUMN
+
+# Fitur streaming: fitur fisik turunan + statistik jendela geser per mesin.
+# Training (replay CSV) dan serving (update per pembacaan) memakai definisi yang sama.
+DERIVED_COLUMNS = ['Power Strain [kW]', 'Temp Delta [K]']
+ROLLING_SOURCES = ['Air temperature [K]', 'Process temperature [K]', 'Rotational speed [rpm]',
+                   'Torque [Nm]'] + DERIVED_COLUMNS
+ROLLING_STATS = ['mean', 'slope', 'delta']
+DEFAULT_WINDOW = 10
+CONFIG_NAME = 'stream_features.json'
+
+def feature_names(sources=ROLLING_SOURCES):
+  return FEATURE_COLUMNS + DERIVED_COLUMNS + [f"{c} {s}" for s in ROLLING_STATS for c in sources]
+
+def derived_features(X):
+  # Power Strain = Torsi x RPM / 1000, Temp Delta = Suhu Proses - Suhu Udara
+  X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+  col = {c: X[:, j] for j, c in enumerate(FEATURE_COLUMNS)}
+  return np.column_stack([col['Torque [Nm]'] * col['Rotational speed [rpm]'] / 1000,
+                          col['Process temperature [K]'] - col['Air temperature [K]']])
+
+def _rolling_values(X):
+  # Sinyal yang disimpan di ring buffer, dibulatkan ke float32 (sama online & offline)
+  base = np.column_stack([X, derived_features(X)])
+  names = FEATURE_COLUMNS + DERIVED_COLUMNS
+  idx = [names.index(c) for c in ROLLING_SOURCES]
+  return base, base[:, idx].astype(np.float32).astype(np.float64)
+
+def _slope(n, sum_x, sum_tx):
+  # Slope regresi linear x terhadap indeks t = 0..n-1 dalam jendela
+  n = n[:, None].astype(np.float64)
+  sum_t = n * (n - 1) / 2
+  sum_tt = (n - 1) * n * (2 * n - 1) / 6
+  denom = n * sum_tt - sum_t ** 2
+  with np.errstate(invalid='ignore', divide='ignore'):
+    return np.where(denom > 0, (n * sum_tx - sum_t * sum_x) / denom, 0.0)
+
+class StreamingFeatureEngine:
+  # State per mesin dalam array (bukan objek per mesin): ring buffer (mesin, window, sinyal)
+  # float32 + jumlah berjalan float64. Tiap pembacaan baru O(1) per sinyal; jumlah dihitung
+  # ulang dari buffer setiap buffer berputar penuh (amortized O(1)) agar error float tidak menumpuk.
+  def __init__(self, window=DEFAULT_WINDOW, capacity=1024, machine_column=None):
+    self.window = window
+    self.machine_column = machine_column
+    self.n_signals = len(ROLLING_SOURCES)
+    self.feature_columns = feature_names()
+    self.slot_of = {}
+    self.n_machines = 0
+    self._allocate(capacity)
+
+  def _allocate(self, capacity):
+    old = getattr(self, 'buf', None)
+    buf = np.zeros((capacity, self.window, self.n_signals), dtype=np.float32)
+    sum_x = np.zeros((capacity, self.n_signals))
+    sum_tx = np.zeros((capacity, self.n_signals))
+    pos = np.zeros(capacity, dtype=np.int32)
+    count = np.zeros(capacity, dtype=np.int32)
+    if old is not None:
+      n = len(old)
+      buf[:n], sum_x[:n], sum_tx[:n] = self.buf[:n], self.sum_x[:n], self.sum_tx[:n]
+      pos[:n], count[:n] = self.pos[:n], self.count[:n]
+    self.buf, self.sum_x, self.sum_tx, self.pos, self.count = buf, sum_x, sum_tx, pos, count
+
+  def slots(self, machine_ids):
+    # Petakan id mesin -> indeks baris state; mesin baru dapat slot baru (kapasitas digandakan)
+    slots = np.empty(len(machine_ids), dtype=np.int64)
+    for i, machine in enumerate(machine_ids):
+      slot = self.slot_of.get(machine)
+      if slot is None:
+        slot = self.slot_of[machine] = self.n_machines
+        self.n_machines += 1
+      slots[i] = slot
+    if self.n_machines > len(self.pos):
+      self._allocate(max(self.n_machines, 2 * len(self.pos)))
+    return slots
+
+  def _push(self, slots, x):
+    # Satu ronde: tiap slot muncul paling banyak sekali
+    W = self.window
+    count, pos = self.count[slots], self.pos[slots]
+    full = (count == W)[:, None]
+    has_prev = (count > 0)[:, None]
+    prev = self.buf[slots, (pos - 1) % W].astype(np.float64)
+    oldest = self.buf[slots, pos].astype(np.float64)
+
+    sum_x = self.sum_x[slots] - np.where(full, oldest, 0.0)
+    # Saat jendela penuh semua indeks t bergeser -1, sehingga sum(t*x) berkurang sum(x) sisa
+    sum_tx = self.sum_tx[slots] - np.where(full, sum_x, 0.0)
+    sum_tx += np.minimum(count, W - 1)[:, None] * x
+    sum_x += x
+    count = np.minimum(count + 1, W)
+    pos = (pos + 1) % W
+
+    self.buf[slots, (pos - 1) % W] = x
+    wrapped = pos == 0
+    if wrapped.any():
+      # Buffer penuh & berurutan (tertua di indeks 0): hitung ulang jumlah secara eksak
+      block = self.buf[slots[wrapped]].astype(np.float64)
+      sum_x[wrapped] = block.sum(axis=1)
+      sum_tx[wrapped] = (np.arange(W)[None, :, None] * block).sum(axis=1)
+
+    self.sum_x[slots], self.sum_tx[slots] = sum_x, sum_tx
+    self.count[slots], self.pos[slots] = count, pos
+    mean = sum_x / count[:, None]
+    delta = np.where(has_prev, x - prev, 0.0)
+    return np.column_stack([mean, _slope(count, sum_x, sum_tx), delta])
+
+  def update(self, machine_ids, X_raw):
+    # X_raw: (n, 6) urutan FEATURE_COLUMNS, urut waktu. Return fitur (n, len(feature_columns)).
+    base, x = _rolling_values(X_raw)
+    slots = self.slots(machine_ids)
+    rolling = np.empty((len(slots), 3 * self.n_signals))
+    # Mesin yang muncul beberapa kali di satu batch diproses bertahap (ronde ke-k = kemunculan ke-k)
+    order = np.argsort(slots, kind='stable')
+    sorted_slots = slots[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_slots)) + 1]
+    rank = np.empty(len(slots), dtype=np.int64)
+    rank[order] = np.arange(len(slots)) - np.repeat(starts, np.diff(np.r_[starts, len(slots)]))
+    for r in range(int(rank.max()) + 1 if len(rank) else 0):
+      rows = np.flatnonzero(rank == r)
+      rolling[rows] = self._push(slots[rows], x[rows])
+    return np.column_stack([base, rolling])
+
+  def nbytes(self):
+    return sum(a.nbytes for a in (self.buf, self.sum_x, self.sum_tx, self.pos, self.count))
+
+def compute_features(X_raw, machine_ids=None, window=DEFAULT_WINDOW, chunk_rows=1_000_000):
+  # Versi offline (replay histori untuk training), hasil sama dengan StreamingFeatureEngine.
+  # Baris harus urut waktu; tanpa machine_ids semua baris dianggap satu aliran.
+  base, x = _rolling_values(X_raw)
+  n = len(x)
+  machine_ids = np.zeros(n, dtype=np.int64) if machine_ids is None else np.asarray(machine_ids)
+  order = np.argsort(machine_ids, kind='stable')
+  xs = x[order]
+  ids_sorted = machine_ids[order]
+  group_start = np.maximum.accumulate(
+    np.where(np.r_[True, ids_sorted[1:] != ids_sorted[:-1]], np.arange(n), 0))
+
+  rolling = np.empty((n, 3 * x.shape[1]))
+  k = np.arange(window)
+  for start in range(0, n, chunk_rows):
+    i = np.arange(start, min(start + chunk_rows, n))
+    count = np.minimum(i - group_start[i] + 1, window)
+    idx = i[:, None] - (window - 1) + k[None, :]
+    valid = k[None, :] >= (window - count)[:, None]
+    win = np.where(valid[:, :, None], xs[np.maximum(idx, 0)], 0.0)
+    t = (k[None, :] - (window - count)[:, None]).astype(np.float64)
+    sum_x = win.sum(axis=1)
+    sum_tx = (t[:, :, None] * win).sum(axis=1)
+    prev = xs[np.maximum(i - 1, 0)]
+    delta = np.where((count > 1)[:, None], xs[i] - prev, 0.0)
+    rolling[i] = np.column_stack([sum_x / count[:, None], _slope(count, sum_x, sum_tx), delta])
+
+  out = np.empty_like(rolling)
+  out[order] = rolling
+  return np.column_stack([base, out])
+
+def prepare_training_data(input_path, output_data_path, output_model_path, window=DEFAULT_WINDOW,
+                          machine_column=None):
+  # Sama seperti preprocess_data, tapi dengan fitur streaming (replay CSV urut UDI)
+  columns = ['UDI'] + FEATURE_COLUMNS + [TARGET_COLUMN] + ([machine_column] if machine_column else [])
+  df = read_ai4i(input_path, columns).sort_values('UDI', kind='stable')
+  machine_ids = df[machine_column].to_numpy() if machine_column else None
+  X = pd.DataFrame(compute_features(frame_to_matrix(df), machine_ids, window),
+                   columns=feature_names())
+  y = df[TARGET_COLUMN].to_numpy()
+
+  test = assign_test(df['UDI'].to_numpy())  # aturan split sama dengan preprocess_data
+  X_train, X_test, y_train, y_test = X[~test], X[test], y[~test], y[test]
+  scaler = StandardScaler()
+  X_train_scaled = scaler.fit_transform(X_train)
+  X_test_scaled = scaler.transform(X_test)
+
+  os.makedirs(output_model_path, exist_ok=True)
+  joblib.dump(scaler, f"{output_model_path}/preprocessing.pkl")
+  with open(f"{output_model_path}/{CONFIG_NAME}", 'w') as f:
+    json.dump({'window': window, 'machine_column': machine_column,
+               'feature_columns': feature_names()}, f, indent=2)
+  save_split(output_data_path, X_train_scaled, X_test_scaled, y_train, y_test, feature_names(),
+             meta={'window': window})
+  print(f"Preprocessing Streaming Selesai. {X.shape[1]} fitur, window {window}.")
+
+def uses_stream_features(pipeline):
+  # Model dengan fitur streaming punya kolom di luar skema mentah (lihat prepare_training_data)
+  return list(pipeline.feature_columns) != FEATURE_COLUMNS
+
+def engine_exists(model_path):
+  return os.path.exists(f"{model_path}/{CONFIG_NAME}")
+
+def load_engine(model_path, capacity=1024):
+  # Engine serving dengan konfigurasi yang sama seperti saat training
+  with open(f"{model_path}/{CONFIG_NAME}") as f:
+    config = json.load(f)
+  engine = StreamingFeatureEngine(config['window'], capacity, config.get('machine_column'))
+  if engine.feature_columns != config['feature_columns']:
+    raise ValueError("Definisi fitur streaming berbeda dengan saat training")
+  return engine
+
+def model_features(engine, pipeline, machine_ids, X_raw):
+  # Input model untuk pembacaan mentah (n, 6). Model tanpa fitur streaming memakai X_raw apa
+  # adanya tanpa menyentuh engine (tanpa biaya fitur, hasilnya bisa di-cache); setelah beralih
+  # ke model streaming, jendela tiap mesin terisi kembali dalam `window` pembacaan.
+  if not uses_stream_features(pipeline):
+    return X_raw
+  if engine is None:
+    raise ValueError(f"Model memakai fitur streaming, tapi {CONFIG_NAME} tidak ditemukan")
+  if engine.feature_columns != list(pipeline.feature_columns):
+    raise ValueError("Kolom fitur streaming berbeda dengan kolom model")
+  return engine.update(machine_ids, X_raw)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Siapkan data training dengan fitur streaming")
+  parser.add_argument('--input', default='data/raw/ai4i2020.csv')
+  parser.add_argument('--data', default='data/processed/stream')
+  parser.add_argument('--models', default='models/stream')
+  parser.add_argument('--window', type=int, default=DEFAULT_WINDOW)
+  parser.add_argument('--machine-column', default=None,
+                      help="Kolom id mesin; tanpa ini semua baris dianggap satu aliran")
+  args = parser.parse_args()
+
+  prepare_training_data(args.input, args.data, args.models, args.window, args.machine_column)
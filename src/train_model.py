@@ -1,19 +1,137 @@
+import argparse
+
 import joblib
+import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 
+from evaluate_model import evaluate
+from explain import summarize
+from inference import InferencePipeline, save_pipeline
+from profiling import stage
+from storage import load_split
+from tree_engine import combine_forests, export_model
+from utils import FAILURE_MODES, TARGET_COLUMN, register_model
+
 def train(data_path, model_output_path):
   # Load Data
-  data = joblib.load(f"{data_path}/split_data.pkl")
-  X_train, y_train = data['X_train'], data['y_train']
+  with stage('train.load') as s:
+    data = load_split(data_path, ['X_train', 'y_train'])
+    X_train, y_train = data['X_train'], data['y_train']
+    s.add_rows(len(y_train))
   
   # Init Model (Contoh pakai RF)
-  model = RandomForestClassifier(class_weight='balanced', random_state=42)
-  model.fit(X_train, y_train)
+  with stage('train.fit', rows=len(y_train)):
+    model = RandomForestClassifier(class_weight='balanced', random_state=42)
+    model.fit(X_train, y_train)
   
+  save_trained_model(model, model_output_path, data_path)
+
+def save_trained_model(model, model_output_path, data_path=None, model_name=None, meta=None):
+  # Urutan simpan yang sama untuk train.py & tune_model.py; meta ikut ke meta.json registry
   # Save Model
-  joblib.dump(model, f"{model_output_path}/best_model.pkl")
-  print("Training Selesai. Model disimpan.")
+  with stage('train.save'):
+    joblib.dump(model, f"{model_output_path}/best_model.pkl")
+    print("Training Selesai. Model disimpan.")
+
+    # Save artefak inferensi gabungan (encoding + scaler + model) untuk serving
+    scaler = joblib.load(f"{model_output_path}/preprocessing.pkl")
+    pipeline = InferencePipeline.from_scaler(model, scaler, model_name=model_name)
+    save_pipeline(pipeline, f"{model_output_path}/inference_pipeline.pkl")
+    # Versi baru di registry langsung aktif (server & dashboard hot-swap tanpa restart)
+    register_model(pipeline, f"{model_output_path}/registry", meta=meta)
+
+  # Laporan evaluasi + ringkasan SHAP dibuat sekali di sini, halaman app hanya membacanya
+  if data_path is not None:
+    with stage('train.evaluate'):
+      evaluate(data_path, model_output_path, model)
+    with stage('train.explain'):
+      summarize(data_path, model_output_path, model)
+
+def iter_chunks(data_path, chunk_rows):
+  # Baca X_train/y_train dari file .npy yang di-mmap, satu chunk per langkah
+  data = load_split(data_path, ['X_train', 'y_train'], mmap_mode='r')
+  X_train, y_train = data['X_train'], data['y_train']
+  for start in range(0, len(y_train), chunk_rows):
+    yield (np.ascontiguousarray(X_train[start:start + chunk_rows], dtype=np.float32),
+           np.asarray(y_train[start:start + chunk_rows]))
+
+def merge_forests(forests):
+  # Gabungkan estimator dari beberapa RandomForest jadi satu model biasa (kompatibel best_model.pkl)
+  merged = forests[0]
+  for forest in forests[1:]:
+    if forest.n_features_in_ != merged.n_features_in_ or \
+        not np.array_equal(forest.classes_, merged.classes_):
+      raise ValueError("Forest yang digabung harus punya fitur dan kelas yang sama")
+    merged.estimators_ += forest.estimators_
+  merged.n_estimators = len(merged.estimators_)
+  return merged
+
+def train_out_of_core(data_path, model_output_path, chunk_rows=500_000, trees_per_chunk=10,
+                      n_jobs=-1):
+  # Bagging per chunk: tiap chunk melatih beberapa pohon, lalu semua pohon digabung.
+  # Hanya satu chunk yang ada di RAM pada satu waktu.
+  forests = []
+  for i, (X_chunk, y_chunk) in enumerate(iter_chunks(data_path, chunk_rows)):
+    if len(np.unique(y_chunk)) < 2:
+      print(f"Chunk {i + 1} dilewati: hanya berisi satu kelas.")
+      continue
+    forest = RandomForestClassifier(n_estimators=trees_per_chunk, class_weight='balanced',
+                                    random_state=42 + i, n_jobs=n_jobs)
+    forest.fit(X_chunk, y_chunk)
+    forests.append(forest)
+    print(f"Chunk {i + 1}: {len(y_chunk):,} baris, {trees_per_chunk} pohon dilatih.")
+
+  if not forests:
+    raise ValueError("Tidak ada chunk yang berisi kedua kelas, model tidak bisa dilatih")
+  save_trained_model(merge_forests(forests), model_output_path, data_path)
+
+def train_failure_modes(data_path, model_output_path, n_estimators=100, n_jobs=-1):
+  # Satu RandomForest per target (Machine failure + tiap mode), digabung jadi satu MultiForest
+  # sehingga satu traversal menghasilkan probabilitas semua mode sekaligus
+  data = load_split(data_path, ['X_train', 'y_train', 'y_modes_train'])
+  X_train = data['X_train']
+  targets = [(TARGET_COLUMN, data['y_train'])] + \
+    [(mode, data['y_modes_train'][:, j]) for j, mode in enumerate(FAILURE_MODES)]
+
+  forests, names = [], []
+  for name, y in targets:
+    y = np.asarray(y)
+    if len(np.unique(y)) < 2:
+      if name == TARGET_COLUMN:
+        raise ValueError("Data train hanya berisi satu kelas Machine failure")
+      print(f"Mode {name} dilewati: tidak ada contoh positif di data train.")
+      continue
+    model = RandomForestClassifier(n_estimators=n_estimators, class_weight='balanced',
+                                   random_state=42, n_jobs=n_jobs)
+    model.fit(X_train, y)
+    forests.append(export_model(model))
+    names.append(name)
+    print(f"Model {name}: {int(y.sum())} kasus positif, {n_estimators} pohon.")
+
+  scaler = joblib.load(f"{model_output_path}/preprocessing.pkl")
+  pipeline = InferencePipeline.from_scaler(combine_forests(forests, names), scaler,
+                                           model_name='FailureModes')
+  save_pipeline(pipeline, f"{model_output_path}/failure_modes_pipeline.pkl")
+  print("Training Mode Kegagalan Selesai.")
+  return pipeline
 
 if __name__ == "__main__":
-  train('data/processed', 'models')
\ No newline at end of file
+  parser = argparse.ArgumentParser(description="Training model prediksi kegagalan mesin")
+  parser.add_argument('--data', default='data/processed',
+                      help="Folder split (mis. data/processed/stream untuk fitur streaming)")
+  parser.add_argument('--models', default='models')
+  parser.add_argument('--out-of-core', action='store_true',
+                      help="Latih per chunk dari disk (untuk data yang lebih besar dari RAM)")
+  parser.add_argument('--failure-modes', action='store_true',
+                      help="Latih model per mode kegagalan (TWF/HDF/PWF/OSF/RNF) dalam satu artefak")
+  parser.add_argument('--chunk-rows', type=int, default=500_000)
+  parser.add_argument('--trees-per-chunk', type=int, default=10)
+  args = parser.parse_args()
+
+  if args.failure_modes:
+    train_failure_modes(args.data, args.models)
+  elif args.out_of_core:
+    train_out_of_core(args.data, args.models, args.chunk_rows, args.trees_per_chunk)
+  else:
+    train(args.data, args.models)
@@ -0,0 +1,381 @@
+import argparse
+import copy
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+
+# Numba opsional: kalau tidak terpasang, evaluator NumPy yang dipakai
+try:
+  from numba import config as numba_config, njit, prange
+  NUMBA_AVAILABLE = True
+  # Kernel paralel dipanggil dari thread worker (serve.py, Streamlit). Layer TBB membuat proses
+  # menggantung saat keluar dalam kasus itu, jadi OpenMP didahulukan kecuali diatur lewat env.
+  if 'NUMBA_THREADING_LAYER' not in os.environ and 'NUMBA_THREADING_LAYER_PRIORITY' not in os.environ:
+    numba_config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+except ImportError:
+  NUMBA_AVAILABLE = False
+
+class FlatForest:
+  # Ensemble pohon dalam array kontigu. Semua pohon digabung dalam satu tabel node dengan
+  # urutan BFS sehingga anak kanan selalu = anak kiri + 1 (cukup satu array `left`).
+  # Aturan split seragam: ke kanan jika x > threshold (NaN ikut default_left).
+  # Leaf menunjuk ke dirinya sendiri dengan threshold +inf, jadi traversal tanpa cabang.
+  #   kind='rf'  -> proba = rata-rata nilai leaf (proba kelas 1 per pohon)
+  #   kind='xgb' -> proba = sigmoid(jumlah nilai leaf + base_margin)
+  def __init__(self, kind, roots, feature, threshold, left, default_left, value,
+               max_depth, n_features, base_margin=0.0):
+    self.kind = kind
+    self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+    self.feature = np.ascontiguousarray(feature, dtype=np.int16)
+    self.threshold = np.ascontiguousarray(threshold, dtype=np.float32)
+    self.left = np.ascontiguousarray(left, dtype=np.int32)
+    self.default_left = np.ascontiguousarray(default_left, dtype=np.bool_)
+    self.value = np.ascontiguousarray(value, dtype=np.float32)
+    self.max_depth = int(max_depth)
+    self.n_features = int(n_features)
+    self.base_margin = float(base_margin)
+    self.classes_ = np.array([0, 1])
+
+  @property
+  def n_trees(self):
+    return len(self.roots)
+
+  @property
+  def n_nodes(self):
+    return len(self.feature)
+
+  @property
+  def nbytes(self):
+    return sum(getattr(self, name).nbytes for name in ARRAY_FIELDS)
+
+  def raw_scores(self, X, n_jobs=None, block_rows=8192):
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if X.ndim != 2 or X.shape[1] != self.n_features:
+      raise ValueError(f"Input harus berbentuk (n, {self.n_features}), didapat {X.shape}")
+    if NUMBA_AVAILABLE:
+      return self._raw_scores_numba(X, block_rows)
+
+    # Fallback NumPy: baris dibagi per blok dan dievaluasi paralel di thread pool
+    if not len(X):
+      return np.empty(0)
+    starts = range(0, len(X), block_rows)
+    with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count() or 1) as pool:
+      return np.concatenate(list(pool.map(lambda s: self._sum_leaves_numpy(X[s:s + block_rows]),
+                                          starts)))
+
+  def _raw_scores_numba(self, X, block_rows):
+    out = np.empty(len(X), dtype=np.float64)
+    _sum_leaves_numba(X, self.roots, self.feature, self.threshold, self.left,
+                      self.default_left, self.value, block_rows, out)
+    return out
+
+  def _sum_leaves_numpy(self, X):
+    return self._leaf_values_numpy(X).sum(axis=1, dtype=np.float64)
+
+  def _leaf_values_numpy(self, X):
+    # Semua baris x semua pohon maju satu level per iterasi -> nilai leaf (n, pohon)
+    rows = np.arange(len(X))[:, None]
+    node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+    has_nan = np.isnan(X).any()
+    for _ in range(self.max_depth):
+      x = X[rows, self.feature[node]]
+      go_right = x > self.threshold[node]
+      if has_nan:
+        go_right |= np.isnan(x) & ~self.default_left[node]
+      node = self.left[node] + go_right
+    return self.value[node]
+
+  def predict_proba(self, X):
+    scores = self.raw_scores(X)
+    if self.kind == 'xgb':
+      proba = 1.0 / (1.0 + np.exp(-(scores + self.base_margin)))
+    else:
+      proba = scores / self.n_trees
+    return np.column_stack([1.0 - proba, proba])
+
+  def predict(self, X):
+    return (self.predict_proba(X)[:, 1] > 0.5).astype(np.int8)
+
+class MultiForest(FlatForest):
+  # Beberapa ensemble (satu per output, mis. Machine failure + TWF/HDF/PWF/OSF/RNF) dalam satu
+  # tabel node. Pohon dikelompokkan per output (tree_output), dan satu traversal per baris
+  # mengisi skor semua output sekaligus. Output ke-0 dipakai sebagai predict_proba biasa.
+  def __init__(self, output_names, kinds, base_margins, tree_output, roots, feature, threshold,
+               left, default_left, value, max_depth, n_features):
+    super().__init__('multi', roots, feature, threshold, left, default_left, value,
+                     max_depth, n_features)
+    self.output_names = list(output_names)
+    self.kinds = list(kinds)
+    self.base_margins = np.asarray(base_margins, dtype=np.float64)
+    self.tree_output = np.ascontiguousarray(tree_output, dtype=np.int32)
+    self.tree_counts = np.bincount(self.tree_output, minlength=len(self.output_names))
+    if (self.tree_counts == 0).any() or (np.diff(self.tree_output) < 0).any():
+      raise ValueError("Tiap output harus punya pohon, dan pohon harus terurut per output")
+
+  def _raw_scores_numba(self, X, block_rows):
+    out = np.empty((len(X), len(self.output_names)), dtype=np.float64)
+    _sum_leaves_multi_numba(X, self.roots, self.tree_output, self.feature, self.threshold,
+                            self.left, self.default_left, self.value, block_rows, out)
+    return out
+
+  def _sum_leaves_numpy(self, X):
+    starts = np.r_[0, np.cumsum(self.tree_counts)[:-1]]
+    return np.add.reduceat(self._leaf_values_numpy(X).astype(np.float64), starts, axis=1)
+
+  def predict_outputs(self, X):
+    # Probabilitas kelas positif untuk semua output, (n, jumlah output)
+    scores = self.raw_scores(X).reshape(len(X), len(self.output_names))
+    proba = np.empty_like(scores)
+    for j, kind in enumerate(self.kinds):
+      if kind == 'xgb':
+        proba[:, j] = 1.0 / (1.0 + np.exp(-(scores[:, j] + self.base_margins[j])))
+      else:
+        proba[:, j] = scores[:, j] / self.tree_counts[j]
+    return proba
+
+  def predict_proba(self, X):
+    proba = self.predict_outputs(X)[:, 0]
+    return np.column_stack([1.0 - proba, proba])
+
+def combine_forests(forests, output_names):
+  # Gabungkan beberapa FlatForest (fitur sama) jadi satu MultiForest; indeks node digeser
+  if len(forests) != len(output_names):
+    raise ValueError("Jumlah forest dan nama output harus sama")
+  if any(f.n_features != forests[0].n_features for f in forests):
+    raise ValueError("Semua forest harus memakai matriks fitur yang sama")
+  offsets = np.r_[0, np.cumsum([f.n_nodes for f in forests])[:-1]]
+  columns = {name: np.concatenate([getattr(f, name) for f in forests])
+             for name in ('feature', 'threshold', 'default_left', 'value')}
+  columns['left'] = np.concatenate([f.left + off for f, off in zip(forests, offsets)])
+  columns['roots'] = np.concatenate([f.roots + off for f, off in zip(forests, offsets)])
+  tree_output = np.concatenate([np.full(f.n_trees, j) for j, f in enumerate(forests)])
+  return MultiForest(output_names, [f.kind for f in forests], [f.base_margin for f in forests],
+                     tree_output, max_depth=max(f.max_depth for f in forests),
+                     n_features=forests[0].n_features, **columns)
+
+ARRAY_FIELDS = ['roots', 'feature', 'threshold', 'left', 'default_left', 'value']
+
+if NUMBA_AVAILABLE:
+  @njit(parallel=True, cache=True)
+  def _sum_leaves_numba(X, roots, feature, threshold, left, default_left, value, block_rows, out):
+    # Paralel per blok baris; di dalam blok pohon jadi loop luar agar node tetap di cache
+    n_blocks = (X.shape[0] + block_rows - 1) // block_rows
+    for b in prange(n_blocks):
+      start = b * block_rows
+      stop = min(X.shape[0], start + block_rows)
+      acc = np.zeros(stop - start)
+      for t in range(roots.shape[0]):
+        root = roots[t]
+        for i in range(start, stop):
+          node = root
+          while left[node] != node:
+            x = X[i, feature[node]]
+            go_right = x > threshold[node] or (np.isnan(x) and not default_left[node])
+            node = left[node] + np.int32(go_right)
+          acc[i - start] += value[node]
+      out[start:stop] = acc
+
+  @njit(parallel=True, cache=True)
+  def _sum_leaves_multi_numba(X, roots, tree_output, feature, threshold, left, default_left, value,
+                              block_rows, out):
+    # Sama seperti _sum_leaves_numba, tapi nilai leaf dijumlahkan ke kolom output pohonnya
+    n_blocks = (X.shape[0] + block_rows - 1) // block_rows
+    for b in prange(n_blocks):
+      start = b * block_rows
+      stop = min(X.shape[0], start + block_rows)
+      acc = np.zeros((stop - start, out.shape[1]))
+      for t in range(roots.shape[0]):
+        root = roots[t]
+        k = tree_output[t]
+        for i in range(start, stop):
+          node = root
+          while left[node] != node:
+            x = X[i, feature[node]]
+            go_right = x > threshold[node] or (np.isnan(x) and not default_left[node])
+            node = left[node] + np.int32(go_right)
+          acc[i - start, k] += value[node]
+      out[start:stop] = acc
+
+def _float32_floor(threshold):
+  # Float32 terbesar yang <= threshold (float64): float32(x) <= threshold tetap identik
+  thr32 = np.asarray(threshold, dtype=np.float64).astype(np.float32)
+  above = thr32.astype(np.float64) > threshold
+  thr32[above] = np.nextafter(thr32[above], np.float32(-np.inf))
+  return thr32
+
+def _bfs_layout(left, right):
+  # Urutan BFS: anak kiri & kanan tiap node diletakkan bersebelahan
+  order, depth, level = [0], 0, [0]
+  while True:
+    level = [c for n in level if left[n] >= 0 for c in (left[n], right[n])]
+    if not level:
+      return np.array(order), depth
+    order.extend(level)
+    depth += 1
+
+def _concat_trees(trees, kind, n_features, base_margin=0.0):
+  # trees: list of (feature, threshold, left, right, default_left, value) per pohon,
+  # indeks lokal, leaf ditandai left < 0, aturan split: ke kiri jika x <= threshold
+  parts, roots, offset, max_depth = [], [], 0, 0
+  for feature, threshold, left, right, default_left, value in trees:
+    order, depth = _bfs_layout(left, right)
+    position = np.empty(len(left), dtype=np.int64)
+    position[order] = np.arange(len(order))
+
+    is_leaf = left[order] < 0
+    new_left = np.where(is_leaf, np.arange(len(order)), position[np.maximum(left[order], 0)])
+    parts.append((np.where(is_leaf, 0, feature[order]),
+                  np.where(is_leaf, np.float32(np.inf), threshold[order]).astype(np.float32),
+                  new_left + offset,
+                  np.where(is_leaf, True, default_left[order]),
+                  np.where(is_leaf, value[order], 0.0)))
+    roots.append(offset)
+    offset += len(order)
+    max_depth = max(max_depth, depth)
+  columns = [np.concatenate(col) for col in zip(*parts)]
+  return FlatForest(kind, np.array(roots), *columns, max_depth=max_depth,
+                    n_features=n_features, base_margin=base_margin)
+
+def _sklearn_tables(model):
+  estimators = model.estimators_ if hasattr(model, 'estimators_') else [model]
+  if len(model.classes_) != 2:
+    raise ValueError("Hanya model klasifikasi biner yang didukung")
+  trees = []
+  for est in estimators:
+    t = est.tree_
+    counts = t.value[:, 0, :]
+    totals = counts.sum(axis=1)
+    value = np.divide(counts[:, 1], totals, out=np.zeros(len(totals)), where=totals > 0)
+    default_left = getattr(t, 'missing_go_to_left', np.zeros(t.node_count, dtype=np.uint8))
+    trees.append({'feature': t.feature, 'threshold': _float32_floor(t.threshold),
+                  'left': t.children_left, 'right': t.children_right,
+                  'default_left': default_left.astype(bool), 'value': value,
+                  'weight': t.weighted_n_node_samples})
+  return trees, 'rf', model.n_features_in_, 0.0
+
+def _xgboost_tables(model):
+  booster = model.get_booster()
+  learner = json.loads(booster.save_raw('json'))['learner']
+  if learner['objective']['name'] != 'binary:logistic':
+    raise ValueError(f"Objective XGBoost tidak didukung: {learner['objective']['name']}")
+
+  # base_score disimpan di ruang probabilitas, mis. '[5E-1]'
+  base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+  base_margin = float(np.log(base_score / (1.0 - base_score)))
+
+  trees_json = learner['gradient_booster']['model']['trees']
+  try:
+    n_rounds = model.best_iteration + 1
+    trees_json = trees_json[:n_rounds * len(trees_json) // booster.num_boosted_rounds()]
+  except AttributeError:
+    pass
+
+  trees = []
+  for t in trees_json:
+    left = np.array(t['left_children'], dtype=np.int64)
+    cond = np.array(t['split_conditions'], dtype=np.float32)
+    is_leaf = left < 0
+    # Di model JSON XGBoost, nilai leaf disimpan di split_conditions. XGBoost ke kiri jika
+    # x < threshold, setara x <= float32 sebelumnya. base_weights = bobot semua node (skala
+    # sama dengan leaf) dan sum_hessian = "jumlah sampel" node, dipakai saat pruning.
+    trees.append({'feature': np.array(t['split_indices']),
+                  'threshold': np.nextafter(np.where(is_leaf, 0.0, cond).astype(np.float32),
+                                            np.float32(-np.inf)),
+                  'left': left, 'right': np.array(t['right_children'], dtype=np.int64),
+                  'default_left': np.array(t['default_left'], dtype=bool),
+                  'value': np.where(is_leaf, cond, np.array(t['base_weights'], dtype=np.float32)),
+                  'weight': np.array(t['sum_hessian'], dtype=np.float64)})
+  return trees, 'xgb', int(learner['learner_model_param']['num_feature']), base_margin
+
+def tree_tables(model):
+  # Tabel node per pohon (indeks lokal, leaf ditandai left < 0) + value & weight di semua node,
+  # return (trees, kind, n_features, base_margin). Dipakai export_model & kompresi model.
+  if hasattr(model, 'get_booster'):
+    return _xgboost_tables(model)
+  if hasattr(model, 'estimators_') or hasattr(model, 'tree_'):
+    return _sklearn_tables(model)
+  raise TypeError(f"Model {type(model).__name__} tidak didukung untuk diekspor")
+
+def tables_to_forest(trees, kind, n_features, base_margin=0.0):
+  columns = ('feature', 'threshold', 'left', 'right', 'default_left', 'value')
+  return _concat_trees([tuple(t[c] for c in columns) for t in trees], kind, n_features, base_margin)
+
+def export_model(model):
+  # Ratakan RandomForest / DecisionTree (sklearn) atau XGBClassifier ke FlatForest
+  return tables_to_forest(*tree_tables(model))
+
+def verify_forest(model, forest, X, atol=1e-5):
+  # Pastikan probabilitas FlatForest sama dengan model aslinya (dalam toleransi)
+  expected = model.predict_proba(X)[:, 1]
+  actual = forest.predict_proba(X)[:, 1]
+  max_diff = float(np.abs(expected - actual).max()) if len(X) else 0.0
+  if max_diff > atol:
+    raise ValueError(f"Probabilitas FlatForest berbeda dari model asli (max diff {max_diff:.2e})")
+  return max_diff
+
+def compile_pipeline(pipeline, X_check=None, atol=1e-5):
+  # Ganti model di InferencePipeline dengan FlatForest (encoding & scaling tetap sama)
+  forest = export_model(pipeline.model)
+  if X_check is not None:
+    verify_forest(pipeline.model, forest, np.asarray(X_check, dtype=np.float32), atol)
+  compiled = copy.copy(pipeline)
+  compiled.model = forest
+  compiled.model_name = f"FlatForest[{pipeline.model_name}]"
+  compiled.model_hash = joblib.hash(forest)
+  return compiled
+
+def shareable_pipeline(pipeline):
+  # Untuk registry: hanya array FlatForest yang tetap berupa memmap saat di-load dengan mmap
+  # (Tree sklearn menyalin array-nya saat unpickle, booster XGBoost dibangun ulang per proses),
+  # jadi model pohon dikompilasi dulu. Model yang tidak bisa diekspor disimpan apa adanya.
+  if isinstance(pipeline.model, FlatForest):
+    return pipeline
+  try:
+    return compile_pipeline(pipeline)
+  except TypeError:
+    return pipeline
+
+def save_forest(forest, path):
+  meta = {'kind': forest.kind, 'max_depth': forest.max_depth,
+          'n_features': forest.n_features, 'base_margin': forest.base_margin}
+  np.savez(path, meta=json.dumps(meta), **{name: getattr(forest, name) for name in ARRAY_FIELDS})
+  print(f"FlatForest ({forest.n_trees} pohon, {forest.n_nodes:,} node, "
+        f"{forest.nbytes / 1024:.1f} KB) disimpan di {path}")
+
+def load_forest(path):
+  with np.load(path) as data:
+    meta = json.loads(str(data['meta']))
+    arrays = {name: data[name] for name in ARRAY_FIELDS}
+  return FlatForest(meta['kind'], **arrays, max_depth=meta['max_depth'],
+                    n_features=meta['n_features'], base_margin=meta['base_margin'])
+
+def main():
+  parser = argparse.ArgumentParser(description="Ekspor model pohon ke FlatForest (array NumPy)")
+  parser.add_argument('--model', default='models/best_model.pkl')
+  parser.add_argument('--output', default='models/best_model_flat.npz')
+  parser.add_argument('--verify-data', default='data/processed',
+                      help="Folder data processed untuk cek kesamaan probabilitas pada X_test")
+  parser.add_argument('--pipeline-output', default=None,
+                      help="Opsional: simpan juga InferencePipeline yang memakai FlatForest")
+  args = parser.parse_args()
+
+  model = joblib.load(args.model)
+  forest = export_model(model)
+  if args.verify_data:
+    from storage import load_split
+    X_test = np.asarray(load_split(args.verify_data, ['X_test'])['X_test'], dtype=np.float32)
+    print(f"Verifikasi OK, selisih maksimum: {verify_forest(model, forest, X_test):.2e}")
+  save_forest(forest, args.output)
+
+  if args.pipeline_output:
+    from inference import load_or_build_pipeline, save_pipeline
+    pipeline = load_or_build_pipeline(pipeline_path=None, model_path=args.model)
+    save_pipeline(compile_pipeline(pipeline), args.pipeline_output)
+
+if __name__ == "__main__":
+  # Jalankan lewat modul `tree_engine` (bukan __main__) agar FlatForest bisa di-unpickle proses lain
+  import tree_engine
+  tree_engine.main()
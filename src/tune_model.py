@@ -0,0 +1,153 @@
+import argparse
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterSampler, StratifiedKFold
+
+from storage import load_split
+from train_model import save_trained_model
+
+# XGBoost opsional: kalau tidak terpasang, pencarian hanya memakai RandomForest
+try:
+  from xgboost import XGBClassifier
+  XGBOOST_AVAILABLE = True
+except ImportError:
+  XGBOOST_AVAILABLE = False
+
+# Ruang pencarian (XGBoost sama dengan notebooks/02_modeling.ipynb)
+PARAM_SPACES = {
+  'RandomForest': {
+    'n_estimators': [100, 200, 300],
+    'max_depth': [None, 10, 20, 30],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 0.5, 1.0],
+  },
+  'XGBoost': {
+    'n_estimators': [100, 200, 300],
+    'learning_rate': [0.01, 0.05, 0.1, 0.2],
+    'max_depth': [3, 5, 7, 10],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+  },
+}
+
+def build_estimator(name, params, pos_weight):
+  # n_jobs=1 di dalam worker: paralelisme ada di level process pool
+  if name == 'RandomForest':
+    return RandomForestClassifier(class_weight='balanced', random_state=42, n_jobs=1, **params)
+  return XGBClassifier(random_state=42, scale_pos_weight=pos_weight, eval_metric='logloss',
+                       n_jobs=1, **params)
+
+def cache_folds(X, y, cache_dir, n_splits=3, random_state=42):
+  # Split fold & matriks per fold disimpan sekali sebagai .npy (di-mmap oleh worker),
+  # dikunci dengan hash data + parameter CV agar tidak dihitung ulang tiap kandidat/run
+  key = joblib.hash((X, y, n_splits, random_state))
+  fold_dir = os.path.join(cache_dir, f"folds_{key[:16]}")
+  if os.path.exists(os.path.join(fold_dir, 'done')):
+    return fold_dir, n_splits
+
+  os.makedirs(fold_dir, exist_ok=True)
+  rng = np.random.RandomState(random_state)
+  skf = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+  for k, (train_idx, val_idx) in enumerate(skf.split(X, y)):
+    # Baris train diacak sekali, sehingga subset resource = prefix kontigu dari file mmap
+    train_idx = rng.permutation(train_idx)
+    np.save(os.path.join(fold_dir, f"X_train_{k}.npy"), np.ascontiguousarray(X[train_idx], dtype=np.float32))
+    np.save(os.path.join(fold_dir, f"y_train_{k}.npy"), y[train_idx])
+    np.save(os.path.join(fold_dir, f"X_val_{k}.npy"), np.ascontiguousarray(X[val_idx], dtype=np.float32))
+    np.save(os.path.join(fold_dir, f"y_val_{k}.npy"), y[val_idx])
+  open(os.path.join(fold_dir, 'done'), 'w').close()
+  return fold_dir, n_splits
+
+def _evaluate(task):
+  name, params, pos_weight, fold_dir, k, n_rows = task
+  load = lambda f: np.load(os.path.join(fold_dir, f"{f}_{k}.npy"), mmap_mode='r')
+  X_train, y_train = load('X_train')[:n_rows], load('y_train')[:n_rows]
+  model = build_estimator(name, params, pos_weight)
+  model.fit(X_train, y_train)
+  return f1_score(load('y_val'), model.predict(load('X_val')), zero_division=0)
+
+def sample_candidates(n_candidates, random_state=42):
+  names = [n for n in PARAM_SPACES if n != 'XGBoost' or XGBOOST_AVAILABLE]
+  per_model = math.ceil(n_candidates / len(names))
+  return [(name, params) for name in names
+          for params in ParameterSampler(PARAM_SPACES[name], per_model, random_state=random_state)]
+
+def successive_halving(candidates, fold_dir, n_splits, n_train_rows, pos_weight,
+                       eta=3, min_fraction=1 / 9, n_jobs=None):
+  # Tiap ronde: semua kandidat x fold dievaluasi paralel, lalu hanya 1/eta terbaik lanjut
+  # dengan data latih eta kali lebih banyak
+  history = []
+  fraction = min_fraction
+  with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+    while True:
+      n_rows = max(int(n_train_rows * min(fraction, 1.0)), 1)
+      tasks = [(name, params, pos_weight, fold_dir, k, n_rows)
+               for name, params in candidates for k in range(n_splits)]
+      start = time.perf_counter()
+      scores = np.array(list(pool.map(_evaluate, tasks))).reshape(len(candidates), n_splits)
+      mean_scores = scores.mean(axis=1)
+      history.append({'rows': n_rows, 'candidates': len(candidates),
+                      'seconds': time.perf_counter() - start,
+                      'results': [{'model': name, 'params': params, 'f1': float(score)}
+                                  for (name, params), score in zip(candidates, mean_scores)]})
+      print(f"Ronde {len(history)}: {len(candidates)} kandidat, {n_rows:,} baris/fold, "
+            f"F1 terbaik {mean_scores.max():.4f} ({history[-1]['seconds']:.1f} detik)")
+
+      if len(candidates) == 1 or fraction >= 1.0:
+        best = int(np.argmax(mean_scores))
+        return candidates[best], float(mean_scores[best]), history
+      keep = np.argsort(-mean_scores, kind='stable')[:max(len(candidates) // eta, 1)]
+      candidates = [candidates[i] for i in keep]
+      fraction *= eta
+
+def tune(data_path, model_output_path, cache_dir='data/cache', n_candidates=24, n_splits=3,
+         eta=3, n_jobs=None):
+  # Load Data
+  data = load_split(data_path, ['X_train', 'y_train'])
+  X_train = np.asarray(data['X_train'], dtype=np.float32)
+  y_train = np.asarray(data['y_train'])
+  pos_weight = float((y_train == 0).sum() / max((y_train == 1).sum(), 1))
+
+  fold_dir, n_splits = cache_folds(X_train, y_train, cache_dir, n_splits)
+  n_train_rows = len(np.load(os.path.join(fold_dir, 'y_train_0.npy'), mmap_mode='r'))
+
+  start = time.perf_counter()
+  candidates = sample_candidates(n_candidates)
+  (name, params), cv_f1, history = successive_halving(
+    candidates, fold_dir, n_splits, n_train_rows, pos_weight, eta=eta, n_jobs=n_jobs)
+  print(f"Model terbaik: {name} {params} (CV F1 {cv_f1:.4f})")
+
+  # Refit kandidat terbaik di seluruh data train (boleh multi-core di sini)
+  model = build_estimator(name, params, pos_weight)
+  model.set_params(n_jobs=n_jobs or -1)
+  model.fit(X_train, y_train)
+  save_trained_model(model, model_output_path, data_path, model_name=f"{name} Tuned",
+                     meta={'cv_f1': cv_f1})
+
+  report = {'best_model': name, 'best_params': params, 'cv_f1': cv_f1,
+            'seconds': time.perf_counter() - start, 'rounds': history}
+  with open(f"{model_output_path}/tuning_report.json", 'w') as f:
+    json.dump(report, f, indent=2, default=str)
+  print(f"Tuning Selesai dalam {report['seconds']:.1f} detik. Model disimpan.")
+  return model, report
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Tuning RF/XGBoost dengan successive halving paralel")
+  parser.add_argument('--data', default='data/processed')
+  parser.add_argument('--models', default='models')
+  parser.add_argument('--cache-dir', default='data/cache')
+  parser.add_argument('--candidates', type=int, default=24)
+  parser.add_argument('--cv', type=int, default=3)
+  parser.add_argument('--eta', type=int, default=3)
+  parser.add_argument('--n-jobs', type=int, default=None)
+  args = parser.parse_args()
+
+  tune(args.data, args.models, args.cache_dir, args.candidates, args.cv, args.eta, args.n_jobs)
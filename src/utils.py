@@ -1,7 +1,52 @@
+import json
+import os
+import shutil
+import threading
+import time
+
 import joblib
 import pandas as pd
 
+from profiling import profiled
+
+# Skema fitur AI4I (urutan kolom sama seperti saat scaler di-fit)
+FEATURE_COLUMNS = ['Type', 'Air temperature [K]', 'Process temperature [K]',
+                   'Rotational speed [rpm]', 'Torque [Nm]', 'Tool wear [min]']
+TARGET_COLUMN = 'Machine failure'
+FAILURE_MODES = ['TWF', 'HDF', 'PWF', 'OSF', 'RNF']
+TYPE_MAP = {'L': 0, 'M': 1, 'H': 2}
+# Rentang nilai normal operator (referensi sidebar & counter di luar rentang di drift_monitor)
+OPERATOR_RANGES = {
+  'Air temperature [K]': (295.0, 300.0),
+  'Process temperature [K]': (305.0, 310.0),
+  'Rotational speed [rpm]': (1400.0, 1600.0),
+  'Torque [Nm]': (30.0, 45.0),
+  'Tool wear [min]': (0.0, 150.0),
+}
+# Resolusi pembacaan sensor AI4I (satuan asli): kode = round(nilai / resolusi)
+SENSOR_RESOLUTION = {
+  'Type': 1.0,
+  'Air temperature [K]': 0.1,
+  'Process temperature [K]': 0.1,
+  'Rotational speed [rpm]': 1.0,
+  'Torque [Nm]': 0.1,
+  'Tool wear [min]': 1.0,
+}
+
+# Registry model: models/registry/<versi>/model.pkl + meta.json, versi aktif di file CURRENT.
+# model.pkl disimpan tanpa kompresi dan di-load dengan mmap. Model pohon (RF/XGBoost) dikompilasi
+# ke FlatForest saat didaftarkan, karena hanya array FlatForest yang tetap memmap setelah
+# unpickle: tabel node-nya dibagi semua proses di host lewat page cache OS. Model lain tetap
+# disalin per proses. Model pohon aslinya disimpan di source_model.pkl (tidak dipakai serving),
+# untuk keperluan yang butuh struktur pohon lengkap seperti TreeSHAP.
+REGISTRY_DIR = 'models/registry'
+CURRENT_NAME = 'CURRENT'
+SOURCE_MODEL_NAME = 'source_model.pkl'
+
+@profiled('data.load', rows=len)
 def load_data(path):
+  # Frame apa adanya (semua kolom, dtype hasil inferensi pandas). Pembaca bertipe + cache biner
+  # untuk skema AI4I: ingest.read_ai4i
   return pd.read_csv(path)
 
 def save_model(model, path):
@@ -9,4 +54,86 @@ def save_model(model, path):
   print(f"Model saved to {path}")
 
 def load_model(path):
-  return joblib.load(path)
\ No newline at end of file
+  return joblib.load(path)
+
+def register_model(model, registry_dir=REGISTRY_DIR, activate=True, meta=None, source_model=None):
+  # source_model: model asli dari pipeline yang sudah dikompilasi (mis. salinan versi lain);
+  # default = model pipeline sebelum dikompilasi ke FlatForest
+  # Import lokal: tree_engine (numba) tidak perlu di-load oleh semua pengguna utils
+  from tree_engine import shareable_pipeline
+  compiled = shareable_pipeline(model)
+  if source_model is None and compiled is not model:
+    source_model = model.model
+  model = compiled
+  version = f"{time.strftime('%Y%m%d-%H%M%S')}-{joblib.hash(model)[:8]}"
+  version_dir = os.path.join(registry_dir, version)
+  # Tulis ke folder sementara lalu rename, agar versi setengah jadi tidak pernah terlihat
+  tmp_dir = f"{version_dir}.tmp"
+  shutil.rmtree(tmp_dir, ignore_errors=True)
+  os.makedirs(tmp_dir)
+  joblib.dump(model, os.path.join(tmp_dir, 'model.pkl'))
+  if source_model is not None:
+    joblib.dump(source_model, os.path.join(tmp_dir, SOURCE_MODEL_NAME))
+  with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+    json.dump({'version': version, 'model_name': getattr(model, 'model_name', type(model).__name__),
+               'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), **(meta or {})}, f, indent=2)
+  os.replace(tmp_dir, version_dir)
+  print(f"Model {version} didaftarkan di {registry_dir}")
+  if activate:
+    activate_version(version, registry_dir)
+  return version
+
+def list_versions(registry_dir=REGISTRY_DIR):
+  if not os.path.isdir(registry_dir):
+    return []
+  return sorted(d for d in os.listdir(registry_dir)
+                if os.path.exists(os.path.join(registry_dir, d, 'meta.json')))
+
+def activate_version(version, registry_dir=REGISTRY_DIR):
+  # Ganti versi aktif secara atomik (rename file pointer); dipakai juga untuk rollback
+  if version not in list_versions(registry_dir):
+    raise ValueError(f"Versi {version} tidak ada di {registry_dir}")
+  tmp = os.path.join(registry_dir, f"{CURRENT_NAME}.tmp")
+  with open(tmp, 'w') as f:
+    f.write(version)
+  os.replace(tmp, os.path.join(registry_dir, CURRENT_NAME))
+
+def active_version(registry_dir=REGISTRY_DIR):
+  try:
+    with open(os.path.join(registry_dir, CURRENT_NAME)) as f:
+      return f.read().strip() or None
+  except FileNotFoundError:
+    return None
+
+def load_version(version, registry_dir=REGISTRY_DIR, mmap_mode='r'):
+  return joblib.load(os.path.join(registry_dir, version, 'model.pkl'), mmap_mode=mmap_mode)
+
+def load_source_model(version, registry_dir=REGISTRY_DIR):
+  # Model pohon asli versi ini, None jika versi tidak dikompilasi / tidak punya model asli
+  path = os.path.join(registry_dir, version, SOURCE_MODEL_NAME)
+  return joblib.load(path) if os.path.exists(path) else None
+
+class ModelRegistry:
+  # Handle registry per proses. get() mengembalikan (versi, model) aktif; saat CURRENT berubah
+  # versi baru di-load penuh dulu, baru referensinya ditukar. Request yang sedang berjalan tetap
+  # memegang model lama sampai selesai, jadi hot-swap tidak memutus request.
+  def __init__(self, registry_dir=REGISTRY_DIR, check_interval=1.0):
+    self.registry_dir = registry_dir
+    self.check_interval = check_interval
+    self._current = (None, None)
+    self._checked_at = 0.0
+    self._lock = threading.Lock()
+
+  def get(self):
+    current = self._current
+    now = time.monotonic()
+    if current[0] is not None and now - self._checked_at < self.check_interval:
+      return current
+    with self._lock:
+      self._checked_at = now
+      version = active_version(self.registry_dir)
+      if version is None:
+        raise FileNotFoundError(f"Belum ada model aktif di {self.registry_dir}")
+      if version != self._current[0]:
+        self._current = (version, load_version(version, self.registry_dir))
+      return self._current
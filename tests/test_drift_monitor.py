@@ -0,0 +1,84 @@
+import threading
+
+import numpy as np
+import pytest
+
+from drift_monitor import DriftMonitor, DriftReference, _merge_moments, _moments
+
+def sensor_rows(rng, n):
+  # Kolom 0 = Type (kode 0/1/2), sisanya sensor dengan skala berbeda
+  X = np.column_stack([rng.integers(0, 3, n), rng.normal(300, 2, (n, 2)),
+                       rng.normal(1500, 150, n), rng.normal(40, 10, n), rng.uniform(0, 250, n)])
+  return X.astype(np.float64)
+
+@pytest.fixture
+def reference():
+  return DriftReference.from_data(sensor_rows(np.random.default_rng(2), 5000))
+
+def test_merge_moments_matches_numpy():
+  rng = np.random.default_rng(3)
+  a, b = rng.normal(5, 3, 700), rng.normal(-2, 0.5, 300)
+  group = np.zeros(len(a), dtype=np.int64)
+  n_a, mean_a, m2_a = _moments(a, group, 1)
+  n_b, mean_b, m2_b = _moments(b, np.zeros(len(b), dtype=np.int64), 1)
+  n, mean, m2 = _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b)
+  both = np.r_[a, b]
+  assert n[0] == len(both)
+  np.testing.assert_allclose(mean[0], both.mean())
+  np.testing.assert_allclose(m2[0] / n[0], both.var())
+
+def test_merge_moments_with_empty_side():
+  n, mean, m2 = _merge_moments(np.zeros(2), np.zeros(2), np.zeros(2),
+                               np.array([0.0, 4.0]), np.array([0.0, 2.5]), np.array([0.0, 1.0]))
+  np.testing.assert_array_equal(n, [0.0, 4.0])
+  np.testing.assert_array_equal(mean, [0.0, 2.5])
+  np.testing.assert_array_equal(m2, [0.0, 1.0])
+
+def test_update_in_batches_matches_per_group_numpy(reference):
+  X = sensor_rows(np.random.default_rng(4), 3000)
+  X[::11, 3] = np.nan
+  monitor = DriftMonitor(reference)
+  for batch in np.array_split(X, 7):
+    monitor.update(batch)
+  for g, rows in enumerate([np.ones(len(X), bool)] + [X[:, 0] == t for t in range(3)]):
+    values = X[rows]
+    np.testing.assert_allclose(monitor.mean[g], np.nanmean(values, axis=0))
+    np.testing.assert_allclose(monitor.m2[g] / monitor.n[g], np.nanvar(values, axis=0))
+    np.testing.assert_array_equal(monitor.missing[g], np.isnan(values).sum(axis=0))
+    assert monitor.rows[g] == rows.sum()
+
+def test_merge_equals_single_monitor(reference):
+  rng = np.random.default_rng(5)
+  X_a, X_b = sensor_rows(rng, 1200), sensor_rows(rng, 800)
+  single = DriftMonitor(reference).update(np.vstack([X_a, X_b]))
+  merged = DriftMonitor(reference).update(X_a).merge(DriftMonitor(reference).update(X_b))
+  for name in ('counts', 'missing', 'below', 'above', 'rows', 'n'):
+    np.testing.assert_array_equal(getattr(merged, name), getattr(single, name))
+  np.testing.assert_allclose(merged.mean, single.mean)
+  np.testing.assert_allclose(merged.m2, single.m2, rtol=1e-9)
+
+def test_merge_while_source_is_updated(reference):
+  # merge() membaca snapshot `other` di bawah lock-nya: tiap hasil merge konsisten
+  batch = sensor_rows(np.random.default_rng(6), 50)
+  source = DriftMonitor(reference)
+  stop = threading.Event()
+
+  def writer():
+    while not stop.is_set():
+      source.update(batch)
+
+  thread = threading.Thread(target=writer)
+  thread.start()
+  try:
+    for _ in range(50):
+      target = DriftMonitor(reference).merge(source)
+      assert target.counts[0].sum() == target.n[0].sum()
+      assert target.rows[0] % len(batch) == 0
+  finally:
+    stop.set()
+    thread.join()
+
+def test_merge_rejects_different_reference(reference):
+  other = DriftReference.from_data(sensor_rows(np.random.default_rng(7), 500) * 2)
+  with pytest.raises(ValueError):
+    DriftMonitor(reference).merge(DriftMonitor(other))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from evaluate_model import (confusion_at, confusion_at_threshold, cost_sweep, optimal_threshold,
+                            threshold_curve)
+
+def make_report(y_true, proba):
+  thresholds, tp, fp = threshold_curve(y_true, proba)
+  return {'thresholds': thresholds, 'tp': tp, 'fp': fp,
+          'meta': {'n_positive': int(y_true.sum()), 'n_rows': len(y_true)}}
+
+def brute_cost(y_true, proba, cut, cost_maintenance, cost_failure):
+  alarm = proba > cut
+  return alarm.sum() * cost_maintenance + (y_true.astype(bool) & ~alarm).sum() * cost_failure
+
+@pytest.fixture
+def scored():
+  rng = np.random.default_rng(0)
+  y_true = (rng.random(2000) < 0.1).astype(np.int8)
+  # Banyak nilai kembar + nilai 0.0 persis, seperti output hutan pohon
+  proba = np.round(np.clip(rng.normal(0.2 + 0.5 * y_true, 0.2), 0, 1), 2)
+  return y_true, proba
+
+def test_threshold_curve_matches_brute_force(scored):
+  y_true, proba = scored
+  thresholds, tp, fp = threshold_curve(y_true, proba)
+  assert np.all(np.diff(thresholds) < 0)
+  for t, tp_t, fp_t in zip(thresholds, tp, fp):
+    cm = confusion_at(y_true, proba >= t)
+    assert (cm['tp'], cm['fp']) == (tp_t, fp_t)
+
+def test_cost_sweep_cuts_reproduce_serving_rule(scored):
+  y_true, proba = scored
+  report = make_report(y_true, proba)
+  sweep = cost_sweep(report['thresholds'], report['tp'], report['fp'],
+                     report['meta']['n_positive'], 10.0, 100.0)
+  assert sweep['cuts'][-1] < proba.min()
+  for cut, cost in zip(sweep['cuts'], sweep['cost']):
+    assert cost == brute_cost(y_true, proba, cut, 10.0, 100.0)
+    assert confusion_at_threshold(report, cut) == confusion_at(y_true, proba > cut)
+
+def test_optimal_threshold_is_global_minimum(scored):
+  y_true, proba = scored
+  best = optimal_threshold(make_report(y_true, proba), 10.0, 100.0)
+  grid = np.r_[1.0, np.unique(proba), -1.0]
+  assert best['cost'] == min(brute_cost(y_true, proba, c, 10.0, 100.0) for c in grid)
+  assert best['confusion'] == confusion_at(y_true, proba > best['threshold'])
+
+def test_cost_sweep_zero_probability_alarms_everything():
+  y_true = np.array([1, 0, 1, 0], dtype=np.int8)
+  proba = np.array([0.0, 0.0, 0.0, 0.0])
+  report = make_report(y_true, proba)
+  sweep = cost_sweep(report['thresholds'], report['tp'], report['fp'], 2, 1.0, 5.0)
+  assert sweep['cuts'][-1] < 0.0
+  assert (proba > sweep['cuts'][-1]).all()
+  assert sweep['cost'][-1] == brute_cost(y_true, proba, sweep['cuts'][-1], 1.0, 5.0)
+
+def test_cost_sweep_adjacent_floats_keep_cut_between_them():
+  # Titik tengah dua float bersebelahan terbulatkan ke nilai atas; cut harus tetap di bawahnya
+  high = 0.5
+  low = np.nextafter(high, 0.0)
+  y_true = np.array([1, 0], dtype=np.int8)
+  proba = np.array([high, low])
+  report = make_report(y_true, proba)
+  sweep = cost_sweep(report['thresholds'], report['tp'], report['fp'], 1, 1.0, 5.0)
+  assert low <= sweep['cuts'][1] < high
+  assert confusion_at_threshold(report, sweep['cuts'][1]) == confusion_at(y_true, proba > sweep['cuts'][1])
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from prediction_cache import PredictionCache
+from utils import FEATURE_COLUMNS, SENSOR_RESOLUTION
+
+STEP = np.array([SENSOR_RESOLUTION[c] for c in FEATURE_COLUMNS])
+
+def grid_rows(rng, n):
+  # Pembacaan tepat di grid resolusi sensor (bisa di-cache)
+  return rng.integers(0, 3000, (n, len(STEP))) * STEP
+
+def fake_model(X):
+  return np.column_stack([X.sum(axis=1), X[:, 0]])
+
+def test_hit_after_store_and_miss_for_other_version():
+  cache = PredictionCache(capacity=1024, ways=4, n_outputs=2)
+  X = grid_rows(np.random.default_rng(10), 100)
+  hit, _ = cache.lookup(X, 'v1')
+  assert not hit.any()
+  assert cache.store(X, 'v1', fake_model(X)) == 100
+  hit, values = cache.lookup(X, 'v1')
+  assert hit.all()
+  np.testing.assert_array_equal(values, fake_model(X))
+  assert not cache.lookup(X, 'v2')[0].any()
+  stats = cache.snapshot()
+  assert (stats['hits'], stats['misses'], stats['inserts']) == (100, 200, 100)
+
+def test_off_grid_rows_are_never_cached():
+  cache = PredictionCache(capacity=256, ways=4, n_outputs=2)
+  X = grid_rows(np.random.default_rng(11), 10).astype(np.float64)
+  X[:5, 1] += STEP[1] / 3
+  cache.store(X, 'v1', fake_model(X))
+  hit, _ = cache.lookup(X, 'v1')
+  np.testing.assert_array_equal(hit, [False] * 5 + [True] * 5)
+
+def test_get_or_compute_scores_only_misses():
+  cache = PredictionCache(capacity=1024, ways=4, n_outputs=2)
+  X = grid_rows(np.random.default_rng(12), 50)
+  seen = []
+
+  def compute(X_miss):
+    seen.append(len(X_miss))
+    return fake_model(X_miss)
+
+  first = cache.get_or_compute(X[:30], 'v1', compute, n_outputs=2)
+  second = cache.get_or_compute(X, 'v1', compute, n_outputs=2)
+  assert seen == [30, 20]
+  np.testing.assert_array_equal(first, fake_model(X[:30]))
+  np.testing.assert_array_equal(second, fake_model(X))
+
+def test_lru_eviction_within_a_set():
+  cache = PredictionCache(capacity=4, ways=4, n_outputs=2)
+  assert cache.n_sets == 1
+  X = grid_rows(np.random.default_rng(13), 5)
+  for i in range(4):
+    cache.store(X[i:i + 1], 'v1', fake_model(X[i:i + 1]))
+  cache.lookup(X[:1], 'v1')  # baris 0 jadi paling baru dipakai, baris 1 jadi LRU
+  cache.store(X[4:], 'v1', fake_model(X[4:]))
+  hit, _ = cache.lookup(X, 'v1')
+  np.testing.assert_array_equal(hit, [True, False, True, True, True])
+  assert cache.snapshot()['entries'] == 4
+
+def test_torn_slot_is_a_miss():
+  cache = PredictionCache(capacity=64, ways=4, n_outputs=2)
+  X = grid_rows(np.random.default_rng(14), 1)
+  cache.store(X, 'v1', fake_model(X))
+  # Simulasikan penulis lain yang belum selesai: nilai berubah tapi checksum lama
+  cache.values[cache.check != 0] += 1.0
+  assert not cache.lookup(X, 'v1')[0].any()
+
+def test_shared_cache_is_visible_across_handles():
+  name = f"pdm_test_cache_{np.random.default_rng().integers(1 << 30)}"
+  owner = PredictionCache(capacity=256, ways=4, n_outputs=2, name=name)
+  try:
+    other = PredictionCache(capacity=256, ways=4, n_outputs=2, name=name)
+    X = grid_rows(np.random.default_rng(15), 20)
+    owner.store(X, 'v1', fake_model(X))
+    hit, values = other.lookup(X, 'v1')
+    assert hit.all()
+    np.testing.assert_array_equal(values, fake_model(X))
+    other.close()
+  finally:
+    owner.close()
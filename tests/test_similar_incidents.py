@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import similar_incidents
+from similar_incidents import IncidentIndex, _knn_numpy, build_index, build_tree
+
+def brute_knn(X, q, k):
+  dist = ((X.astype(np.float64) - q) ** 2).sum(axis=1)
+  return np.sort(dist)[:k]
+
+@pytest.fixture
+def points():
+  rng = np.random.default_rng(8)
+  # Cluster + duplikat supaya ada jarak kembar dan leaf yang tidak seimbang
+  X = np.vstack([rng.normal(0, 1, (500, 6)), rng.normal(4, 0.1, (200, 6)),
+                 np.repeat(rng.normal(size=(1, 6)), 20, axis=0)])
+  return X.astype(np.float32)
+
+def test_build_tree_is_a_partition(points):
+  perm, node_start, node_end, lo, hi, depth = build_tree(points, leaf_size=16)
+  np.testing.assert_array_equal(np.sort(perm), np.arange(len(points)))
+  leaves = np.arange(2 ** depth - 1, 2 ** (depth + 1) - 1)
+  assert node_start[leaves[0]] == 0 and node_end[leaves[-1]] == len(points)
+  np.testing.assert_array_equal(node_start[leaves[1:]], node_end[leaves[:-1]])
+  sorted_points = points[perm]
+  for leaf in leaves:
+    block = sorted_points[node_start[leaf]:node_end[leaf]]
+    if len(block):
+      assert (block >= lo[leaf]).all() and (block <= hi[leaf]).all()
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_query_matches_brute_force(points, tmp_path, monkeypatch, use_numba):
+  if use_numba and not similar_incidents.NUMBA_AVAILABLE:
+    pytest.skip("numba tidak terpasang")
+  monkeypatch.setattr(similar_incidents, 'NUMBA_AVAILABLE', use_numba)
+  build_index(points, np.ones(len(points)), np.zeros((len(points), 5)), str(tmp_path),
+              leaf_size=16, meta={'mean': [0.0] * 6, 'scale': [1.0] * 6,
+                                  'feature_names': list('abcdef'), 'failure_modes': list('vwxyz')})
+  index = IncidentIndex(str(tmp_path))
+  queries = np.vstack([np.random.default_rng(9).normal(0, 2, (30, 6)), points[:5], points[-1:]])
+  for k in (1, 5, 25):
+    idx, dist = index.query(queries, k)
+    for q, i, d in zip(queries.astype(np.float32), idx, dist):
+      expected = brute_knn(points, q, k)
+      np.testing.assert_allclose(d ** 2, expected, rtol=1e-5, atol=1e-5)
+      np.testing.assert_allclose(((index.points[i] - q).astype(np.float64) ** 2).sum(axis=1),
+                                 expected, rtol=1e-5, atol=1e-5)
+
+def test_query_with_fewer_points_than_k():
+  X = np.arange(12, dtype=np.float32).reshape(4, 3)
+  tree = build_tree(X, leaf_size=2)
+  perm, node_start, node_end, lo, hi, depth = tree
+  idx, dist = _knn_numpy(X[perm], lo, hi, node_start, node_end, depth, X[0].astype(np.float64), 6)
+  assert (idx[:4] >= 0).all() and (idx[4:] == -1).all()
+  np.testing.assert_allclose(dist[:4], brute_knn(X, X[0], 4))
+  assert np.isinf(dist[4:]).all()
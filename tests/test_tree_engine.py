@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from tree_engine import combine_forests, export_model, verify_forest
+
+@pytest.fixture(scope='module')
+def data():
+  rng = np.random.default_rng(1)
+  X = rng.normal(size=(600, 6)).astype(np.float32)
+  y = ((X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(0, 0.5, len(X))) > 0.8).astype(np.int8)
+  return X, y
+
+def assert_parity(model, X):
+  forest = export_model(model)
+  expected = model.predict_proba(X)[:, 1]
+  np.testing.assert_allclose(forest.predict_proba(X)[:, 1], expected, atol=1e-6)
+  # Evaluator NumPy (fallback tanpa numba) harus sama dengan kernel utama
+  np.testing.assert_allclose(forest._sum_leaves_numpy(X), forest.raw_scores(X), atol=1e-6)
+  assert verify_forest(model, forest, X) <= 1e-5
+  return forest
+
+def test_random_forest_parity(data):
+  X, y = data
+  model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+  forest = assert_parity(model, X)
+  assert forest.n_trees == 25
+  np.testing.assert_array_equal(forest.predict(X), (model.predict_proba(X)[:, 1] > 0.5))
+
+def test_decision_tree_parity_on_split_thresholds(data):
+  X, y = data
+  model = DecisionTreeClassifier(max_depth=10, random_state=0).fit(X, y)
+  # Nilai tepat di threshold split menguji pembulatan float64 -> float32
+  t = model.tree_
+  inner = t.children_left >= 0
+  X_edge = np.tile(X[:1], (inner.sum(), 1))
+  X_edge[np.arange(inner.sum()), t.feature[inner]] = t.threshold[inner].astype(np.float32)
+  assert_parity(model, np.vstack([X, X_edge]))
+
+def test_xgboost_parity_with_missing_values(data):
+  xgb = pytest.importorskip('xgboost')
+  X, y = data
+  X = X.copy()
+  X[::7, 2] = np.nan
+  model = xgb.XGBClassifier(n_estimators=30, max_depth=4, random_state=0).fit(X, y)
+  assert_parity(model, X)
+
+def test_combined_forest_matches_each_output(data):
+  X, y = data
+  models = [RandomForestClassifier(n_estimators=5, max_depth=d, random_state=0).fit(X, y)
+            for d in (3, 6)]
+  multi = combine_forests([export_model(m) for m in models], ['a', 'b'])
+  expected = np.column_stack([m.predict_proba(X)[:, 1] for m in models])
+  np.testing.assert_allclose(multi.predict_outputs(X), expected, atol=1e-6)
+  np.testing.assert_allclose(multi._sum_leaves_numpy(X), multi.raw_scores(X), atol=1e-6)